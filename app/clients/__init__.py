@@ -1,4 +1,7 @@
+from .http_pool import HTTPClientPool
+from .http_pool import http_clients
+from .metadata import MetadataBulkUpdateError
 from .metadata import MetadataClient
 from .project import ProjectClient
 
-__all__ = ['MetadataClient', 'ProjectClient']
+__all__ = ['HTTPClientPool', 'MetadataBulkUpdateError', 'MetadataClient', 'ProjectClient', 'http_clients']
@@ -20,15 +20,23 @@ import httpx
 
 from app.config import ConfigClass
 
+from .http_pool import HTTPClientPool
+from .http_pool import http_clients
+
 
 class BaseClient:
 
     BASE_URL = ConfigClass.PROJECT_SERVICE
+    SERVICE = HTTPClientPool.PROJECT
+
+    @classmethod
+    def http_client(cls) -> httpx.AsyncClient:
+        """Return the pooled client shared by every request to the service."""
+        return http_clients.get(cls.SERVICE)
 
     @classmethod
     async def get(cls, url: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, params=params)
+        response = await cls.http_client().get(url, params=params)
         response.raise_for_status()
 
         return response.json()
@@ -0,0 +1,89 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from importlib.util import find_spec
+from typing import Dict
+
+import httpx
+from common import LoggerFactory
+
+from app.config import ConfigClass
+
+
+class HTTPClientPool:
+    """Application scoped ``httpx.AsyncClient`` instances, one per target service.
+
+    Every client keeps its connections alive between requests so that the outbound calls of a long file
+    operation reuse a handful of sockets instead of opening a new one per request. Clients are created on
+    application startup and closed on shutdown; a client requested outside of the application lifecycle (for
+    example by a background job started from a test) is created on first use.
+    """
+
+    logger = LoggerFactory('HTTPClientPool').get_logger()
+
+    METADATA = 'metadata'
+    PROJECT = 'project'
+    DATA_OPS = 'data_ops'
+    QUEUE = 'queue'
+    CATALOGUING = 'cataloguing'
+    SEND_MESSAGE = 'send_message'
+
+    def __init__(self) -> None:
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    @property
+    def timeouts(self) -> Dict[str, float]:
+        return {
+            self.METADATA: ConfigClass.METADATA_SERVICE_TIMEOUT,
+            self.PROJECT: ConfigClass.PROJECT_SERVICE_TIMEOUT,
+            self.DATA_OPS: ConfigClass.DATA_OPS_UTIL_TIMEOUT,
+            self.QUEUE: ConfigClass.QUEUE_SERVICE_TIMEOUT,
+            self.CATALOGUING: ConfigClass.CATALOGUING_SERVICE_TIMEOUT,
+            self.SEND_MESSAGE: ConfigClass.QUEUE_SERVICE_TIMEOUT,
+        }
+
+    def _create_client(self, service: str) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=ConfigClass.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=ConfigClass.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=ConfigClass.HTTP_KEEPALIVE_EXPIRY,
+        )
+        # http2 needs the optional h2 package, fall back to http1.1 when it is not installed
+        http2 = ConfigClass.HTTP2_ENABLED and find_spec('h2') is not None
+        timeout = self.timeouts.get(service, ConfigClass.HTTP_DEFAULT_TIMEOUT)
+        return httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2)
+
+    def get(self, service: str) -> httpx.AsyncClient:
+        """Return the shared client for the service."""
+        client = self._clients.get(service)
+        if client is None or client.is_closed:
+            client = self._create_client(service)
+            self._clients[service] = client
+        return client
+
+    async def start(self) -> None:
+        for service in self.timeouts:
+            self.get(service)
+
+    async def close(self) -> None:
+        clients, self._clients = self._clients, {}
+        for service, client in clients.items():
+            try:
+                await client.aclose()
+            except Exception as e:
+                self.logger.error(f'error closing http client of {service}: {e}')
+
+
+http_clients = HTTPClientPool()
@@ -13,7 +13,9 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import asyncio
 from io import BytesIO
+from typing import List
 
 from aiokafka import AIOKafkaProducer
 from aiokafka.errors import KafkaError
@@ -29,7 +31,11 @@ class KafkaProducerClient:
 
     async def create_kafka_producer(self):
         if not self.aioproducer:
-            self.aioproducer = AIOKafkaProducer(bootstrap_servers=[ConfigClass.KAFKA_URL])
+            self.aioproducer = AIOKafkaProducer(
+                bootstrap_servers=[ConfigClass.KAFKA_URL],
+                linger_ms=ConfigClass.KAFKA_LINGER_MS,
+                max_batch_size=ConfigClass.KAFKA_MAX_BATCH_SIZE,
+            )
             await self.aioproducer.start()
 
     async def send(self, topic: str, msg: BytesIO):
@@ -38,6 +44,14 @@ class KafkaProducerClient:
         except KafkaError as ke:
             self.logger.exception('error sending ActivityLog to Kafka: %s', ke)
 
+    async def send_many(self, topic: str, msgs: List[bytes]):
+        """Queue all the messages into the producer batches, then wait until they are delivered."""
+        try:
+            deliveries = [await self.aioproducer.send(topic, msg) for msg in msgs]
+            await asyncio.gather(*deliveries)
+        except KafkaError as ke:
+            self.logger.exception('error sending ActivityLog to Kafka: %s', ke)
+
 
 kafka_client = KafkaProducerClient()
 
@@ -14,32 +14,118 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from typing import Any
+from typing import AsyncIterator
 from typing import Dict
-
-import httpx
+from typing import Iterable
+from typing import List
+from typing import Optional
 
 from app.config import ConfigClass
 
 from .base import BaseClient
+from .http_pool import HTTPClientPool
+from .metadata_cache import metadata_cache
+
+
+class MetadataBulkUpdateError(Exception):
+    """A bulk update failed part way, `updated` holds the items of the chunks that were applied before it."""
+
+    def __init__(self, message: str, updated: List[Dict[str, Any]]):
+        super().__init__(message)
+        self.updated = updated
 
 
 class MetadataClient(BaseClient):
 
     BASE_URL = ConfigClass.METADATA_SERVICE
+    SERVICE = HTTPClientPool.METADATA
     ITEM_URL = f'{BASE_URL}/v1/item/'
     SEARCH_URL = f'{BASE_URL}/v1/items/search/'
+    BATCH_URL = f'{BASE_URL}/v1/items/batch/'
 
     @classmethod
     async def get_objects(cls, code: str, items_type: str = 'dataset') -> Dict[str, Any]:
+        """Return every item of the container, through the listing cache."""
+
+        async def fetch():
+            params = {
+                'recursive': True,
+                'zone': 1,
+                'container_type': items_type,
+                'page_size': 100000,
+                'container_code': code,
+            }
+            return (await cls.get(cls.SEARCH_URL, params))['result']
 
+        return await metadata_cache.get((code, items_type), fetch)
+
+    @classmethod
+    async def iter_objects(
+        cls,
+        code: str,
+        items_type: str = 'dataset',
+        fields: Optional[Iterable[str]] = None,
+        page_size: Optional[int] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Yield every item of the container, one search page at a time.
+
+        Only a single page is held in memory at any point, and when `fields` is given the items are reduced to
+        those of the keys they have so consumers can keep compact records of large containers. The listing is not
+        cached. Pages are ordered by creation time so items created while iterating only show up on the last pages,
+        with the unique id breaking the ties so items created at the same time are not repeated or skipped across
+        page boundaries.
+        """
+        fields = tuple(fields) if fields else None
         params = {
             'recursive': True,
             'zone': 1,
             'container_type': items_type,
-            'page_size': 100000,
             'container_code': code,
+            'page_size': page_size or ConfigClass.METADATA_ITER_PAGE_SIZE,
+            'sorting': 'created_time,id',
+            'order': 'asc',
+        }
+        page = 0
+        while True:
+            response = await cls.get(cls.SEARCH_URL, {**params, 'page': page})
+            items, num_of_pages = response['result'], response.get('num_of_pages', 1)
+            del response
+            for item in items:
+                yield {field: item[field] for field in fields if field in item} if fields else item
+            page += 1
+            if not items or page >= num_of_pages:
+                return
+
+    @classmethod
+    async def search_objects(
+        cls,
+        code: str,
+        parent_path: Optional[str] = None,
+        items_type: str = 'dataset',
+        page: int = 0,
+        page_size: int = 25,
+        sorting: str = 'created_time',
+        order: str = 'desc',
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Return one page of the items directly under `parent_path`, the root level when it is None.
+
+        The response carries the `result` page along with the `total` and `num_of_pages` of the search.
+        """
+        params = {
+            'recursive': False,
+            'zone': 1,
+            'container_type': items_type,
+            'container_code': code,
+            'page': page,
+            'page_size': page_size,
+            'sorting': sorting,
+            'order': order,
+            **(filters or {}),
         }
-        return (await cls.get(cls.SEARCH_URL, params))['result']
+        if parent_path:
+            params['parent_path'] = parent_path
+        return await cls.get(cls.SEARCH_URL, params)
 
     @classmethod
     async def get_by_id(cls, id_: str) -> Dict[str, Any]:
@@ -52,13 +138,45 @@ class MetadataClient(BaseClient):
         if not payload.get('parent'):
             payload['parent_path'] = None
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(cls.ITEM_URL, json=payload)
+        response = await cls.http_client().post(cls.ITEM_URL, json=payload)
+        await metadata_cache.invalidate(payload.get('container_code'), payload.get('container_type', 'dataset'))
         response.raise_for_status()
         return response.json()['result']
 
     @classmethod
-    async def delete_object(cls, id_: str) -> None:
-        async with httpx.AsyncClient() as client:
-            response = await client.delete(url=cls.ITEM_URL, params={'id': id_})
+    async def update_objects(
+        cls, items: List[Dict[str, Any]], container_code: str, container_type: str = 'dataset'
+    ) -> List[Dict[str, Any]]:
+        """Update the given attributes of the items in place, in chunks of METADATA_BULK_UPDATE_CHUNK_SIZE items.
+
+        Every item carries its `id` along with the attributes to update. When a chunk fails the chunks before it stay
+        applied, a MetadataBulkUpdateError carrying their items is raised.
+        """
+        chunk_size = ConfigClass.METADATA_BULK_UPDATE_CHUNK_SIZE
+        updated = []
+        try:
+            for start in range(0, len(items), chunk_size):
+                chunk = items[start : start + chunk_size]
+                response = await cls.http_client().put(
+                    cls.BATCH_URL, params={'ids': [item['id'] for item in chunk]}, json={'items': chunk}
+                )
+                response.raise_for_status()
+                updated.extend(response.json()['result'])
+        except Exception as e:
+            raise MetadataBulkUpdateError(
+                f'Bulk update failed after {len(updated)} of {len(items)} items: {e}', updated
+            )
+        finally:
+            await metadata_cache.invalidate(container_code, container_type)
+        return updated
+
+    @classmethod
+    async def delete_object(cls, id_: str, container_code: str = None, container_type: str = 'dataset') -> None:
+        """Delete the item, the container is looked up when not given so its cached listing can be invalidated."""
+        if container_code is None:
+            item = await cls.get_by_id(id_)
+            container_code, container_type = item['container_code'], item['container_type']
+
+        response = await cls.http_client().delete(url=cls.ITEM_URL, params={'id': id_})
+        await metadata_cache.invalidate(container_code, container_type)
         response.raise_for_status()
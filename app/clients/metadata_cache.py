@@ -0,0 +1,169 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+from common import LoggerFactory
+
+from app.config import ConfigClass
+from app.core.redis import redis_client
+
+CacheKey = Tuple[str, str]
+
+
+class MetadataListingCache:
+    """Read-through cache of the full item listing of a container, keyed by (container_code, container_type).
+
+    Listings are kept for `ttl` seconds in redis when `redis_enabled` is set, where the invalidations of every
+    process are seen, and in process when `local_enabled` is set. An invalidation only reaches the entries of the
+    process that made it, so the local tier is off by default and must only be enabled when a single process
+    writes to the containers. Local entries are evicted in LRU order once more than `max_items` items are cached
+    in total. The cache is bypassed when neither tier is enabled.
+
+    The entries are stored serialized so every reader gets its own copy of the items, and concurrent misses on the
+    same container wait for a single fetch. Writes of this service invalidate the listing of their container.
+    """
+
+    logger = LoggerFactory('MetadataListingCache').get_logger()
+
+    def __init__(
+        self, ttl: float = None, max_items: int = None, redis_enabled: bool = None, local_enabled: bool = None
+    ) -> None:
+        self.ttl = ConfigClass.METADATA_CACHE_TTL if ttl is None else ttl
+        self.max_items = ConfigClass.METADATA_CACHE_MAX_ITEMS if max_items is None else max_items
+        self.redis_enabled = ConfigClass.METADATA_CACHE_REDIS_ENABLED if redis_enabled is None else redis_enabled
+        self.local_enabled = ConfigClass.METADATA_CACHE_LOCAL_ENABLED if local_enabled is None else local_enabled
+        self._entries: 'OrderedDict[CacheKey, Tuple[float, int, bytes]]' = OrderedDict()
+        self._num_items = 0
+        self._pending: Dict[CacheKey, asyncio.Future] = {}
+        # bumped by every invalidation so a fetch started before it is not cached
+        self._generations: Dict[CacheKey, int] = {}
+
+    @staticmethod
+    def _redis_key(key: CacheKey) -> str:
+        return f'metadata_listing:{key[1]}:{key[0]}'
+
+    def _get_local(self, key: CacheKey) -> bytes:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, _, data = entry
+        if expires_at < time.monotonic():
+            self._pop_local(key)
+            return None
+        self._entries.move_to_end(key)
+        return data
+
+    def _pop_local(self, key: CacheKey) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._num_items -= entry[1]
+
+    def _set_local(self, key: CacheKey, num_items: int, data: bytes, ttl: float) -> None:
+        if not self.local_enabled or num_items > self.max_items:
+            return
+        self._pop_local(key)
+        self._entries[key] = (time.monotonic() + ttl, num_items, data)
+        self._num_items += num_items
+        while self._num_items > self.max_items:
+            _, (_, evicted_items, _) = self._entries.popitem(last=False)
+            self._num_items -= evicted_items
+
+    async def _get_redis(self, key: CacheKey) -> Tuple[bytes, float]:
+        if not self.redis_enabled:
+            return None, 0
+        try:
+            redis = await redis_client()
+            data = await redis.get(self._redis_key(key))
+            ttl = await redis.ttl(self._redis_key(key)) if data else 0
+            return data, ttl
+        except Exception as e:
+            self.logger.error(f'Error reading metadata listing from redis: {e}')
+            return None, 0
+
+    async def _set_redis(self, key: CacheKey, data: bytes) -> None:
+        if not self.redis_enabled:
+            return
+        try:
+            redis = await redis_client()
+            await redis.set(self._redis_key(key), data, ex=max(1, int(self.ttl)))
+        except Exception as e:
+            self.logger.error(f'Error writing metadata listing to redis: {e}')
+
+    async def get(self, key: CacheKey, fetch: Callable[[], Awaitable[List[Dict[str, Any]]]]) -> List[Dict[str, Any]]:
+        """Return the cached listing of the container, calling `fetch` on a miss."""
+        if self.ttl <= 0 or not (self.local_enabled or self.redis_enabled):
+            return await fetch()
+
+        data = self._get_local(key)
+        if data is not None:
+            return json.loads(data)
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            return json.loads(await asyncio.shield(pending))
+
+        future = asyncio.get_event_loop().create_future()
+        self._pending[key] = future
+        generation = self._generations.get(key, 0)
+        try:
+            data, ttl = await self._get_redis(key)
+            if data is not None:
+                items = json.loads(data)
+            else:
+                items = await fetch()
+                data = json.dumps(items).encode('utf-8')
+                ttl = self.ttl
+                if generation == self._generations.get(key, 0):
+                    await self._set_redis(key, data)
+            if generation == self._generations.get(key, 0):
+                self._set_local(key, len(items), data, ttl)
+            future.set_result(data)
+            return items
+        except BaseException as e:
+            future.set_exception(e)
+            # the waiters get the error, do not report it again when the future is collected
+            future.exception()
+            raise
+        finally:
+            del self._pending[key]
+
+    async def invalidate(self, container_code: str, container_type: str) -> None:
+        key = (container_code, container_type)
+        self._generations[key] = self._generations.get(key, 0) + 1
+        self._pop_local(key)
+        if self.redis_enabled:
+            try:
+                redis = await redis_client()
+                await redis.delete(self._redis_key(key))
+            except Exception as e:
+                self.logger.error(f'Error invalidating metadata listing in redis: {e}')
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._num_items = 0
+        self._generations.clear()
+
+
+metadata_cache = MetadataListingCache()
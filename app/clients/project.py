@@ -19,11 +19,13 @@ from typing import Dict
 from app.config import ConfigClass
 
 from .base import BaseClient
+from .http_pool import HTTPClientPool
 
 
 class ProjectClient(BaseClient):
 
     BASE_URL = ConfigClass.PROJECT_SERVICE
+    SERVICE = HTTPClientPool.PROJECT
 
     @classmethod
     async def get_by_id(cls, id_: str) -> Dict[str, Any]:
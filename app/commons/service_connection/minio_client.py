@@ -13,7 +13,14 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from datetime import timedelta
+
 import httpx
+import jwt
 from minio import Minio
 from minio.commonconfig import CopySource
 from minio.credentials.providers import ClientGrantsProvider
@@ -21,6 +28,28 @@ from minio.credentials.providers import ClientGrantsProvider
 from app.config import ConfigClass
 
 
+class EarlyRefreshClientGrantsProvider(ClientGrantsProvider):
+    """ClientGrantsProvider that asks for new STS credentials `refresh_margin` seconds before they expire.
+
+    The provider is shared by every thread using the cached client, so the refresh is done under a lock.
+    """
+
+    def __init__(self, jwt_provider_func, sts_endpoint, refresh_margin):
+        super().__init__(jwt_provider_func, sts_endpoint)
+        self._refresh_margin = timedelta(seconds=refresh_margin)
+        self._lock = threading.Lock()
+
+    def retrieve(self):
+        with self._lock:
+            # minio 7.0 only exposes the expiration through is_expired(), which uses a fixed 10 seconds margin
+            expiration = self._credentials and self._credentials._expiration
+            if expiration:
+                if expiration > datetime.utcnow() + self._refresh_margin:
+                    return self._credentials
+                self._credentials = None
+            return super().retrieve()
+
+
 class Minio_Client_:
     def __init__(self, access_token, refresh_token):
         # preset the tokens for refreshing
@@ -64,9 +93,10 @@ class Minio_Client_:
     def get_provider(self):
         minio_http = ('https://' if ConfigClass.MINIO_HTTPS else 'http://') + ConfigClass.MINIO_ENDPOINT
         # print(minio_http)
-        provider = ClientGrantsProvider(
+        provider = EarlyRefreshClientGrantsProvider(
             self._get_jwt,
             minio_http,
+            ConfigClass.MINIO_CREDENTIALS_REFRESH_MARGIN,
         )
 
         return provider
@@ -90,6 +120,66 @@ class Minio_Client_:
         return result
 
 
+def get_token_subject(access_token):
+    """Returns the subject of the access token, without verifying it."""
+    try:
+        return jwt.decode(access_token.replace('Bearer ', ''), verify=False).get('sub')
+    except Exception:
+        return None
+
+
+class MinioClientCache:
+    """LRU cache of the token bound minio clients, keyed by the subject of the user token.
+
+    One client is kept per user, so the keycloak token exchange and the STS call are only done once until the
+    credentials are about to expire instead of once per minio operation. A client is only handed out for the exact
+    access token it was created with, since the subject itself is read from the token without verifying it.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, access_token, refresh_token):
+        subject = get_token_subject(access_token)
+        if subject is None or not self.max_size:
+            return Minio_Client_(access_token, refresh_token)
+
+        token_digest = hashlib.sha256(access_token.encode('utf-8')).hexdigest()
+        with self._lock:
+            cached = self._clients.get(subject)
+            if cached and cached[0] == token_digest:
+                self._clients.move_to_end(subject)
+                return cached[1]
+
+        # build the client outside of the lock, it does not talk to keycloak until the first request
+        mc = Minio_Client_(access_token, refresh_token)
+        with self._lock:
+            self._clients[subject] = (token_digest, mc)
+            self._clients.move_to_end(subject)
+            while len(self._clients) > self.max_size:
+                self._clients.popitem(last=False)
+        return mc
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+
+
+minio_clients = MinioClientCache(ConfigClass.MINIO_CLIENT_CACHE_SIZE)
+
+
+def get_minio_client(access_token, refresh_token):
+    """Returns the cached minio client of the user, creating it if needed.
+
+    Without access token, for the jobs run from the queue, the client uses the service credentials.
+    """
+    if not access_token:
+        return Minio_Client()
+    return minio_clients.get(access_token, refresh_token)
+
+
 class Minio_Client:
     def __init__(self):
 
@@ -62,6 +62,14 @@ class Settings(BaseSettings):
     MINIO_ACCESS_KEY: str
     MINIO_SECRET_KEY: str
     KEYCLOAK_MINIO_SECRET: str
+    # number of users whose token bound minio client is kept, 0 disables the cache
+    MINIO_CLIENT_CACHE_SIZE: int = 256
+    # STS credentials are renewed this many seconds before they expire
+    MINIO_CREDENTIALS_REFRESH_MARGIN: int = 60
+    # files from that size on are copied with parallel ranged part copies instead of a single request
+    MINIO_COPY_MULTIPART_THRESHOLD: int = 256 * 1024 * 1024
+    MINIO_COPY_PART_SIZE: int = 64 * 1024 * 1024
+    MINIO_COPY_CONCURRENCY: int = 4
 
     QUEUE_SERVICE: str
     CATALOGUING_SERVICE: str
@@ -75,20 +83,114 @@ class Settings(BaseSettings):
     METADATA_SERVICE: str
     PROJECT_SERVICE: str
 
+    # outbound http connection pool, shared by all the service clients
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    HTTP2_ENABLED: bool = True
+    HTTP_DEFAULT_TIMEOUT: float = 5.0
+    METADATA_SERVICE_TIMEOUT: float = 30.0
+    PROJECT_SERVICE_TIMEOUT: float = 5.0
+    DATA_OPS_UTIL_TIMEOUT: float = 10.0
+    QUEUE_SERVICE_TIMEOUT: float = 5.0
+    CATALOGUING_SERVICE_TIMEOUT: float = 10.0
+
+    # max number of resource keys sent in one bulk lock/unlock request
+    RESOURCE_LOCK_CHUNK_SIZE: int = 500
+
+    # number of files copied at the same time by one import/move/rename
+    FILE_COPY_CONCURRENCY: int = 8
+    # move and rename update the items in place instead of copying and deleting them
+    FILE_MOVE_IN_PLACE: bool = True
+
+    # placeholder trees the bids-validator runs on, kept between validations
+    BIDS_WORKSPACE_ROOT: str = 'temp/'
+    BIDS_VALIDATOR_TIMEOUT: float = 600.0
+    BIDS_VALIDATOR_CONCURRENCY: int = 2
+
+    # job status updates of the file operations are buffered and sent together
+    JOB_STATUS_FLUSH_INTERVAL: float = 1.0
+    JOB_STATUS_BATCH_SIZE: int = 200
+    # send each flush as one DATASET_FILE_NOTIFICATION_BATCH message and tasks/bulk requests, the consumers must
+    # support them, instead of one DATASET_FILE_NOTIFICATION message and tasks/ request per transition
+    JOB_STATUS_BULK_ENABLED: bool = False
+
+    # run the file operations and publish through the job queue instead of request background tasks
+    JOB_QUEUE_ENABLED: bool = False
+    # jobs running at the same time over all the runners
+    JOB_QUEUE_MAX_RUNNING: int = 16
+    JOB_QUEUE_MAX_ATTEMPTS: int = 3
+    JOB_QUEUE_HEARTBEAT_INTERVAL: float = 15.0
+    # a running job without heartbeat for that long is considered lost and run again
+    JOB_QUEUE_STALE_AFTER: float = 120.0
+    # succeeded and failed jobs are deleted with their checkpoints that long after they finished, 0 keeps them
+    JOB_QUEUE_RETENTION: float = 7 * 24 * 60 * 60
+    JOB_QUEUE_PURGE_INTERVAL: float = 60 * 60
+    # also run the jobs inside the API workers instead of only the dedicated worker process
+    JOB_RUNNER_EMBEDDED: bool = False
+    JOB_RUNNER_CONCURRENCY: int = 4
+    JOB_RUNNER_POLL_INTERVAL: float = 1.0
+
+    # publish zips the dataset straight into a multipart upload instead of staging it under /tmp
+    PUBLISH_STREAMING_ENABLED: bool = True
+    PUBLISH_DOWNLOAD_CONCURRENCY: int = 4
+    # minio requires at least 5MiB per part
+    PUBLISH_PART_SIZE: int = 16 * 1024 * 1024
+    PUBLISH_MEMORY_BUDGET: int = 256 * 1024 * 1024
+
+    # full container listings of metadata, 0 seconds disables the cache
+    METADATA_CACHE_TTL: float = 30.0
+    METADATA_CACHE_MAX_ITEMS: int = 500000
+    # cache the listings in redis, shared with and invalidated by every worker
+    METADATA_CACHE_REDIS_ENABLED: bool = False
+    # also cache the listings in process, only safe when a single process writes to metadata
+    METADATA_CACHE_LOCAL_ENABLED: bool = False
+    # dataset rows looked up by id or code, the writes of this service invalidate them, 0 seconds disables the cache
+    DATASET_CACHE_TTL: float = 5.0
+    DATASET_CACHE_MAX_ENTRIES: int = 10000
+    # cache the rows in redis, shared with and invalidated by every worker
+    DATASET_CACHE_REDIS_ENABLED: bool = False
+    # also cache the rows in process, only safe when a single process writes to the datasets
+    DATASET_CACHE_LOCAL_ENABLED: bool = False
+    # items fetched per page when streaming a container listing
+    METADATA_ITER_PAGE_SIZE: int = 1000
+    # max number of items sent in one bulk update
+    METADATA_BULK_UPDATE_CHUNK_SIZE: int = 500
+
     RDS_ECHO_SQL_QUERIES: bool = False
 
     OPSDB_UTILITY_HOST: str
     OPSDB_UTILITY_PORT: str
     OPSDB_UTILITY_USERNAME: str
     OPSDB_UTILITY_PASSWORD: str
+    # pool of each process, the database sees up to processes * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    # seconds a session waits for a free connection before failing
+    DB_POOL_TIMEOUT: float = 30.0
+    # connections are replaced after that many seconds, before the server or a proxy drops them
+    DB_POOL_RECYCLE: int = 30 * 60
+    DB_POOL_PRE_PING: bool = True
+    # statements prepared by each asyncpg connection, set 0 behind a pooler in transaction mode
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = 100
+    DB_APPLICATION_NAME: str = SRV_NAMESPACE
 
     # Redis Service
     REDIS_HOST: str
     REDIS_PORT: str
     REDIS_DB: str
     REDIS_PASSWORD: str
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30
+    # seconds a request waits for a free connection when the pool is exhausted
+    REDIS_POOL_TIMEOUT: float = 5.0
+    # the publish guard of a dataset expires on its own if the worker died
+    PUBLISH_GUARD_TTL: int = 1 * 60 * 60
 
     KAFKA_URL: str
+    # activity logs are grouped by the producer for up to KAFKA_LINGER_MS
+    KAFKA_LINGER_MS: int = 50
+    KAFKA_MAX_BATCH_SIZE: int = 256 * 1024
 
     # download secret
     DOWNLOAD_KEY: str = 'indoc101'
@@ -13,18 +13,102 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import time
+from contextlib import asynccontextmanager
+from typing import Any
+from typing import AsyncIterator
+from typing import Dict
+from typing import Optional
+
 from fastapi import Depends
 from sqlalchemy import MetaData
+from sqlalchemy import exc
 from sqlalchemy.ext.asyncio import AsyncEngine
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.pool import Pool
 
 from app.config import ConfigClass
 
 DBModel = declarative_base(metadata=MetaData(schema=ConfigClass.RDS_SCHEMA_DEFAULT))
 
 
+class PoolMetrics:
+    """Counters of the connection checkouts of the process, used to size the pool from the observed waits."""
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def record_checkout(self, wait_time: float, timed_out: bool = False) -> None:
+        self.checkouts += 1
+        self.timeouts += timed_out
+        self.wait_time_total += wait_time
+        self.wait_time_max = max(self.wait_time_max, wait_time)
+
+    def to_dict(self, pool: Optional[Pool] = None) -> Dict[str, Any]:
+        result = {
+            'checkouts': self.checkouts,
+            'timeouts': self.timeouts,
+            'wait_time_total': self.wait_time_total,
+            'wait_time_max': self.wait_time_max,
+            'wait_time_avg': self.wait_time_total / self.checkouts if self.checkouts else 0.0,
+        }
+        if isinstance(pool, AsyncAdaptedQueuePool):
+            result.update(
+                {
+                    'size': pool.size(),
+                    'checked_in': pool.checkedin(),
+                    'checked_out': pool.checkedout(),
+                    'overflow': pool.overflow(),
+                }
+            )
+        return result
+
+
+db_pool_metrics = PoolMetrics()
+
+
+class InstrumentedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool recording how long every checkout waited for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            db_pool_metrics.record_checkout(time.perf_counter() - start, timed_out=True)
+            raise
+        db_pool_metrics.record_checkout(time.perf_counter() - start)
+        return connection
+
+
+def create_db_engine(uri: Optional[str] = None) -> AsyncEngine:
+    """Create an AsyncEngine with the pool and driver settings of the config."""
+
+    return create_async_engine(
+        uri or ConfigClass.OPS_DB_URI,
+        poolclass=InstrumentedAsyncAdaptedQueuePool,
+        pool_size=ConfigClass.DB_POOL_SIZE,
+        max_overflow=ConfigClass.DB_MAX_OVERFLOW,
+        pool_timeout=ConfigClass.DB_POOL_TIMEOUT,
+        pool_recycle=ConfigClass.DB_POOL_RECYCLE,
+        pool_pre_ping=ConfigClass.DB_POOL_PRE_PING,
+        connect_args={
+            'prepared_statement_cache_size': ConfigClass.DB_PREPARED_STATEMENT_CACHE_SIZE,
+            'server_settings': {'application_name': ConfigClass.DB_APPLICATION_NAME},
+        },
+    )
+
+
 class GetDBEngine:
     """Create a FastAPI callable dependency for SQLAlchemy single AsyncEngine instance."""
 
@@ -35,15 +119,32 @@ class GetDBEngine:
         """Return an instance of AsyncEngine class."""
 
         if not self.instance:
-            self.instance = create_async_engine(ConfigClass.OPS_DB_URI)
+            self.instance = create_db_engine()
         return self.instance
 
 
 db_engine = GetDBEngine()
 
+# the sessions are bound to the engine when created, so the factory does not create the engine on import
+db_session_factory = sessionmaker(class_=AsyncSession, expire_on_commit=False)
+
+
+@asynccontextmanager
+async def db_session_scope() -> AsyncIterator[AsyncSession]:
+    """Open a session outside of a request, its connection goes back to the pool on exit.
+
+    The background work keeps the session only around its statements, so long jobs do not hold connections.
+    """
+
+    db = db_session_factory(bind=await db_engine())
+    try:
+        yield db
+    finally:
+        await db.close()
+
 
 async def get_db_session(engine=Depends(db_engine)) -> AsyncSession:
-    db = AsyncSession(bind=engine, expire_on_commit=False)
+    db = db_session_factory(bind=engine)
     try:
         yield db
     finally:
@@ -0,0 +1,52 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from aioredis import BlockingConnectionPool
+from aioredis import StrictRedis
+
+from app.config import ConfigClass
+
+
+class GetRedisClient:
+    """Create a FastAPI callable dependency for a single pooled StrictRedis instance."""
+
+    def __init__(self) -> None:
+        self.instance = None
+
+    async def __call__(self) -> StrictRedis:
+        """Return the StrictRedis instance shared by the process."""
+
+        if not self.instance:
+            pool = BlockingConnectionPool(
+                host=ConfigClass.REDIS_HOST,
+                port=ConfigClass.REDIS_PORT,
+                password=ConfigClass.REDIS_PASSWORD,
+                db=ConfigClass.REDIS_DB,
+                max_connections=ConfigClass.REDIS_MAX_CONNECTIONS,
+                health_check_interval=ConfigClass.REDIS_HEALTH_CHECK_INTERVAL,
+                timeout=ConfigClass.REDIS_POOL_TIMEOUT,
+            )
+            self.instance = StrictRedis(connection_pool=pool)
+        return self.instance
+
+    async def close(self) -> None:
+        """Disconnect the pooled connections, a new pool is created on the next call."""
+
+        if self.instance:
+            await self.instance.connection_pool.disconnect()
+            self.instance = None
+
+
+redis_client = GetRedisClient()
@@ -18,8 +18,19 @@ from app.core.db import DBModel
 
 from .bids import BIDSResult
 from .dataset import Dataset
+from .job import FileOperationCheckpoint
+from .job import FileOperationJob
 from .schema import DatasetSchema
 from .schema import DatasetSchemaTemplate
 from .version import DatasetVersion
 
-__all__ = ['DBModel', 'BIDSResult', 'Dataset', 'DatasetVersion', 'DatasetSchema', 'DatasetSchemaTemplate']
+__all__ = [
+    'DBModel',
+    'BIDSResult',
+    'Dataset',
+    'DatasetVersion',
+    'DatasetSchema',
+    'DatasetSchemaTemplate',
+    'FileOperationCheckpoint',
+    'FileOperationJob',
+]
@@ -18,6 +18,7 @@ from uuid import uuid4
 
 from sqlalchemy import VARCHAR
 from sqlalchemy import Column
+from sqlalchemy import Index
 from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.dialects.postgresql import INTEGER
 from sqlalchemy.dialects.postgresql import TIMESTAMP
@@ -30,6 +31,8 @@ class Dataset(DBModel):
     """Dataset database model."""
 
     __tablename__ = 'datasets'
+    # serves the per-creator listing, newest first, in both the offset and keyset modes
+    __table_args__ = (Index('ix_datasets_creator_created_at_id', 'creator', 'created_at', 'id'),)
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     source = Column(VARCHAR(length=256), nullable=False)
@@ -0,0 +1,78 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from datetime import datetime
+from uuid import uuid4
+
+from sqlalchemy import BOOLEAN
+from sqlalchemy import TEXT
+from sqlalchemy import VARCHAR
+from sqlalchemy import Column
+from sqlalchemy import ForeignKey
+from sqlalchemy import Index
+from sqlalchemy.dialects.postgresql import BIGINT
+from sqlalchemy.dialects.postgresql import INTEGER
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import TIMESTAMP
+from sqlalchemy.dialects.postgresql import UUID
+
+from app.models import DBModel
+
+
+class FileOperationJob(DBModel):
+    """File operation waiting for, or being run by, the job runner."""
+
+    __tablename__ = 'file_operation_jobs'
+    __table_args__ = (
+        Index('ix_file_operation_jobs_status_created_at', 'status', 'created_at'),
+        Index('ix_file_operation_jobs_dataset_code_status', 'dataset_code', 'status'),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    action = Column(VARCHAR(length=64), nullable=False)
+    dataset_code = Column(VARCHAR(length=32), nullable=False)
+    payload = Column(JSONB(), nullable=False)
+    status = Column(VARCHAR(length=16), nullable=False)
+    attempts = Column(INTEGER(), default=0, nullable=False)
+    worker_id = Column(VARCHAR(length=256))
+    error = Column(TEXT())
+    heartbeat_at = Column(TIMESTAMP(timezone=True))
+    created_at = Column(TIMESTAMP(timezone=True), default=datetime.utcnow, nullable=False)
+    updated_at = Column(TIMESTAMP(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        result = {}
+        for field in ['id', 'action', 'dataset_code', 'status', 'attempts', 'worker_id', 'error']:
+            result[field] = getattr(self, field)
+        result['id'] = str(self.id)
+        for field in ['heartbeat_at', 'created_at', 'updated_at']:
+            value = getattr(self, field)
+            result[field] = str(value.strftime('%Y-%m-%dT%H:%M:%S')) if value else None
+        return result
+
+
+class FileOperationCheckpoint(DBModel):
+    """Item processed by a file operation job, a job run again skips the finished items."""
+
+    __tablename__ = 'file_operation_checkpoints'
+
+    job_id = Column(UUID(as_uuid=True), ForeignKey(FileOperationJob.id, ondelete='CASCADE'), primary_key=True)
+    item_id = Column(VARCHAR(length=256), primary_key=True)
+    # the item created by the operation, kept so the children of an unfinished folder reuse it
+    new_item = Column(JSONB())
+    num_of_files = Column(INTEGER(), default=0, nullable=False)
+    size = Column(BIGINT(), default=0, nullable=False)
+    finished = Column(BOOLEAN(), default=True, nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), default=datetime.utcnow, nullable=False)
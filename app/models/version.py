@@ -16,6 +16,7 @@
 from datetime import datetime
 
 from sqlalchemy import Column
+from sqlalchemy import Index
 from sqlalchemy import Integer
 from sqlalchemy import String
 from sqlalchemy.dialects.postgresql import TIMESTAMP
@@ -26,7 +27,13 @@ from app.models import DBModel
 
 class DatasetVersion(DBModel):
     __tablename__ = 'version'
-    __table_args__ = {'schema': ConfigClass.RDS_SCHEMA_DEFAULT}
+    __table_args__ = (
+        # duplicate checks and lookups of a given version
+        Index('ix_version_dataset_geid_version_created_at', 'dataset_geid', 'version', 'created_at'),
+        # listing and lookup of the latest version
+        Index('ix_version_dataset_geid_created_at', 'dataset_geid', 'created_at'),
+        {'schema': ConfigClass.RDS_SCHEMA_DEFAULT},
+    )
     id = Column(Integer, primary_key=True)
     dataset_code = Column(String())
     dataset_geid = Column(String())
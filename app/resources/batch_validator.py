@@ -0,0 +1,79 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import NamedTuple
+
+from app.resources.tree_index import ContainerTreeIndex
+
+RENAMED_FEEDBACK = 'duplicate in same batch, update the name'
+
+
+class ValidationResult(NamedTuple):
+    passed: List[Dict[str, Any]]
+    ignored: List[Dict[str, Any]]
+    renamed: List[Dict[str, Any]]
+
+
+class BatchValidator:
+    """Validate batches of item ids against the items of one container.
+
+    The lookups come from the container tree index, built in a single pass over the listing, so a batch costs one
+    dict lookup per id. The passed items are copies carrying the feedback, the items of the index are never
+    modified. Items of the batch sharing the same name are all renamed after their parent path and reported in
+    `renamed` as well as in `passed`.
+    """
+
+    def __init__(self, tree_index: ContainerTreeIndex) -> None:
+        self.tree_index = tree_index
+
+    @staticmethod
+    def get_batch_name(item: Dict[str, Any]) -> str:
+        if not item.get('parent_path'):
+            return item['name']
+        return item['parent_path'].replace('.', '_') + '_' + item['name']
+
+    async def validate(self, file_ids: Iterable[str]) -> ValidationResult:
+        await self.tree_index.load()
+
+        result = ValidationResult([], [], [])
+        seen_ids = set()
+        # name -> position in passed of the first item of the batch with that name
+        batch_names = {}
+        for file_id in file_ids:
+            item = await self.tree_index.get_by_id(file_id)
+            if item is None:
+                result.ignored.append({'id': file_id, 'feedback': 'unauthorized'})
+                continue
+            if file_id in seen_ids:
+                result.ignored.append({'id': file_id, 'feedback': 'duplicate in same batch'})
+                continue
+            seen_ids.add(file_id)
+
+            node = {**item, 'feedback': 'exist'}
+            first_index = batch_names.setdefault(item['name'], len(result.passed))
+            if first_index != len(result.passed):
+                first_node = result.passed[first_index]
+                if first_node['feedback'] != RENAMED_FEEDBACK:
+                    first_node.update({'name': self.get_batch_name(first_node), 'feedback': RENAMED_FEEDBACK})
+                    result.renamed.append(first_node)
+                node.update({'name': self.get_batch_name(node), 'feedback': RENAMED_FEEDBACK})
+                result.renamed.append(node)
+            result.passed.append(node)
+
+        return result
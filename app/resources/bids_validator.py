@@ -0,0 +1,189 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import fcntl
+import json
+import os
+import signal
+from typing import Any
+from typing import Dict
+from typing import List
+
+from starlette.concurrency import run_in_threadpool
+
+from app.config import ConfigClass
+from app.resources.utils import get_node_logical_path
+from app.resources.utils import json_data
+
+
+class BIDSWorkspaceError(Exception):
+    """The placeholder tree of the dataset could not be updated."""
+
+
+class BIDSValidationTimeout(Exception):
+    """The bids-validator did not finish in time."""
+
+
+class BIDSWorkspace:
+    """Placeholder copy of a dataset tree that bids-validator can run on.
+
+    Every file of the dataset is a sparse file of the same size, so the tree costs almost no disk space. The
+    workspace is kept between validations along with a manifest of its files, and `sync` only creates, resizes or
+    removes the files that changed in metadata since the previous validation.
+    """
+
+    def __init__(self, code: str, root: str = None) -> None:
+        root = root or ConfigClass.BIDS_WORKSPACE_ROOT
+        self.path = os.path.join(root, code)
+        # kept outside of the tree so bids-validator does not see them
+        self.manifest_path = os.path.join(root, code + '.manifest.json')
+        self.lock_path = os.path.join(root, code + '.lock')
+
+    def try_lock(self):
+        """Take the lock of the workspace shared by all the processes, return its file or None when it is held."""
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    @staticmethod
+    def unlock(lock_file) -> None:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        lock_file.close()
+
+    @staticmethod
+    def get_files(items: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Map the relative path of every file of the dataset to its size."""
+        files = {}
+        for item in items:
+            if item['type'].lower() == 'file':
+                file_path = os.path.normpath(get_node_logical_path(item))
+                if file_path.startswith('..'):
+                    continue
+                files[file_path] = item.get('size') or 0
+        return files
+
+    def _load_manifest(self) -> Dict[str, int]:
+        try:
+            with open(self.manifest_path) as manifest:
+                return json.load(manifest)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self, files: Dict[str, int]) -> None:
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as manifest:
+            json.dump(files, manifest)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _remove_file(self, file_path: str) -> None:
+        full_path = os.path.join(self.path, file_path)
+        if os.path.exists(full_path):
+            os.remove(full_path)
+
+        # prune the folders left empty
+        folder = os.path.dirname(full_path)
+        while folder != self.path and os.path.isdir(folder) and not os.listdir(folder):
+            os.rmdir(folder)
+            folder = os.path.dirname(folder)
+
+    def _write_file(self, file_path: str, size: int) -> None:
+        full_path = os.path.join(self.path, file_path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        if os.path.splitext(full_path)[1] == '.json':
+            with open(full_path, 'w') as outfile:
+                json.dump(json_data, outfile)
+        else:
+            with open(full_path, 'wb') as outfile:
+                outfile.truncate(size)
+
+    def sync(self, files: Dict[str, int]) -> None:
+        """Bring the workspace in line with `files`, touching only what differs from the previous sync."""
+        os.makedirs(self.path, exist_ok=True)
+        previous = self._load_manifest()
+        for file_path in previous.keys() - files.keys():
+            self._remove_file(file_path)
+        for file_path, size in files.items():
+            if previous.get(file_path) != size or not os.path.exists(os.path.join(self.path, file_path)):
+                self._write_file(file_path, size)
+        self._save_manifest(files)
+
+
+_validator_semaphore = None
+_workspace_locks = {}
+# how often a validation waiting for the workspace of another process checks its lock
+WORKSPACE_LOCK_POLL_INTERVAL = 0.1
+
+
+def _get_validator_semaphore() -> asyncio.Semaphore:
+    global _validator_semaphore
+    if _validator_semaphore is None:
+        _validator_semaphore = asyncio.Semaphore(ConfigClass.BIDS_VALIDATOR_CONCURRENCY)
+    return _validator_semaphore
+
+
+async def run_bids_validator(path: str, timeout: float = None) -> Dict[str, Any]:
+    """Run bids-validator on the folder in a subprocess and return its json report."""
+    timeout = timeout or ConfigClass.BIDS_VALIDATOR_TIMEOUT
+    process = await asyncio.create_subprocess_exec(
+        'bids-validator',
+        path,
+        '--json',
+        '--ignoreNiftiHeaders',
+        '--ignoreSubjectConsistency',
+        stdout=asyncio.subprocess.PIPE,
+        start_new_session=True,
+    )
+    try:
+        stdout, _ = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        raise BIDSValidationTimeout(f'bids-validator did not finish in {timeout} seconds')
+    finally:
+        # timed out or cancelled, the validator may have spawned children so kill its whole process group
+        if process.returncode is None:
+            os.killpg(process.pid, signal.SIGKILL)
+            # drain the pipes so the subprocess transport gets closed
+            await process.communicate()
+    return json.loads(stdout)
+
+
+async def validate_bids_dataset(code: str, items: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Sync the workspace of the dataset with its items and run bids-validator on it.
+
+    Validations of the same dataset are serialized since they share the workspace, by an asyncio lock inside the
+    process and by a file lock across the processes, and at most BIDS_VALIDATOR_CONCURRENCY validators run at the
+    same time in a process.
+    """
+    workspace = BIDSWorkspace(code)
+    lock = _workspace_locks.setdefault(code, asyncio.Lock())
+    async with lock:
+        lock_file = workspace.try_lock()
+        while lock_file is None:
+            await asyncio.sleep(WORKSPACE_LOCK_POLL_INTERVAL)
+            lock_file = workspace.try_lock()
+        try:
+            try:
+                await run_in_threadpool(workspace.sync, BIDSWorkspace.get_files(items))
+            except Exception as e:
+                raise BIDSWorkspaceError(str(e)) from e
+            async with _get_validator_semaphore():
+                return await run_bids_validator(workspace.path)
+        finally:
+            BIDSWorkspace.unlock(lock_file)
@@ -0,0 +1,180 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from common import LoggerFactory
+from starlette.concurrency import run_in_threadpool
+
+from app.clients import MetadataBulkUpdateError
+from app.clients import MetadataClient
+from app.commons.service_connection.minio_client import get_minio_client
+from app.config import ConfigClass
+from app.resources.object_copy import copy_object
+from app.resources.tree_index import ContainerTreeIndex
+from app.resources.utils import get_node_logical_path
+from app.resources.utils import run_concurrently
+
+logger = LoggerFactory('file_move').get_logger()
+
+
+def get_folder_path(folder: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Return the dot separated path of the folder contents, ``None`` for the dataset root."""
+    if not folder or not folder.get('id'):
+        return None
+    if folder.get('parent_path'):
+        return folder['parent_path'] + '.' + folder['name']
+    return folder['name']
+
+
+def is_in_subtree(folder_path: Optional[str], node: Dict[str, Any]) -> bool:
+    """Return whether the folder of path `folder_path` is the node or one of its descendants."""
+    if folder_path is None or node['type'].lower() != 'folder':
+        return False
+    node_path = get_folder_path(node)
+    return folder_path == node_path or folder_path.startswith(node_path + '.')
+
+
+def parse_location(location_uri: str):
+    # minio location is minio://http://<end_point>/bucket/object_path
+    minio_path = location_uri.split('//')[-1]
+    _, bucket, obj_path = tuple(minio_path.split('/', 2))
+    return bucket, obj_path
+
+
+async def plan_move(
+    nodes: List[Dict[str, Any]],
+    target_folder: Optional[Dict[str, Any]],
+    tree_index: ContainerTreeIndex,
+    new_name: Optional[str] = None,
+) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """Return the (item, update) pairs moving the nodes, renamed to `new_name` if given, and their whole subtrees.
+
+    The moved nodes get their new parent, parent path and name. The items below them keep their parent and only
+    get the moved prefix of their parent path replaced. A folder cannot be moved into its own subtree, its items
+    would end up with a parent among their descendants.
+    """
+    parent_id = target_folder.get('id') if target_folder else None
+    parent_path = get_folder_path(target_folder)
+
+    updates = []
+    for node in nodes:
+        if is_in_subtree(parent_path, node):
+            raise ValueError(f'Cannot move the folder {node["id"]} into itself or one of its subfolders')
+        name = new_name or node['name']
+        updates.append((node, {'id': node['id'], 'parent': parent_id, 'parent_path': parent_path, 'name': name}))
+        if node['type'].lower() != 'folder':
+            continue
+
+        old_prefix = get_folder_path(node)
+        new_prefix = parent_path + '.' + name if parent_path else name
+        folders = [node]
+        while folders:
+            folder = folders.pop()
+            for child in await tree_index.get_children(folder['id']):
+                child_path = new_prefix + child['parent_path'][len(old_prefix) :]
+                updates.append((child, {'id': child['id'], 'parent_path': child_path}))
+                if child['type'].lower() == 'folder':
+                    folders.append(child)
+    return updates
+
+
+async def move_nodes(
+    dataset,
+    nodes: List[Dict[str, Any]],
+    target_folder: Optional[Dict[str, Any]],
+    tree_index: ContainerTreeIndex,
+    access_token: str,
+    refresh_token: str,
+    new_name: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Move the nodes under `target_folder`, the dataset root if it has no id, by updating their items in place.
+
+    Every item of the moved subtrees is updated with bulk metadata updates instead of being re-created. The objects
+    of the files are server-side copied to their new key and the old ones deleted once the metadata is updated.
+    When a copy or a chunk of the update fails, the objects no item points to any more are deleted, the old ones
+    of the updated items and the copies of the others, before the error is raised. Returns the updated `nodes`.
+    """
+    nodes = [node for node in nodes if not node.get('archived', False)]
+    updates = await plan_move(nodes, target_folder, tree_index, new_name)
+
+    moved_objects = []
+    minio_http = ('https://' if ConfigClass.MINIO_HTTPS else 'http://') + ConfigClass.MINIO_ENDPOINT
+    for item, update in updates:
+        if item['type'].lower() != 'file':
+            continue
+        bucket, obj_path = parse_location(item['storage']['location_uri'])
+        new_obj_path = get_node_logical_path({**item, **update})
+        if (bucket, obj_path) == (dataset.code, new_obj_path):
+            continue
+        update['location_uri'] = 'minio://%s/%s/%s' % (minio_http, dataset.code, new_obj_path)
+        moved_objects.append((item['id'], bucket, obj_path, new_obj_path, item.get('size') or 0))
+
+    mc = get_minio_client(access_token, refresh_token) if moved_objects else None
+    copy_semaphore = asyncio.Semaphore(ConfigClass.FILE_COPY_CONCURRENCY)
+
+    copied = set()
+
+    async def copy(id_, bucket, obj_path, new_obj_path, size):
+        async with copy_semaphore:
+            await copy_object(mc.client, dataset.code, new_obj_path, bucket, obj_path, size)
+            copied.add(id_)
+
+    async def delete_objects(objects):
+        for bucket, obj_path in objects:
+            try:
+                await run_in_threadpool(mc.delete_object, bucket, obj_path)
+            except Exception as e:
+                logger.error(f'Error when deleting the moved object {bucket}/{obj_path}: {e}')
+
+    try:
+        await run_concurrently(copy(*moved_object) for moved_object in moved_objects)
+    except Exception:
+        logger.error(f'Copy of the moved objects failed, deleting the {len(copied)} copies already made')
+        await delete_objects(
+            (dataset.code, new_obj_path) for id_, _, _, new_obj_path, _ in moved_objects if id_ in copied
+        )
+        raise
+
+    try:
+        updated = await MetadataClient.update_objects([update for _, update in updates], dataset.code)
+    except MetadataBulkUpdateError as e:
+        committed = {item['id'] for item in e.updated}
+        logger.error(
+            f'Move in {dataset.code} stopped after updating {len(committed)} of {len(updates)} items, '
+            'the other items are left at their old path'
+        )
+        # the items of the applied chunks point to the new objects, the others still to the old ones
+        await delete_objects(
+            (bucket, obj_path) if id_ in committed else (dataset.code, new_obj_path)
+            for id_, bucket, obj_path, new_obj_path, _ in moved_objects
+        )
+        raise
+
+    # the old objects are only garbage once the items point to the new ones
+    await delete_objects((bucket, obj_path) for _, bucket, obj_path, _, _ in moved_objects)
+
+    updated_by_id = {item['id']: item for item in updated}
+    moved_nodes = []
+    # only the moved nodes get a new parent, the items below them keep theirs
+    for item, update in updates:
+        if 'parent' in update:
+            moved_nodes.append(updated_by_id.get(item['id'], {**item, **update}))
+    return moved_nodes
@@ -0,0 +1,235 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import time
+from typing import Any
+from typing import Dict
+from typing import Optional
+
+from common import LoggerFactory
+
+from app.clients import HTTPClientPool
+from app.clients import http_clients
+from app.config import ConfigClass
+
+logger = LoggerFactory(__name__).get_logger()
+
+
+class JobStatusEmitter:
+    """Buffers the job status transitions of one file operation and sends them in batches.
+
+    The buffer is flushed every `flush_interval` seconds or as soon as it holds `batch_size` transitions. Each flush
+    publishes the buffered notifications in order, then creates the new jobs and updates the existing ones. They are
+    sent one by one with the usual per item messages and requests, or with one queue message and one data utility
+    request each when `bulk` is set, see JOB_STATUS_BULK_ENABLED. Updates of the same job are merged so only its
+    latest status and the union of its payloads are sent. The transitions that could not be sent are put back in the
+    buffer, ahead of the newer ones, and sent again by the next flush.
+    """
+
+    # attempts of the final flush made by close
+    close_attempts = 3
+
+    def __init__(
+        self,
+        session_id: str,
+        task_id: str,
+        action: str,
+        dataset,
+        operator: str,
+        flush_interval: Optional[float] = None,
+        batch_size: Optional[int] = None,
+        bulk: Optional[bool] = None,
+    ) -> None:
+        self.session_id = session_id
+        self.task_id = task_id
+        self.action = action
+        self.dataset_geid = str(dataset.id)
+        self.dataset_code = dataset.code
+        self.operator = operator
+        self.flush_interval = flush_interval or ConfigClass.JOB_STATUS_FLUSH_INTERVAL
+        self.batch_size = batch_size or ConfigClass.JOB_STATUS_BATCH_SIZE
+        self.bulk = ConfigClass.JOB_STATUS_BULK_ENABLED if bulk is None else bulk
+
+        self._notifications = []
+        self._created_jobs = []
+        self._updated_jobs = {}
+        self._flush_lock = asyncio.Lock()
+        self._flusher = None
+
+    def start(self) -> None:
+        """Start flushing the buffer periodically."""
+        if self._flusher is None:
+            self._flusher = asyncio.ensure_future(self._flush_periodically())
+
+    async def close(self) -> None:
+        """Stop the periodic flush and send what is left in the buffer."""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        for attempt in range(1, self.close_attempts + 1):
+            try:
+                await self.flush()
+                return
+            except Exception as e:
+                logger.error(f'Error when flushing job status, attempt {attempt}/{self.close_attempts}: {e}')
+            if attempt < self.close_attempts:
+                await asyncio.sleep(self.flush_interval)
+        logger.error(
+            f'Dropped the status of task {self.task_id}: {len(self._notifications)} notifications, '
+            f'{len(self._created_jobs)} created and {len(self._updated_jobs)} updated jobs'
+        )
+
+    async def create(self, source_file: Dict[str, Any], status: str) -> Dict[str, str]:
+        """Buffer the creation of the job tracking `source_file` and return the {source id: job id} mapping."""
+        source_geid = source_file.get('id')
+        job_id = self.action + '-' + source_geid + '-' + str(int(time.time()))
+        self._notify(source_file, status, {})
+        self._created_jobs.append(
+            {
+                'session_id': self.session_id,
+                'label': 'Dataset',
+                'source': source_geid,
+                'task_id': self.task_id,
+                'job_id': job_id,
+                'action': self.action,
+                'code': self.dataset_code,
+                'target_status': status,
+                'operator': self.operator,
+                'payload': source_file,
+            }
+        )
+        await self._flush_if_full()
+        return {source_geid: job_id}
+
+    async def update(
+        self, source_file: Dict[str, Any], status: str, job_id: str, payload: Optional[Dict[str, Any]] = None
+    ) -> None:
+        payload = payload or {}
+        self._notify(source_file, status, payload)
+        update = self._updated_jobs.get(job_id)
+        if update is None:
+            self._updated_jobs[job_id] = {
+                'session_id': self.session_id,
+                'label': 'Dataset',
+                'task_id': self.task_id,
+                'job_id': job_id,
+                'status': status,
+                'add_payload': dict(payload),
+            }
+        else:
+            update['status'] = status
+            update['add_payload'].update(payload)
+        await self._flush_if_full()
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            notifications, self._notifications = self._notifications, []
+            created_jobs, self._created_jobs = self._created_jobs, []
+            updated_jobs, self._updated_jobs = list(self._updated_jobs.values()), {}
+
+            # the senders remove what they sent from the lists, what is left is put back on failure
+            try:
+                await self._send_notifications(notifications)
+                # the jobs have to exist before they can be updated
+                await self._send_jobs('POST', created_jobs)
+                await self._send_jobs('PUT', updated_jobs)
+            except Exception:
+                self._restore(notifications, created_jobs, updated_jobs)
+                raise
+
+    def _restore(self, notifications, created_jobs, updated_jobs) -> None:
+        """Put the unsent transitions back in front of the ones buffered since the flush started."""
+        self._notifications = notifications + self._notifications
+        self._created_jobs = created_jobs + self._created_jobs
+        restored = {}
+        for update in updated_jobs:
+            restored[update['job_id']] = update
+        for job_id, update in self._updated_jobs.items():
+            previous = restored.get(job_id)
+            if previous is None:
+                restored[job_id] = update
+            else:
+                previous['status'] = update['status']
+                previous['add_payload'].update(update['add_payload'])
+        self._updated_jobs = restored
+
+    def _notify(self, source_file: Dict[str, Any], status: str, payload: Dict[str, Any]) -> None:
+        self._notifications.append(
+            {
+                'session_id': self.session_id,
+                'task_id': self.task_id,
+                'source': source_file,
+                'action': self.action,
+                'status': status,  # INIT/RUNNING/FINISH/ERROR
+                'dataset': self.dataset_geid,
+                'operator': self.operator,
+                'payload': payload,
+                'update_timestamp': time.time(),
+            }
+        )
+
+    async def _flush_if_full(self) -> None:
+        if len(self._notifications) >= self.batch_size:
+            await self.flush()
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f'Error when flushing job status: {e}')
+
+    async def _send_notifications(self, notifications) -> None:
+        if not notifications:
+            return
+        if self.bulk:
+            await self._publish('DATASET_FILE_NOTIFICATION_BATCH', notifications)
+            notifications.clear()
+            return
+        while notifications:
+            await self._publish('DATASET_FILE_NOTIFICATION', notifications[0])
+            del notifications[0]
+
+    async def _publish(self, event_type, payload) -> None:
+        url = ConfigClass.QUEUE_SERVICE + 'broker/pub'
+        post_json = {
+            'event_type': event_type,
+            'payload': payload,
+            'binary': True,
+            'queue': 'socketio',
+            'routing_key': 'socketio',
+            'exchange': {'name': 'socketio', 'type': 'fanout'},
+        }
+        res = await http_clients.get(HTTPClientPool.QUEUE).post(url, json=post_json)
+        if res.status_code != 200:
+            raise Exception('send_notification() {}: {}'.format(res.status_code, res.text))
+
+    async def _send_jobs(self, method: str, jobs) -> None:
+        if not jobs:
+            return
+        client = http_clients.get(HTTPClientPool.DATA_OPS)
+        if self.bulk:
+            res = await client.request(method, ConfigClass.DATA_UTILITY_SERVICE + 'tasks/bulk', json={'jobs': jobs})
+            if res.status_code != 200:
+                raise Exception('save redis error {}: {}'.format(res.status_code, res.text))
+            jobs.clear()
+            return
+        while jobs:
+            res = await client.request(method, ConfigClass.DATA_UTILITY_SERVICE + 'tasks/', json=jobs[0])
+            if res.status_code != 200:
+                raise Exception('save redis error {}: {}'.format(res.status_code, res.text))
+            del jobs[0]
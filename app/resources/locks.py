@@ -13,11 +13,15 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import httpx
+from typing import List
+from typing import Tuple
+
 from common import LoggerFactory
 
+from app.clients import HTTPClientPool
+from app.clients import http_clients
 from app.config import ConfigClass
-from app.resources.utils import get_children_nodes
+from app.resources.tree_index import ContainerTreeIndex
 
 logger = LoggerFactory(__name__).get_logger()
 
@@ -27,8 +31,7 @@ async def lock_resource(resource_key: str, operation: str) -> dict:
     logger.info('Lock resource:', extra={'resource_key': resource_key})
     url = ConfigClass.DATA_UTILITY_SERVICE_v2 + 'resource/lock/'
     post_json = {'resource_key': resource_key, 'operation': operation}
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, json=post_json)
+    response = await http_clients.get(HTTPClientPool.DATA_OPS).post(url, json=post_json)
     if response.status_code != 200:
         raise Exception('resource %s already in used' % resource_key)
 
@@ -40,15 +43,99 @@ async def unlock_resource(resource_key: str, operation: str) -> dict:
     logger.info('Unlock resource:', extra={'resource_key': resource_key})
     url = ConfigClass.DATA_UTILITY_SERVICE_v2 + 'resource/lock/'
     post_json = {'resource_key': resource_key, 'operation': operation}
-
-    async with httpx.AsyncClient() as client:
-        response = await client.request(url=url, json=post_json, method='DELETE')
+    response = await http_clients.get(HTTPClientPool.DATA_OPS).request(url=url, json=post_json, method='DELETE')
     if response.status_code != 200:
         raise Exception('Error when unlock resource %s' % resource_key)
 
     return response.json()
 
 
+async def bulk_lock_resource(resource_keys: List[str], operation: str) -> dict:
+    """Lock all the keys with one request, the lock service either locks all of them or none."""
+    logger.info('Bulk lock resources:', extra={'resource_keys': resource_keys})
+    url = ConfigClass.DATA_UTILITY_SERVICE_v2 + 'resource/lock/bulk'
+    post_json = {'resource_keys': resource_keys, 'operation': operation}
+    response = await http_clients.get(HTTPClientPool.DATA_OPS).post(url, json=post_json)
+    if response.status_code != 200:
+        raise Exception('resources %s already in used' % resource_keys)
+
+    return response.json()
+
+
+async def bulk_unlock_resource(resource_keys: List[str], operation: str) -> dict:
+    logger.info('Bulk unlock resources:', extra={'resource_keys': resource_keys})
+    url = ConfigClass.DATA_UTILITY_SERVICE_v2 + 'resource/lock/bulk'
+    post_json = {'resource_keys': resource_keys, 'operation': operation}
+    response = await http_clients.get(HTTPClientPool.DATA_OPS).request(url=url, json=post_json, method='DELETE')
+    if response.status_code != 200:
+        raise Exception('Error when unlock resources %s' % resource_keys)
+
+    return response.json()
+
+
+def _chunk_by_operation(locks: List[Tuple[str, str]], chunk_size: int) -> List[Tuple[str, List[str]]]:
+    """Split the (resource_key, operation) pairs into chunks of keys sharing the same operation."""
+    keys_by_operation = {}
+    for resource_key, operation in locks:
+        keys_by_operation.setdefault(operation, []).append(resource_key)
+
+    chunks = []
+    for operation, resource_keys in keys_by_operation.items():
+        for i in range(0, len(resource_keys), chunk_size):
+            chunks.append((operation, resource_keys[i : i + chunk_size]))
+    return chunks
+
+
+async def unlock_resources(locked_node: List[Tuple[str, str]], chunk_size: int = None) -> None:
+    """Release the (resource_key, operation) pairs in bulk.
+
+    A failing chunk is logged and the remaining chunks are still released.
+    """
+    chunk_size = chunk_size or ConfigClass.RESOURCE_LOCK_CHUNK_SIZE
+    for operation, resource_keys in _chunk_by_operation(locked_node, chunk_size):
+        try:
+            await bulk_unlock_resource(resource_keys, operation)
+        except Exception as e:
+            logger.error(f'Error when unlock {len(resource_keys)} resources: {e}')
+
+
+class ResourceLockManager:
+    """Collect all the resource keys of one operation and lock them in chunked bulk requests.
+
+    The keys are only acquired when `acquire` is called. If any chunk conflicts, the chunks locked before it are
+    released and the error is raised, so the operation holds either every lock or none of them.
+    """
+
+    def __init__(self, chunk_size: int = None) -> None:
+        self.chunk_size = chunk_size or ConfigClass.RESOURCE_LOCK_CHUNK_SIZE
+        self.pending: List[Tuple[str, str]] = []
+        self.locked: List[Tuple[str, str]] = []
+        self._seen = set()
+
+    def add(self, resource_key: str, operation: str) -> None:
+        # the same key can be reached twice (eg. rename into the same name), only lock it once
+        if (resource_key, operation) in self._seen:
+            return
+        self._seen.add((resource_key, operation))
+        self.pending.append((resource_key, operation))
+
+    async def acquire(self) -> List[Tuple[str, str]]:
+        pending, self.pending = self.pending, []
+        try:
+            for operation, resource_keys in _chunk_by_operation(pending, self.chunk_size):
+                await bulk_lock_resource(resource_keys, operation)
+                self.locked.extend((resource_key, operation) for resource_key in resource_keys)
+        except Exception:
+            await self.release()
+            raise
+
+        return self.locked
+
+    async def release(self) -> None:
+        locked, self.locked = self.locked, []
+        await unlock_resources(locked, self.chunk_size)
+
+
 # TODO the issue here is how to raise the lock conflict
 class lock_factory:  # pragma no cover
     def __init__(self, action: str) -> None:
@@ -174,17 +261,19 @@ class lock_factory:  # pragma no cover
         return locked_node, err
 
 
-async def recursive_lock_import(dataset_code, nodes, root_path):
+async def recursive_lock_import(dataset_code, nodes, root_path, tree_index: ContainerTreeIndex = None):
     """the function will recursively lock the node tree OR unlock the tree base on the parameter.
 
     - if lock = true then perform the lock
     - if lock = false then perform the unlock
+
+    The children of each folder are resolved through `tree_index` so the source container is listed only once.
     """
     # this is for crash recovery, if something trigger the exception
     # we will unlock the locked node only. NOT the whole tree. The example
     # case will be copy the same node, if we unlock the whole tree in exception
     # then it will affect the processing one.
-    locked_node, err = [], None
+    lock_manager, err = ResourceLockManager(), None
 
     async def recur_walker(current_nodes, current_root_path, new_name=None):
         """recursively trace down the node tree and run the lock function."""
@@ -214,15 +303,13 @@ async def recursive_lock_import(dataset_code, nodes, root_path):
                         minio_obj_path = '%s' % ff_object.get('name')
                 # source is from project
                 source_key = '{}/{}'.format(bucket, minio_obj_path)
-                await lock_resource(source_key, 'read')
-                locked_node.append((source_key, 'read'))
+                lock_manager.add(source_key, 'read')
 
                 # destination is in the dataset
                 target_key = '{}/{}/{}'.format(
                     dataset_code, current_root_path, new_name if new_name else ff_object.get('name')
                 )
-                await lock_resource(target_key, 'write')
-                locked_node.append((target_key, 'write'))
+                lock_manager.add(target_key, 'write')
 
             # open the next recursive loop if it is folder
             if ff_object.get('type').lower() == 'folder':
@@ -235,29 +322,32 @@ async def recursive_lock_import(dataset_code, nodes, root_path):
                     next_root_path = filename
                 else:
                     next_root_path = current_root_path + '/' + filename
-                children_nodes = await get_children_nodes(
-                    ff_object['container_code'], ff_object.get('id', None), ff_object['container_type']
-                )
+                children_nodes = await tree_index.get_children(ff_object.get('id', None))
                 await recur_walker(children_nodes, next_root_path)
 
         return
 
+    if tree_index is None:
+        tree_index = ContainerTreeIndex.from_nodes(nodes)
+
     # start here
     try:
         await recur_walker(nodes, root_path)
+        # then acquire every collected key in bulk, all or nothing
+        await lock_manager.acquire()
     except Exception as e:
         err = e
 
-    return locked_node, err
+    return lock_manager.locked, err
 
 
-async def recursive_lock_delete(nodes, new_name=None):
+async def recursive_lock_delete(nodes, new_name=None, tree_index: ContainerTreeIndex = None):
 
     # this is for crash recovery, if something trigger the exception
     # we will unlock the locked node only. NOT the whole tree. The example
     # case will be copy the same node, if we unlock the whole tree in exception
     # then it will affect the processing one.
-    locked_node, err = [], None
+    lock_manager, err = ResourceLockManager(), None
 
     async def recur_walker(current_nodes, new_name=None):
         """recursively trace down the node tree and run the lock function."""
@@ -287,32 +377,36 @@ async def recursive_lock_delete(nodes, new_name=None):
                         minio_obj_path = '%s' % ff_object.get('name')
 
                 source_key = '{}/{}'.format(bucket, minio_obj_path)
-                await lock_resource(source_key, 'write')
-                locked_node.append((source_key, 'write'))
+                lock_manager.add(source_key, 'write')
 
             # open the next recursive loop if it is folder
             if ff_object.get('type').lower() == 'folder':
-                children_nodes = await get_children_nodes(ff_object['container_code'], ff_object.get('id', None))
+                children_nodes = await tree_index.get_children(ff_object.get('id', None))
                 await recur_walker(children_nodes)
 
         return
 
+    if tree_index is None:
+        tree_index = ContainerTreeIndex.from_nodes(nodes)
+
     # start here
     try:
         await recur_walker(nodes, new_name)
+        # then acquire every collected key in bulk, all or nothing
+        await lock_manager.acquire()
     except Exception as e:
         err = e
 
-    return locked_node, err
+    return lock_manager.locked, err
 
 
-async def recursive_lock_move_rename(nodes, root_path, new_name=None):
+async def recursive_lock_move_rename(nodes, root_path, new_name=None, tree_index: ContainerTreeIndex = None):
 
     # this is for crash recovery, if something trigger the exception
     # we will unlock the locked node only. NOT the whole tree. The example
     # case will be copy the same node, if we unlock the whole tree in exception
     # then it will affect the processing one.
-    locked_node, err = [], None
+    lock_manager, err = ResourceLockManager(), None
 
     # TODO lock
     async def recur_walker(current_nodes, current_root_path, new_name=None):
@@ -342,8 +436,7 @@ async def recursive_lock_move_rename(nodes, root_path, new_name=None):
                     else:
                         minio_obj_path = '%s/%s' % (ConfigClass.DATASET_FILE_FOLDER, ff_object.get('name'))
                 source_key = '{}/{}'.format(bucket, minio_obj_path)
-                await lock_resource(source_key, 'write')
-                locked_node.append((source_key, 'write'))
+                lock_manager.add(source_key, 'write')
 
                 if current_root_path == ConfigClass.DATASET_FILE_FOLDER:
                     target_key = '{}/{}/{}'.format(
@@ -356,8 +449,7 @@ async def recursive_lock_move_rename(nodes, root_path, new_name=None):
                         current_root_path,
                         new_name if new_name else ff_object.get('name'),
                     )
-                await lock_resource(target_key, 'write')
-                locked_node.append((target_key, 'write'))
+                lock_manager.add(target_key, 'write')
 
             # open the next recursive loop if it is folder
             if ff_object.get('type').lower() == 'folder':
@@ -370,29 +462,32 @@ async def recursive_lock_move_rename(nodes, root_path, new_name=None):
                     next_root_path = filename
                 else:
                     next_root_path = current_root_path + '/' + filename
-                children_nodes = await get_children_nodes(
-                    ff_object['container_code'], ff_object.get('id', None), ff_object['container_type']
-                )
+                children_nodes = await tree_index.get_children(ff_object.get('id', None))
                 await recur_walker(children_nodes, next_root_path)
 
         return
 
+    if tree_index is None:
+        tree_index = ContainerTreeIndex.from_nodes(nodes)
+
     # start here
     try:
         await recur_walker(nodes, root_path, new_name)
+        # then acquire every collected key in bulk, all or nothing
+        await lock_manager.acquire()
     except Exception as e:
         err = e
 
-    return locked_node, err
+    return lock_manager.locked, err
 
 
-async def recursive_lock_publish(nodes):
+async def recursive_lock_publish(nodes, tree_index: ContainerTreeIndex = None):
 
     # this is for crash recovery, if something trigger the exception
     # we will unlock the locked node only. NOT the whole tree. The example
     # case will be copy the same node, if we unlock the whole tree in exception
     # then it will affect the processing one.
-    locked_node, err = [], None
+    lock_manager, err = ResourceLockManager(), None
 
     async def recur_walker(current_nodes):
         """recursively trace down the node tree and run the lock function."""
@@ -415,21 +510,25 @@ async def recursive_lock_publish(nodes):
                     minio_obj_path = '%s/%s' % (ConfigClass.DATASET_FILE_FOLDER, ff_object.get('name'))
 
                 source_key = '{}/{}'.format(bucket, minio_obj_path)
-                await lock_resource(source_key, 'read')
-                locked_node.append((source_key, 'read'))
+                lock_manager.add(source_key, 'read')
 
             # open the next recursive loop if it is folder
             if ff_object.get('type').lower() == 'folder':
                 # next_root = current_root_path+"/"+(new_name if new_name else ff_object.get("name"))
-                children_nodes = await get_children_nodes(ff_object['container_code'], ff_object.get('id', None))
+                children_nodes = await tree_index.get_children(ff_object.get('id', None))
                 await recur_walker(children_nodes)
 
         return
 
+    if tree_index is None:
+        tree_index = ContainerTreeIndex.from_nodes(nodes)
+
     # start here
     try:
         await recur_walker(nodes)
+        # then acquire every collected key in bulk, all or nothing
+        await lock_manager.acquire()
     except Exception as e:
         err = e
 
-    return locked_node, err
+    return lock_manager.locked, err
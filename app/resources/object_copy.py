@@ -0,0 +1,162 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from common import LoggerFactory
+from minio import Minio
+from minio.commonconfig import CopySource
+from minio.datatypes import Part
+from starlette.concurrency import run_in_threadpool
+
+from app.config import ConfigClass
+
+logger = LoggerFactory('object_copy').get_logger()
+
+# S3 limits of the multipart uploads
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PART_SIZE = 5 * 1024 * 1024 * 1024
+MAX_PART_COUNT = 10000
+
+# the headers of the source object the copy keeps, along with its x-amz-meta-* user metadata
+PRESERVED_HEADERS = (
+    'cache-control',
+    'content-disposition',
+    'content-encoding',
+    'content-language',
+    'content-type',
+    'expires',
+)
+
+ProgressCallback = Callable[[int, int], Awaitable[None]]
+
+
+def get_object_headers(stat) -> Dict[str, str]:
+    """Return the headers that recreate the content type and user metadata of the stat'ed object.
+
+    A single copy request keeps them on its own, a multipart upload has to be created with them.
+    """
+    headers = {}
+    for name, value in (stat.metadata or {}).items():
+        if name.lower() in PRESERVED_HEADERS or name.lower().startswith('x-amz-meta-'):
+            headers[name] = value
+    return headers
+
+
+def get_part_ranges(size: int, part_size: int) -> List[Tuple[int, int]]:
+    """Split `size` bytes into the inclusive byte ranges of the parts, within the S3 part size and count limits."""
+    part_size = max(part_size, MIN_PART_SIZE, -(-size // MAX_PART_COUNT))
+    part_size = min(part_size, MAX_PART_SIZE)
+    return [(start, min(start + part_size, size) - 1) for start in range(0, size, part_size)]
+
+
+async def multipart_copy_object(
+    client: Minio,
+    bucket: str,
+    object_name: str,
+    source_bucket: str,
+    source_object: str,
+    size: int,
+    part_size: int,
+    concurrency: int,
+    progress: Optional[ProgressCallback] = None,
+    headers: Optional[Dict[str, str]] = None,
+) -> None:
+    """Copy the object server-side with ranged part copies running in parallel.
+
+    minio 7.0 `compose_object` copies the parts one after the other, so the multipart upload is driven through the
+    S3 primitives of the client instead. The upload is created with `headers`, see `get_object_headers`, and is
+    aborted when any part fails.
+    """
+    upload_id = await run_in_threadpool(client._create_multipart_upload, bucket, object_name, headers or {})
+    copy_headers = CopySource(source_bucket, source_object).gen_copy_headers()
+    semaphore = asyncio.Semaphore(concurrency)
+    copied_size = 0
+
+    async def copy_part(part_number: int, start: int, end: int) -> Part:
+        nonlocal copied_size
+        headers = {**copy_headers, 'x-amz-copy-source-range': f'bytes={start}-{end}'}
+        async with semaphore:
+            etag, _ = await run_in_threadpool(
+                client._upload_part_copy, bucket, object_name, upload_id, part_number, headers
+            )
+        copied_size += end - start + 1
+        if progress:
+            await progress(copied_size, size)
+        return Part(part_number, etag)
+
+    tasks = [
+        asyncio.ensure_future(copy_part(part_number, start, end))
+        for part_number, (start, end) in enumerate(get_part_ranges(size, part_size), start=1)
+    ]
+    try:
+        parts = await asyncio.gather(*tasks)
+        await run_in_threadpool(client._complete_multipart_upload, bucket, object_name, upload_id, parts)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        try:
+            await run_in_threadpool(client._abort_multipart_upload, bucket, object_name, upload_id)
+        except Exception as e:
+            logger.error(f'Error when aborting the copy of {bucket}/{object_name}: {e}')
+        raise
+
+
+async def copy_object(
+    client: Minio,
+    bucket: str,
+    object_name: str,
+    source_bucket: str,
+    source_object: str,
+    size: int,
+    progress: Optional[ProgressCallback] = None,
+) -> None:
+    """Copy the object server-side, picking the strategy from its recorded size.
+
+    Objects under MINIO_COPY_MULTIPART_THRESHOLD are copied with a single request. Larger ones are stat'ed, the part
+    ranges have to match the stored size exactly, and copied part by part in parallel since single copies are capped
+    at 5GiB by S3 anyway.
+    """
+    threshold = ConfigClass.MINIO_COPY_MULTIPART_THRESHOLD
+    stat = None
+    if size >= threshold:
+        stat = await run_in_threadpool(client.stat_object, source_bucket, source_object)
+        size = stat.size
+
+    if size < threshold:
+        await run_in_threadpool(client.copy_object, bucket, object_name, CopySource(source_bucket, source_object))
+        if progress:
+            await progress(size, size)
+        return
+
+    await multipart_copy_object(
+        client,
+        bucket,
+        object_name,
+        source_bucket,
+        source_object,
+        size,
+        ConfigClass.MINIO_COPY_PART_SIZE,
+        ConfigClass.MINIO_COPY_CONCURRENCY,
+        progress,
+        get_object_headers(stat),
+    )
@@ -0,0 +1,120 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+from collections import defaultdict
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from app.clients import MetadataClient
+
+# the attributes of the items kept by the index, the bulky `extended` attributes are left out
+INDEX_FIELDS = (
+    'id',
+    'parent',
+    'parent_path',
+    'restore_path',
+    'archived',
+    'type',
+    'zone',
+    'name',
+    'size',
+    'owner',
+    'container_code',
+    'container_type',
+    'created_time',
+    'last_updated_time',
+    'storage',
+)
+
+
+class ContainerTreeIndex:
+    """In-memory index over the items of a single container.
+
+    The container listing is streamed from the metadata service lazily, on the first lookup, and only once. Only
+    the INDEX_FIELDS of the items are kept, and a single search page is held besides them while loading. The
+    same index is meant to be shared by every tree walker of one file operation (locking, copy, delete) so the
+    whole operation costs a single listing call instead of one per folder.
+    """
+
+    def __init__(self, code: str, items_type: str = 'dataset') -> None:
+        self.code = code
+        self.items_type = items_type
+        self._items = None
+        self._children = defaultdict(list)
+        self._by_id = {}
+        self._by_path = defaultdict(list)
+        self._paths = set()
+        self._load_lock = asyncio.Lock()
+
+    @classmethod
+    def from_nodes(cls, nodes: List[Dict[str, Any]]) -> 'ContainerTreeIndex':
+        """Create the index for the container the given nodes belong to."""
+        node = nodes[0] if nodes else {}
+        return cls(node.get('container_code'), node.get('container_type') or 'dataset')
+
+    @classmethod
+    def from_items(cls, code: str, items: List[Dict[str, Any]], items_type: str = 'dataset') -> 'ContainerTreeIndex':
+        """Create the index from an already fetched container listing."""
+        index = cls(code, items_type)
+        index._build(items)
+        return index
+
+    def _build(self, items: List[Dict[str, Any]]) -> None:
+        for item in items:
+            self._children[item['parent']].append(item)
+            self._by_id[item['id']] = item
+            self._by_path[(item.get('parent_path'), item['name'])].append(item)
+            self._paths.add((item.get('parent_path'), item['name'], item.get('type')))
+        self._items = items
+
+    async def load(self) -> None:
+        """Fetch the container listing if it was not fetched yet."""
+        if self._items is not None:
+            return
+        async with self._load_lock:
+            if self._items is None:
+                items = [
+                    item
+                    async for item in MetadataClient.iter_objects(
+                        self.code, items_type=self.items_type, fields=INDEX_FIELDS
+                    )
+                ]
+                self._build(items)
+
+    async def get_items(self) -> List[Dict[str, Any]]:
+        await self.load()
+        return self._items
+
+    async def get_children(self, parent_id: Optional[str]) -> List[Dict[str, Any]]:
+        """Return the direct children of the item, ``None`` means the container root."""
+        await self.load()
+        return list(self._children.get(parent_id, []))
+
+    async def get_by_id(self, id_: str) -> Optional[Dict[str, Any]]:
+        await self.load()
+        return self._by_id.get(id_)
+
+    async def get_by_path(self, parent_path: Optional[str], name: str) -> List[Dict[str, Any]]:
+        """Return the items named ``name`` under the dot separated ``parent_path``."""
+        await self.load()
+        return list(self._by_path.get((parent_path, name), []))
+
+    async def contains(self, parent_path: Optional[str], name: str, type_: str) -> bool:
+        """Return whether an item of that type named ``name`` exists under the dot separated ``parent_path``."""
+        await self.load()
+        return (parent_path, name, type_) in self._paths
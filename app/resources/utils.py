@@ -13,36 +13,32 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import json
-import os
+import asyncio
+from typing import Any
+from typing import Awaitable
+from typing import Iterable
+from typing import List
 
 from common import LoggerFactory
 from starlette.concurrency import run_in_threadpool
 
 from app.clients import MetadataClient
-from app.commons.service_connection.minio_client import Minio_Client_
+from app.commons.service_connection.minio_client import get_minio_client
 from app.config import ConfigClass
 from app.resources.error_handler import APIException
+from app.resources.object_copy import copy_object
 from app.schemas.base import EAPIResponseCode
 
 logger = LoggerFactory('api_dataset_import').get_logger()
 
 
-async def get_files_all_files(folder_geid, items):
-    all_files = []
-    """get all files from dataset."""
-    for item in items:
-        if item['type'] == 'file' and item['parent'] == folder_geid:
-            all_files.append(item)
-    return all_files
-
-
-async def get_related_nodes(dataset_id):
-    return await MetadataClient.get_objects(dataset_id)
-
-
-def get_node_relative_path(dataset_code, location):
-    return location.split(dataset_code)[1]
+def get_node_logical_path(node):
+    """Return the path of the item in the dataset bucket, data/<parent path>/<name>, built from its metadata."""
+    parts = [ConfigClass.DATASET_FILE_FOLDER]
+    if node.get('parent_path'):
+        parts.extend(node['parent_path'].split('.'))
+    parts.append(node['name'])
+    return '/'.join(parts)
 
 
 json_data = {
@@ -58,32 +54,20 @@ json_data = {
 }
 
 
-def make_temp_folder(files):
-    for file in files:
-        if not os.path.exists(os.path.dirname(file['file_path'])):
-            os.makedirs(os.path.dirname(file['file_path']))
-            extension = os.path.splitext(file['file_path'])[1]
-
-            if extension == '.json':
-                with open(file['file_path'], 'wb') as outfile:
-                    json.dump(json_data, outfile)
-            else:
-                f = open(file['file_path'], 'wb')
-                f.seek(file['file_size'])
-                f.write(b'\0')
-                f.close()
-        else:
-            if not os.path.exists(file['file_path']):
-                extension = os.path.splitext(file['file_path'])[1]
+async def run_concurrently(aws: Iterable[Awaitable[Any]]) -> List[Any]:
+    """Run the awaitables concurrently and return their results in order.
 
-                if extension == '.json':
-                    with open('data.txt', 'w') as outfile:
-                        json.dump(json_data, outfile)
-                else:
-                    f = open(file['file_path'], 'wb')
-                    f.seek(file['file_size'])
-                    f.write(b'\0')
-                    f.close()
+    If one of them fails the others are cancelled and the error is raised, the same way a serial loop would stop
+    at the first failing item.
+    """
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
 
 
 async def create_node(payload):
@@ -111,22 +95,11 @@ async def get_parent_node(parent_id):
         return {'parent': None, 'parent_path': None}
 
 
-async def get_children_nodes(code: str, father_id: str, items_type: str = 'dataset'):
-    items = await MetadataClient.get_objects(code, items_type=items_type)
-    children_items = []
-
-    for item in items:
-        if item['parent'] == father_id:
-            children_items.append(item)
-
-    return children_items
-
-
 async def delete_node(target_node, access_token, refresh_token):
     # delete the file in minio if it is the file
     if target_node.get('type') == 'File':
         try:
-            mc = Minio_Client_(access_token, refresh_token)
+            mc = get_minio_client(access_token, refresh_token)
 
             # minio location is minio://http://<end_point>/bucket/user/object_path
             minio_path = target_node.get('location').split('//')[-1]
@@ -140,8 +113,22 @@ async def delete_node(target_node, access_token, refresh_token):
 
 
 async def create_file_node(
-    dataset, source_file, operator, parent, relative_path, access_token, refresh_token, new_name=None
+    dataset,
+    source_file,
+    operator,
+    parent,
+    relative_path,
+    access_token,
+    refresh_token,
+    new_name=None,
+    progress=None,
+    existing_node=None,
 ):
+    """Create the item of the copied file and copy its object.
+
+    With `existing_node`, the item already created for the file by a previous run of the job, only the object is
+    copied again.
+    """
     # generate minio object path
     file_name = new_name if new_name else source_file.get('name')
 
@@ -170,17 +157,24 @@ async def create_file_node(
         'container_type': 'dataset',
         'location_uri': location,
     }
-    folder_node = await create_node(payload)
+    folder_node = existing_node or await create_node(payload)
 
     # make minio copy
     try:
-        mc = Minio_Client_(access_token, refresh_token)
+        mc = get_minio_client(access_token, refresh_token)
         # minio location is minio://http://<end_point>/bucket/user/object_path
         minio_path = source_file.get('storage').get('location_uri').split('//')[-1]
         _, bucket, obj_path = tuple(minio_path.split('/', 2))
 
-        await run_in_threadpool(
-            mc.copy_object, dataset.code, ConfigClass.DATASET_FILE_FOLDER + '/' + fuf_path, bucket, obj_path
+        # large files are copied part by part, `progress` is called with the copied and the total size
+        await copy_object(
+            mc.client,
+            dataset.code,
+            ConfigClass.DATASET_FILE_FOLDER + '/' + fuf_path,
+            bucket,
+            obj_path,
+            size=source_file.get('size') or 0,
+            progress=progress,
         )
         logger.info('Minio Copy %s/%s Success' % (dataset.code, fuf_path))
     except Exception as e:
@@ -0,0 +1,202 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+
+from minio import Minio
+
+# size of the chunks read from a minio object that is too large to be prefetched in memory
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+class ZipSource(NamedTuple):
+    """A minio object to be added to the archive under `arcname`."""
+
+    arcname: str
+    bucket: str
+    path: str
+    size: int
+
+
+class BlockingPipe:
+    """In-memory pipe between one writer thread and one reader thread.
+
+    Writes block while the buffer holds more than `max_buffer_size` bytes, so the producer can never get further
+    ahead of the consumer than that. Either side can `abort` the pipe with an error, which is then raised on the
+    other side instead of leaving it blocked forever.
+    """
+
+    def __init__(self, max_buffer_size: int) -> None:
+        self._buffer = bytearray()
+        self._max_buffer_size = max_buffer_size
+        self._condition = threading.Condition()
+        self._closed = False
+        self._error = None
+
+    def write(self, data: bytes) -> int:
+        with self._condition:
+            while len(self._buffer) >= self._max_buffer_size and self._error is None:
+                self._condition.wait()
+            if self._error is not None:
+                raise self._error
+            if self._closed:
+                raise ValueError('write to a closed pipe')
+            self._buffer.extend(data)
+            self._condition.notify_all()
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def read(self, size: int = -1) -> bytes:
+        with self._condition:
+            while not self._buffer and not self._closed and self._error is None:
+                self._condition.wait()
+            if self._error is not None:
+                raise self._error
+            if size < 0:
+                size = len(self._buffer)
+            chunk = bytes(self._buffer[:size])
+            del self._buffer[:size]
+            self._condition.notify_all()
+        return chunk
+
+    def close(self) -> None:
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def abort(self, error: BaseException) -> None:
+        with self._condition:
+            self._error = error
+            self._condition.notify_all()
+
+
+def _fetch_object(client: Minio, source: ZipSource, prefetch_max_size: int) -> Optional[bytes]:
+    """Download the object in memory if it fits the prefetch budget, otherwise leave it to be streamed."""
+    if source.size > prefetch_max_size:
+        return None
+    response = client.get_object(source.bucket, source.path)
+    try:
+        return response.read()
+    finally:
+        response.close()
+        response.release_conn()
+
+
+def _write_object(client: Minio, zip_file: zipfile.ZipFile, source: ZipSource, content: Optional[bytes]) -> None:
+    zinfo = zipfile.ZipInfo(source.arcname, date_time=time.localtime(time.time())[:6])
+    zinfo.compress_type = zipfile.ZIP_DEFLATED
+    force_zip64 = source.size >= zipfile.ZIP64_LIMIT
+    with zip_file.open(zinfo, 'w', force_zip64=force_zip64) as entry:
+        if content is not None:
+            entry.write(content)
+            return
+
+        response = client.get_object(source.bucket, source.path)
+        try:
+            for chunk in response.stream(STREAM_CHUNK_SIZE):
+                entry.write(chunk)
+        finally:
+            response.close()
+            response.release_conn()
+
+
+def _write_zip(
+    client: Minio,
+    pipe: BlockingPipe,
+    sources: List[ZipSource],
+    extra_files: Dict[str, str],
+    download_concurrency: int,
+    prefetch_max_size: int,
+) -> None:
+    with ThreadPoolExecutor(max_workers=download_concurrency) as executor:
+        pending = deque()
+        sources_iter = iter(sources)
+
+        def schedule_next() -> None:
+            source = next(sources_iter, None)
+            if source is not None:
+                pending.append((source, executor.submit(_fetch_object, client, source, prefetch_max_size)))
+
+        for _ in range(download_concurrency):
+            schedule_next()
+
+        try:
+            with zipfile.ZipFile(pipe, 'w', compression=zipfile.ZIP_DEFLATED) as zip_file:
+                for arcname, content in extra_files.items():
+                    zip_file.writestr(arcname, content)
+
+                # the archive is written in order while the next objects are downloaded in the background
+                while pending:
+                    source, future = pending.popleft()
+                    schedule_next()
+                    _write_object(client, zip_file, source, future.result())
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+
+def stream_zip_to_minio(
+    client: Minio,
+    bucket: str,
+    object_name: str,
+    sources: List[ZipSource],
+    extra_files: Dict[str, str],
+    part_size: int,
+    memory_budget: int,
+    download_concurrency: int,
+) -> None:
+    """Build a zip archive of the minio objects and upload it as a multipart upload while it is being written.
+
+    Downloading, compressing and uploading overlap and nothing is staged on the local disk. Memory stays within
+    `memory_budget`: one part being uploaded, one part buffered between the zip writer and the uploader, and the
+    rest shared by the objects prefetched by the `download_concurrency` download threads. Objects larger than their
+    prefetch share are streamed in chunks instead.
+    """
+    pipe = BlockingPipe(part_size)
+    prefetch_max_size = max(0, memory_budget - 2 * part_size) // max(1, download_concurrency)
+
+    def upload() -> None:
+        try:
+            client.put_object(bucket, object_name, pipe, -1, part_size=part_size, num_parallel_uploads=1)
+        except BaseException as e:
+            pipe.abort(e)
+            raise
+
+    with ThreadPoolExecutor(max_workers=1) as upload_executor:
+        upload_future = upload_executor.submit(upload)
+        write_error = None
+        try:
+            _write_zip(client, pipe, sources, extra_files, download_concurrency, prefetch_max_size)
+            pipe.close()
+        except BaseException as e:
+            pipe.abort(e)
+            write_error = e
+        upload_error = upload_future.exception()
+
+    # the upload error comes first, it is usually the reason the writer failed
+    if upload_error is not None:
+        raise upload_error
+    if write_error is not None:
+        raise write_error
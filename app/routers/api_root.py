@@ -14,8 +14,12 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from fastapi import APIRouter
+from fastapi import Depends
 
 from app.config import ConfigClass
+from app.core.db import db_engine
+from app.core.db import db_pool_metrics
+from app.services.dataset_cache import dataset_cache
 
 router = APIRouter()
 
@@ -24,3 +28,12 @@ router = APIRouter()
 async def root():
     """For testing if service's up."""
     return {'message': 'Service Dataset On, Version: ' + ConfigClass.VERSION}
+
+
+@router.get('/metrics')
+async def metrics(engine=Depends(db_engine)):
+    """Runtime counters of this process, used to tune the pool sizes."""
+    return {
+        'db_pool': db_pool_metrics.to_dict(engine.sync_engine.pool),
+        'dataset_cache': dataset_cache.get_stats(),
+    }
@@ -77,8 +77,7 @@ class DatasetFolder:
             parent_id = folder_node['id']
 
         does_name_exist = False
-        items = await MetadataClient.get_objects(dataset.code)
-        for item in items:
+        async for item in MetadataClient.iter_objects(dataset.code, fields=('name', 'parent')):
             if item['name'] == data.folder_name and item['parent'] == parent_id:
                 does_name_exist = True
 
@@ -47,6 +47,9 @@ class DatasetList:
     @catch_internal(_API_NAMESPACE)
     async def list_dataset(self, creator, request_payload: DatasetListForm, db=Depends(get_db_session)):
         """dataset creation api."""
+        if request_payload.keyset:
+            return await self.list_dataset_keyset(creator, request_payload, db)
+
         res = APIResponse()
         page = request_payload.page
         page_size = request_payload.page_size
@@ -65,3 +68,28 @@ class DatasetList:
         res.num_of_pages = math.ceil(pagination.total / page_size)
         res.result = [item.to_dict() for item in pagination.items]
         return res.json_response()
+
+    async def list_dataset_keyset(self, creator, request_payload: DatasetListForm, db):
+        res = DatasetListResponse(result=[])
+        page_size = request_payload.page_size
+
+        try:
+            srv_dataset = SrvDatasetMgr()
+            items, next_cursor, total = await srv_dataset.get_dataset_by_creator_keyset(
+                db, creator, page_size, request_payload.cursor, request_payload.count
+            )
+        except ValueError as e:
+            res.code = EAPIResponseCode.bad_request
+            res.error_msg = str(e)
+            return res.json_response()
+        except Exception as e:
+            res.code = EAPIResponseCode.internal_error
+            res.error_msg = 'error: ' + str(e)
+            return res.json_response()
+
+        res.code = EAPIResponseCode.success
+        res.total = total
+        res.num_of_pages = math.ceil(total / page_size) if total is not None else None
+        res.next_cursor = next_cursor
+        res.result = [item.to_dict() for item in items]
+        return res.json_response()
@@ -13,29 +13,28 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import json
-import shutil
-import subprocess
 import time
 from typing import Optional
 
-import httpx
 from common import LoggerFactory
 from fastapi import APIRouter
+from fastapi import BackgroundTasks
 from fastapi import Depends
 from fastapi import Header
 from fastapi_utils import cbv
 from sqlalchemy.future import select
-from starlette.concurrency import run_in_threadpool
 
+from app.clients import HTTPClientPool
 from app.clients import MetadataClient
+from app.clients import http_clients
 from app.config import ConfigClass
+from app.core.db import db_session_scope
 from app.core.db import get_db_session
 from app.models.bids import BIDSResult
+from app.resources.bids_validator import BIDSValidationTimeout
+from app.resources.bids_validator import BIDSWorkspaceError
+from app.resources.bids_validator import validate_bids_dataset
 from app.resources.error_handler import catch_internal
-from app.resources.utils import get_files_all_files
-from app.resources.utils import get_node_relative_path
-from app.resources.utils import make_temp_folder
 from app.schemas.base import APIResponse
 from app.schemas.base import EAPIResponseCode
 from app.schemas.reqres_dataset import DatasetPostForm
@@ -43,6 +42,8 @@ from app.schemas.reqres_dataset import DatasetPostResponse
 from app.schemas.reqres_dataset import DatasetVerifyForm
 from app.schemas.validator_dataset import DatasetValidator
 from app.services.dataset import SrvDatasetMgr
+from app.services.job_queue import job_queue
+from app.services.job_queue import schedule_job
 
 router = APIRouter()
 
@@ -100,6 +101,31 @@ class DatasetRestful:
         res.result = created
         return res.json_response()
 
+    @router.post(
+        '/v1/dataset/{dataset_geid}/stats/reconcile',
+        tags=[_API_TAG],
+        summary='Recompute the number and size of the files of a dataset.',
+    )
+    @catch_internal(_API_NAMESPACE)
+    async def reconcile_stats(self, dataset_geid, background_tasks: BackgroundTasks, db=Depends(get_db_session)):
+        res = APIResponse()
+        dataset = await SrvDatasetMgr().get_bygeid(db, dataset_geid)
+        if not dataset:
+            res.code = EAPIResponseCode.not_found
+            res.error_msg = 'Not Found, invalid geid'
+            return res.json_response()
+
+        # the recomputed totals overwrite the counters, no import or delete of the dataset may run meanwhile, which
+        # only the job queue guarantees by running the jobs of a dataset one at a time
+        if not ConfigClass.JOB_QUEUE_ENABLED:
+            res.code = EAPIResponseCode.conflict
+            res.error_msg = 'The stats can only be reconciled when the job queue is enabled'
+            return res.json_response()
+
+        await schedule_job(background_tasks, db, 'dataset_reconcile_stats', dataset.code, {'dataset_id': dataset_geid})
+        res.result = {'dataset_id': dataset_geid}
+        return res.json_response()
+
     @router.get(
         '/v1/dataset/{dataset_geid}', tags=[_API_TAG], response_model=DatasetPostResponse, summary='Get a dataset.'
     )
@@ -165,50 +191,31 @@ class DatasetRestful:
             return res.json_response()
         items = await MetadataClient.get_objects(dataset.code)
 
-        files_info = []
-        TEMP_FOLDER = 'temp/'
-        for item in items:
-            if item['type'].lower() == 'file':
-                file_path = get_node_relative_path(dataset.code, item['storage']['location_uri'])
-                files_info.append({'file_path': TEMP_FOLDER + dataset.code + file_path, 'file_size': item['size']})
-
-            if item['type'].lower() == 'folder':
-                files = await get_files_all_files(item['id'], items)
-                for file in files:
-                    file_path = get_node_relative_path(dataset.code, item['storage']['location_uri'])
-                    files_info.append({'file_path': TEMP_FOLDER + dataset.code + file_path, 'file_size': file['size']})
-
         try:
-            await run_in_threadpool(make_temp_folder, files_info)
-        except Exception:
+            result = await validate_bids_dataset(dataset.code, items)
+        except BIDSWorkspaceError:
             res.code = EAPIResponseCode.internal_error
             res.result = 'failed to create temp folder for bids'
             return res.json_response()
-
-        try:
-            result = subprocess.run(
-                [
-                    'bids-validator',
-                    TEMP_FOLDER + dataset.code,
-                    '--json',
-                    '--ignoreNiftiHeaders',
-                    '--ignoreSubjectConsistency',
-                ],
-                stdout=subprocess.PIPE,
-            )
-        except Exception:
+        except BIDSValidationTimeout:
             res.code = EAPIResponseCode.internal_error
-            res.result = 'failed to validate bids folder'
+            res.result = 'bids validation timed out'
             return res.json_response()
-
-        try:
-            await run_in_threadpool(shutil.rmtree, TEMP_FOLDER + dataset.code)
         except Exception:
             res.code = EAPIResponseCode.internal_error
-            res.result = 'failed to remove temp bids folder'
+            res.result = 'failed to validate bids folder'
             return res.json_response()
 
-        res.result = json.loads(result.stdout)
+        # keep the latest report of the dataset
+        query = select(BIDSResult).where(BIDSResult.dataset_geid == str(dataset.id))
+        bids_result = (await db.execute(query)).scalars().first()
+        if bids_result:
+            bids_result.validate_output = result
+        else:
+            db.add(BIDSResult(dataset_geid=str(dataset.id), validate_output=result))
+        await db.commit()
+
+        res.result = result
         return res.json_response()
 
     @router.post('/v1/dataset/verify/pre', tags=[_API_TAG], summary='pre verify a bids dataset.')
@@ -244,10 +251,9 @@ class DatasetRestful:
         }
         url = ConfigClass.SEND_MESSAGE_URL
         self.__logger.info('Sending Message To Queue: ' + str(payload))
-        async with httpx.AsyncClient() as client:
-            msg_res = await client.post(
-                url=url, json=payload, headers={'Content-type': 'application/json; charset=utf-8'}
-            )
+        msg_res = await http_clients.get(HTTPClientPool.SEND_MESSAGE).post(
+            url=url, json=payload, headers={'Content-type': 'application/json; charset=utf-8'}
+        )
         if msg_res.status_code != 200:
             res.code = EAPIResponseCode.internal_error
             res.result = {'result': msg_res.text}
@@ -285,3 +291,16 @@ class DatasetRestful:
             api_response.code = EAPIResponseCode.internal_error
             api_response.result = 'Psql Error: ' + str(e)
             return api_response.json_response()
+
+
+# the stats are recomputed from scratch, running the job again is harmless
+@job_queue.register('dataset_reconcile_stats', resumable=True)
+async def run_reconcile_stats_job(payload) -> None:
+    if 'job_id' not in payload:
+        raise ValueError('The stats can only be reconciled by the job queue')
+    srv_dataset = SrvDatasetMgr()
+    async with db_session_scope() as db:
+        dataset = await srv_dataset.get_bygeid(db, payload['dataset_id'])
+    if dataset is None:
+        raise ValueError(f'Dataset {payload["dataset_id"]} does not exist anymore')
+    await srv_dataset.reconcile_stats(dataset)
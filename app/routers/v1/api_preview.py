@@ -25,7 +25,7 @@ from fastapi_utils import cbv
 from starlette.concurrency import run_in_threadpool
 
 from app.commons.service_connection.minio_client import Minio_Client
-from app.commons.service_connection.minio_client import Minio_Client_
+from app.commons.service_connection.minio_client import get_minio_client
 from app.config import ConfigClass
 from app.resources.error_handler import catch_internal
 from app.resources.utils import get_node_by_geid
@@ -60,7 +60,7 @@ class Preview:
             return api_response.json_response()
 
         result = {}
-        mc = Minio_Client_(Authorization, refresh_token)
+        mc = get_minio_client(Authorization, refresh_token)
         file_data = self.parse_location(file_node['storage']['location_uri'])
         file_type = file_node['name'].split('.')[1]
 
@@ -18,16 +18,18 @@ import math
 import re
 import time
 
-from aioredis import StrictRedis
 from common import LoggerFactory
 from fastapi import APIRouter
 from fastapi import BackgroundTasks
 from fastapi import Depends
 from fastapi_utils import cbv
+from sqlalchemy import func
 from sqlalchemy.future import select
 
 from app.config import ConfigClass
+from app.core.db import db_session_scope
 from app.core.db import get_db_session
+from app.core.redis import redis_client
 from app.models.version import DatasetVersion
 from app.resources.error_handler import APIException
 from app.resources.token_manager import generate_token
@@ -38,6 +40,8 @@ from app.schemas.version import PublishResponse
 from app.schemas.version import VersionListRequest
 from app.schemas.version import VersionResponse
 from app.services.dataset import SrvDatasetMgr
+from app.services.job_queue import job_queue
+from app.services.job_queue import schedule_job
 
 from .publish_version import PublishVersion
 
@@ -54,7 +58,12 @@ class VersionAPI:
         summary='Publish a dataset version',
     )
     async def publish(
-        self, dataset_geid: str, data: PublishRequest, background_tasks: BackgroundTasks, db=Depends(get_db_session)
+        self,
+        dataset_geid: str,
+        data: PublishRequest,
+        background_tasks: BackgroundTasks,
+        db=Depends(get_db_session),
+        redis=Depends(redis_client),
     ):
         api_response = PublishResponse()
         if len(data.notes) > 250:
@@ -68,22 +77,6 @@ class VersionAPI:
             api_response.code = EAPIResponseCode.bad_request
             return api_response.json_response()
 
-        # Check if publish is already running
-        self.redis_client = StrictRedis(
-            host=ConfigClass.REDIS_HOST,
-            port=ConfigClass.REDIS_PORT,
-            password=ConfigClass.REDIS_PASSWORD,
-            db=ConfigClass.REDIS_DB,
-        )
-        # TODO why here we block the double publish???
-        status = await self.redis_client.get(dataset_geid)
-        if status:
-            status = json.loads(status)['status']
-            if status == 'inprogress':
-                api_response.result = 'Dataset is inprogress of publishing'
-                api_response.code = EAPIResponseCode.bad_request
-                return api_response.json_response()
-
         # Duplicate check
         try:
             query = (
@@ -108,15 +101,43 @@ class VersionAPI:
         dataset = await srv_dataset.get_bygeid(db, dataset_geid)
         if not dataset:
             raise APIException(status_code=404, error_msg='Dataset not found')
+
+        # Check if publish is already running, the guard is taken atomically
+        # so concurrent requests cannot both start a publish
+        guard_token = await PublishVersion.acquire_guard(redis, dataset_geid)
+        if not guard_token:
+            api_response.result = 'Dataset is inprogress of publishing'
+            api_response.code = EAPIResponseCode.bad_request
+            return api_response.json_response()
+
         client = PublishVersion(
             dataset=dataset,
             operator=data.operator,
             notes=data.notes,
             status_id=dataset_geid,
             version=data.version,
+            redis_client=redis,
+            guard_token=guard_token,
         )
-        await client.update_status('inprogress')
-        background_tasks.add_task(client.publish, db)
+        try:
+            await client.update_status('inprogress')
+            await schedule_job(
+                background_tasks,
+                db,
+                'dataset_publish',
+                dataset.code,
+                {
+                    'dataset_id': dataset_geid,
+                    'operator': data.operator,
+                    'notes': data.notes,
+                    'version': data.version,
+                    'guard_token': guard_token,
+                },
+            )
+        except Exception:
+            # the publish will not run, do not keep the dataset blocked until the guard expires
+            await PublishVersion.release_guard(redis, dataset_geid, guard_token)
+            raise
 
         api_response.result = {'status_id': dataset_geid}
         return api_response.json_response()
@@ -127,19 +148,15 @@ class VersionAPI:
         response_model=PublishResponse,
         summary='Publish status',
     )
-    async def publish_status(self, dataset_geid: str, status_id: str, db=Depends(get_db_session)):
+    async def publish_status(
+        self, dataset_geid: str, status_id: str, db=Depends(get_db_session), redis=Depends(redis_client)
+    ):
         api_response = APIResponse()
         srv_dataset = SrvDatasetMgr()
         dataset = await srv_dataset.get_bygeid(db, dataset_geid)
         if not dataset:
             raise APIException(status_code=404, error_msg='Dataset not found')
-        self.redis_client = StrictRedis(
-            host=ConfigClass.REDIS_HOST,
-            port=ConfigClass.REDIS_PORT,
-            password=ConfigClass.REDIS_PASSWORD,
-            db=ConfigClass.REDIS_DB,
-        )
-        status = await self.redis_client.get(status_id)
+        status = await redis.get(status_id)
         if not status:
             raise APIException(status_code=404, error_msg='Status not found')
         api_response.result = json.loads(status)
@@ -156,19 +173,28 @@ class VersionAPI:
     ):
         api_response = VersionResponse()
         try:
+            # the total of all the versions is counted by the window over the same scan as the page
             query = (
-                select(DatasetVersion)
+                select(DatasetVersion, func.count().over().label('total'))
                 .where(DatasetVersion.dataset_geid == dataset_geid)
                 .order_by(DatasetVersion.created_at.desc())
             )
             query = query.offset(data.page * data.page_size).limit(data.page_size)
-            versions = (await db.execute(query)).scalars().all()
+            rows = (await db.execute(query)).all()
+            versions = [row.DatasetVersion for row in rows]
+            if rows:
+                total = rows[0].total
+            elif data.page:
+                # a page past the end has no row to carry the window count
+                query = select(func.count()).where(DatasetVersion.dataset_geid == dataset_geid)
+                total = (await db.execute(query)).scalar()
+            else:
+                total = 0
         except Exception as e:
             logger.error('Psql Error: ' + str(e))
             api_response.code = EAPIResponseCode.internal_error
             api_response.result = 'Psql Error: ' + str(e)
             return api_response.json_response()
-        total = len(versions)
         results = [v.to_dict() for v in versions]
         api_response.result = results
         api_response.page = data.page
@@ -237,3 +263,27 @@ class VersionAPI:
         token = generate_token(token_data)
         api_response.result = {'download_hash': token}
         return api_response.json_response()
+
+
+@job_queue.register('dataset_publish')
+async def run_publish_job(payload) -> None:
+    redis = await redis_client()
+    async with db_session_scope() as db:
+        dataset = await SrvDatasetMgr().get_bygeid(db, payload['dataset_id'])
+    if dataset is None:
+        await PublishVersion.release_guard(redis, payload['dataset_id'], payload['guard_token'])
+        raise ValueError(f'Dataset {payload["dataset_id"]} does not exist anymore')
+    # a retried job has released the guard when its previous attempt failed
+    if not await PublishVersion.claim_guard(redis, payload['dataset_id'], payload['guard_token']):
+        raise ValueError(f'Dataset {payload["dataset_id"]} is being published by another request')
+    client = PublishVersion(
+        dataset=dataset,
+        operator=payload['operator'],
+        notes=payload['notes'],
+        status_id=payload['dataset_id'],
+        version=payload['version'],
+        redis_client=redis,
+        guard_token=payload['guard_token'],
+    )
+    await client.update_status('inprogress')
+    await client.publish()
@@ -13,25 +13,29 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import asyncio
 import json
 import os
 import shutil
 import time
 from datetime import datetime
+from uuid import uuid4
 
-from aioredis import StrictRedis
 from common import LoggerFactory
 from sqlalchemy.future import select
 from starlette.concurrency import run_in_threadpool
 
-from app.clients.metadata import MetadataClient
 from app.commons.service_connection.minio_client import Minio_Client
 from app.config import ConfigClass
+from app.core.db import db_session_scope
 from app.models.schema import DatasetSchema
 from app.models.version import DatasetVersion
 from app.resources.locks import recursive_lock_publish
-from app.resources.locks import unlock_resource
-from app.resources.utils import get_children_nodes
+from app.resources.locks import unlock_resources
+from app.resources.tree_index import ContainerTreeIndex
+from app.resources.utils import get_node_logical_path
+from app.resources.zip_stream import ZipSource
+from app.resources.zip_stream import stream_zip_to_minio
 from app.services.activity_log import DatasetActivityLogService
 
 logger = LoggerFactory('api_version').get_logger()
@@ -43,8 +47,37 @@ def parse_minio_location(location):
     return {'bucket': bucket, 'path': obj_path}
 
 
+def get_minio_location(bucket, path):
+    minio_http = ('https://' if ConfigClass.MINIO_HTTPS else 'http://') + ConfigClass.MINIO_ENDPOINT
+    return f'minio://{minio_http}/{bucket}/{path}'
+
+
+# take the guard if it is free or already held with the same token, so a retried job gets it back
+CLAIM_GUARD_SCRIPT = """
+local value = redis.call('get', KEYS[1])
+if value == false or value == ARGV[1] then
+    redis.call('set', KEYS[1], ARGV[1], 'EX', ARGV[2])
+    return 1
+end
+return 0
+"""
+# only the holder of the token may extend or release the guard, it may have expired and been taken by another publish
+EXTEND_GUARD_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_GUARD_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
 class PublishVersion(object):
-    def __init__(self, dataset, operator, notes, status_id, version):
+    def __init__(self, dataset, operator, notes, status_id, version, redis_client, guard_token=None):
         self.activity_log = DatasetActivityLogService()
         self.operator = operator
         self.notes = notes
@@ -54,29 +87,31 @@ class PublishVersion(object):
         self.tmp_folder = tmp_base + str(time.time()) + '/'
         self.zip_path = tmp_base + dataset.code + '_' + str(datetime.now())
         self.mc = Minio_Client()
-        self.redis_client = StrictRedis(
-            host=ConfigClass.REDIS_HOST,
-            port=ConfigClass.REDIS_PORT,
-            password=ConfigClass.REDIS_PASSWORD,
-            db=ConfigClass.REDIS_DB,
-        )
+        self.redis_client = redis_client
         self.status_id = status_id
         self.version = version
+        self.guard_token = guard_token
 
-    async def publish(self, db):
+    async def publish(self):
+        locked_node = []
+        guard_keeper = asyncio.ensure_future(self.keep_guard()) if self.guard_token else None
         try:
             # lock file here
-            level1_nodes = await get_children_nodes(self.dataset.code, None)
-            locked_node, err = await recursive_lock_publish(level1_nodes)
+            tree_index = ContainerTreeIndex(self.dataset.code)
+            level1_nodes = await tree_index.get_children(None)
+            locked_node, err = await recursive_lock_publish(level1_nodes, tree_index)
             if err:
                 logger.error('Error occured while calling recursive_lock_publish.')
                 raise err
-            items = await MetadataClient.get_objects(self.dataset.code)
+            items = await tree_index.get_items()
             await self.get_dataset_files(items)
-            await self.download_dataset_files()
-            await self.add_schemas(db)
-            await run_in_threadpool(self.zip_files)
-            minio_location = await self.upload_version()
+            if ConfigClass.PUBLISH_STREAMING_ENABLED:
+                minio_location = await self.stream_version()
+            else:
+                await self.download_dataset_files()
+                await self.add_schemas()
+                await run_in_threadpool(self.zip_files)
+                minio_location = await self.upload_version()
             try:
                 dataset_version = DatasetVersion(
                     dataset_code=self.dataset.code,
@@ -86,8 +121,9 @@ class PublishVersion(object):
                     location=minio_location,
                     notes=self.notes,
                 )
-                db.add(dataset_version)
-                await db.commit()
+                async with db_session_scope() as db:
+                    db.add(dataset_version)
+                    await db.commit()
             except Exception as e:
                 logger.error('Psql Error: ' + str(e))
                 raise e
@@ -99,13 +135,59 @@ class PublishVersion(object):
             error_msg = f'Error publishing {self.dataset.id}: {str(e)}'
             logger.error(error_msg)
             await self.update_status('failed', error_msg=error_msg)
+            # fail the job instead of marking it as succeeded
+            raise
         finally:
             # unlock the nodes if we got blocked
-            for resource_key, operation in locked_node:
-                await unlock_resource(resource_key, operation)
+            await unlock_resources(locked_node)
+            if guard_keeper is not None:
+                guard_keeper.cancel()
+                await self.release_guard(self.redis_client, str(self.dataset.id), self.guard_token)
 
         return
 
+    @staticmethod
+    def get_guard_key(dataset_geid):
+        return f'publish_guard:{dataset_geid}'
+
+    @classmethod
+    async def acquire_guard(cls, redis_client, dataset_geid):
+        """Atomically mark the dataset as being published.
+
+        Returns the token identifying this publish, or None if a publish is already running.
+        """
+        token = uuid4().hex
+        acquired = await redis_client.set(
+            cls.get_guard_key(dataset_geid), token, ex=ConfigClass.PUBLISH_GUARD_TTL, nx=True
+        )
+        return token if acquired else None
+
+    @classmethod
+    async def claim_guard(cls, redis_client, dataset_geid, token):
+        """Make sure the guard is held with `token` when the publish starts, returns False if another one holds it."""
+        key = cls.get_guard_key(dataset_geid)
+        return bool(await redis_client.eval(CLAIM_GUARD_SCRIPT, 1, key, token, ConfigClass.PUBLISH_GUARD_TTL))
+
+    @classmethod
+    async def extend_guard(cls, redis_client, dataset_geid, token):
+        key = cls.get_guard_key(dataset_geid)
+        return bool(await redis_client.eval(EXTEND_GUARD_SCRIPT, 1, key, token, ConfigClass.PUBLISH_GUARD_TTL))
+
+    @classmethod
+    async def release_guard(cls, redis_client, dataset_geid, token):
+        await redis_client.eval(RELEASE_GUARD_SCRIPT, 1, cls.get_guard_key(dataset_geid), token)
+
+    async def keep_guard(self):
+        """Extend the guard while the publish runs, it can take longer than PUBLISH_GUARD_TTL."""
+        while True:
+            await asyncio.sleep(ConfigClass.PUBLISH_GUARD_TTL / 3)
+            try:
+                if not await self.extend_guard(self.redis_client, str(self.dataset.id), self.guard_token):
+                    logger.warning(f'Lost the publish guard of {self.dataset.id}')
+                    return
+            except Exception as e:
+                logger.error(f'Error when extending the publish guard of {self.dataset.id}: {e}')
+
     async def update_status(self, status, error_msg=''):
         """Updates job status in redis."""
         redis_status = json.dumps(
@@ -129,13 +211,14 @@ class PublishVersion(object):
         for file in self.dataset_files:
             location_data = parse_minio_location(file['storage']['location_uri'])
             try:
+                file_path = self.tmp_folder + '/' + get_node_logical_path(file)
                 await run_in_threadpool(
                     self.mc.client.fget_object,
                     location_data['bucket'],
                     location_data['path'],
-                    self.tmp_folder + '/' + location_data['path'],
+                    file_path,
                 )
-                file_paths.append(self.tmp_folder + '/' + location_data['path'])
+                file_paths.append(file_path)
             except Exception as e:
                 error_msg = f'Error download files from minio: {str(e)}'
                 logger.error(error_msg)
@@ -146,28 +229,70 @@ class PublishVersion(object):
         shutil.make_archive(self.zip_path, 'zip', self.tmp_folder)
         return self.zip_path
 
-    async def add_schemas(self, db):
-        """Saves schema json files to folder that will zipped."""
-        if not os.path.isdir(self.tmp_folder):
-            os.mkdir(self.tmp_folder)
-            os.mkdir(self.tmp_folder + '/data')
-
+    async def get_schema_files(self):
+        """Returns the content of the schema json files that go in the version zip, keyed by file name."""
         query = select(DatasetSchema).where(
             DatasetSchema.dataset_geid == str(self.dataset.id), DatasetSchema.is_draft.is_(False)
         )
         query_default = query.where(DatasetSchema.standard == 'default')
         query_open_minds = query.where(DatasetSchema.standard == 'open_minds')
 
-        schemas_default = (await db.execute(query_default)).scalars().all()
-        schemas_open_minds = (await db.execute(query_open_minds)).scalars().all()
+        async with db_session_scope() as db:
+            schemas_default = (await db.execute(query_default)).scalars().all()
+            schemas_open_minds = (await db.execute(query_open_minds)).scalars().all()
 
+        schema_files = {}
         for schema in schemas_default:
-            with open(self.tmp_folder + '/default_' + schema.name, 'w') as w:
-                w.write(json.dumps(schema.content, indent=4, ensure_ascii=False))
-
+            schema_files['default_' + schema.name] = json.dumps(schema.content, indent=4, ensure_ascii=False)
         for schema in schemas_open_minds:
-            with open(self.tmp_folder + '/openMINDS_' + schema.name, 'w') as w:
-                w.write(json.dumps(schema.content, indent=4, ensure_ascii=False))
+            schema_files['openMINDS_' + schema.name] = json.dumps(schema.content, indent=4, ensure_ascii=False)
+        return schema_files
+
+    async def add_schemas(self):
+        """Saves schema json files to folder that will zipped."""
+        if not os.path.isdir(self.tmp_folder):
+            os.mkdir(self.tmp_folder)
+            os.mkdir(self.tmp_folder + '/data')
+
+        schema_files = await self.get_schema_files()
+        for name, content in schema_files.items():
+            with open(self.tmp_folder + '/' + name, 'w') as w:
+                w.write(content)
+
+    async def stream_version(self):
+        """Zip the dataset files straight into a multipart upload to minio, without staging them on disk."""
+        schema_files = await self.get_schema_files()
+        sources = []
+        for file in self.dataset_files:
+            location_data = parse_minio_location(file['storage']['location_uri'])
+            sources.append(
+                ZipSource(
+                    arcname=get_node_logical_path(file),
+                    bucket=location_data['bucket'],
+                    path=location_data['path'],
+                    size=file.get('size') or 0,
+                )
+            )
+
+        bucket = self.dataset.code
+        path = 'versions/' + self.zip_path.split('/')[-1] + '.zip'
+        try:
+            await run_in_threadpool(
+                stream_zip_to_minio,
+                self.mc.client,
+                bucket,
+                path,
+                sources,
+                schema_files,
+                part_size=ConfigClass.PUBLISH_PART_SIZE,
+                memory_budget=ConfigClass.PUBLISH_MEMORY_BUDGET,
+                download_concurrency=ConfigClass.PUBLISH_DOWNLOAD_CONCURRENCY,
+            )
+        except Exception as e:
+            error_msg = f'Error streaming version to minio: {str(e)}'
+            logger.error(error_msg)
+            raise Exception(error_msg)
+        return get_minio_location(bucket, path)
 
     async def upload_version(self):
         """Upload version zip to minio."""
@@ -180,8 +305,7 @@ class PublishVersion(object):
                 path,
                 self.zip_path + '.zip',
             )
-            minio_http = ('https://' if ConfigClass.MINIO_HTTPS else 'http://') + ConfigClass.MINIO_ENDPOINT
-            minio_location = f'minio://{minio_http}/{bucket}/{path}'
+            minio_location = get_minio_location(bucket, path)
         except Exception as e:
             error_msg = f'Error uploading files to minio: {str(e)}'
             logger.error(error_msg)
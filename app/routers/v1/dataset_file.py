@@ -13,9 +13,12 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import asyncio
 import copy
+import json
 import time
 from typing import Optional
+from uuid import UUID
 
 import httpx
 from common import LoggerFactory
@@ -29,19 +32,27 @@ from fastapi_utils import cbv
 from app.clients import MetadataClient
 from app.clients import ProjectClient
 from app.config import ConfigClass
+from app.core.db import db_session_scope
 from app.core.db import get_db_session
 from app.models.dataset import Dataset
+from app.resources.batch_validator import BatchValidator
 from app.resources.error_handler import catch_internal
+from app.resources.file_move import get_folder_path
+from app.resources.file_move import is_in_subtree
+from app.resources.file_move import move_nodes
+from app.resources.job_status import JobStatusEmitter
 from app.resources.locks import recursive_lock_delete
 from app.resources.locks import recursive_lock_import
 from app.resources.locks import recursive_lock_move_rename
-from app.resources.locks import unlock_resource
+from app.resources.locks import unlock_resources
+from app.resources.tree_index import ContainerTreeIndex
 from app.resources.utils import create_file_node
 from app.resources.utils import create_folder_node
 from app.resources.utils import delete_node
-from app.resources.utils import get_children_nodes
 from app.resources.utils import get_node_by_geid
+from app.resources.utils import get_node_logical_path
 from app.resources.utils import get_parent_node
+from app.resources.utils import run_concurrently
 from app.schemas.base import APIResponse
 from app.schemas.base import EAPIResponseCode
 from app.schemas.import_data import DatasetFileDelete
@@ -50,6 +61,9 @@ from app.schemas.import_data import DatasetFileRename
 from app.schemas.import_data import ImportDataPost
 from app.services.activity_log import FileFolderActivityLogService
 from app.services.dataset import SrvDatasetMgr
+from app.services.job_queue import JobCheckpoint
+from app.services.job_queue import job_queue
+from app.services.job_queue import schedule_job
 
 router = APIRouter()
 
@@ -59,6 +73,31 @@ _API_NAMESPACE = 'api_dataset'
 HEADERS = {'accept': 'application/json', 'Content-Type': 'application/json'}
 logger = LoggerFactory(__name__).get_logger()
 
+# the fields the file listing can be sorted by, with their name in the metadata service, other fields fall back to
+# the creation time. The legacy field names are still sent by older clients.
+LIST_FILES_SORTING = {
+    'createTime': 'created_time',
+    'created_time': 'created_time',
+    'time_created': 'created_time',
+    'last_updated_time': 'last_updated_time',
+    'time_lastmodified': 'last_updated_time',
+    'name': 'name',
+    'owner': 'owner',
+    'uploader': 'owner',
+    'size': 'size',
+    'file_size': 'size',
+    'type': 'type',
+}
+# the fields of `query` the file listing can be filtered by, with their name in the metadata service, other fields
+# are ignored
+LIST_FILES_FILTERS = {
+    'name': 'name',
+    'owner': 'owner',
+    'uploader': 'owner',
+    'type': 'type',
+    'archived': 'archived',
+}
+
 
 @cbv.cbv(router)
 class APIImportData:
@@ -82,7 +121,6 @@ class APIImportData:
         background_tasks: BackgroundTasks,
         sessionId: Optional[str] = Cookie(None),
         Authorization: Optional[str] = Header(None),
-        refresh_token: Optional[str] = Header(None),
         db=Depends(get_db_session),
     ):
         import_list = request_payload.source_list
@@ -90,7 +128,6 @@ class APIImportData:
         project_id = request_payload.project_geid
         session_id = sessionId
         minio_access_token = Authorization
-        minio_refresh_token = refresh_token
         api_response = APIResponse()
 
         # if dataset not found return 404
@@ -120,16 +157,19 @@ class APIImportData:
         # start the background job to copy the file one by one
 
         if len(import_list) > 0:
-            background_tasks.add_task(
-                self.copy_files_worker,
+            await schedule_job(
+                background_tasks,
                 db,
-                import_list,
-                dataset,
-                oper,
-                project_id,
-                session_id,
-                minio_access_token,
-                minio_refresh_token,
+                'dataset_file_import',
+                dataset.code,
+                {
+                    'dataset_id': str(dataset.id),
+                    'import_list': import_list,
+                    'oper': oper,
+                    'project_id': project_id,
+                    'session_id': session_id,
+                    'access_token': minio_access_token,
+                },
             )
 
         return api_response.json_response()
@@ -147,13 +187,11 @@ class APIImportData:
         background_tasks: BackgroundTasks,
         sessionId: Optional[str] = Cookie(None),
         Authorization: Optional[str] = Header(None),
-        refresh_token: Optional[str] = Header(None),
         db=Depends(get_db_session),
     ):
         api_response = APIResponse()
         session_id = sessionId
         minio_access_token = Authorization
-        minio_refresh_token = refresh_token
 
         # validate the dataset if exists
         srv_dataset = SrvDatasetMgr()
@@ -172,15 +210,18 @@ class APIImportData:
 
         # loop over the list and delete the file one by one
         if len(delete_list) > 0:
-            background_tasks.add_task(
-                self.delete_files_work,
+            await schedule_job(
+                background_tasks,
                 db,
-                delete_list,
-                dataset_obj,
-                request_payload.operator,
-                session_id,
-                minio_access_token,
-                minio_refresh_token,
+                'dataset_file_delete',
+                dataset_obj.code,
+                {
+                    'dataset_id': str(dataset_obj.id),
+                    'delete_list': delete_list,
+                    'oper': request_payload.operator,
+                    'session_id': session_id,
+                    'access_token': minio_access_token,
+                },
             )
 
         return api_response.json_response()
@@ -205,9 +246,9 @@ class APIImportData:
         """the api will list the file/folder at level 1 by default.
 
         If folder_geid is not None, then it will treat the folder_geid as root and find the relative level 1 file/folder
+        The pagination, sorting and filtering are done by the metadata service, only the requested page is returned.
         """
         api_response = APIResponse()
-        ret_routing = []
         # validate the dataset if exists
         srv_dataset = SrvDatasetMgr()
         dataset = await srv_dataset.get_bygeid(db, dataset_geid)
@@ -217,25 +258,60 @@ class APIImportData:
             api_response.error_msg = 'Invalid geid for dataset'
             return api_response.json_response()
 
-        # find the root folder node
-        root_geid = folder_geid if folder_geid else None
+        sorting = LIST_FILES_SORTING.get(order_by)
+        if sorting is None:
+            self.__logger.warning(f'Unsupported order_by {order_by}, sorting the files by creation time')
+            sorting = 'created_time'
+        if order_type not in ('asc', 'desc'):
+            self.__logger.warning(f'Unsupported order_type {order_type}, sorting the files in descending order')
+            order_type = 'desc'
 
-        # then get the first level nodes
-        file_folder_nodes = await get_children_nodes(dataset.code, root_geid)
+        try:
+            query = json.loads(query)
+        except ValueError:
+            query = None
+        if not isinstance(query, dict):
+            self.__logger.warning(f'Ignoring invalid query {query}')
+            query = {}
+        unsupported = set(query) - set(LIST_FILES_FILTERS)
+        if unsupported:
+            self.__logger.warning(f'Ignoring unsupported filters {", ".join(sorted(unsupported))}')
+        filters = {LIST_FILES_FILTERS[key]: value for key, value in query.items() if key in LIST_FILES_FILTERS}
+
+        # find the path of the root folder, the items directly under it are listed
+        parent_path = None
+        if folder_geid:
+            folder = await get_node_by_geid(folder_geid)
+            if not folder or folder.get('container_code') != dataset.code:
+                api_response.code = EAPIResponseCode.not_found
+                api_response.error_msg = 'Invalid geid for folder'
+                return api_response.json_response()
+            parent_path = folder['name']
+            if folder.get('parent_path'):
+                parent_path = folder['parent_path'] + '.' + folder['name']
+
+        search = await MetadataClient.search_objects(
+            dataset.code,
+            parent_path=parent_path,
+            page=page,
+            page_size=page_size,
+            sorting=sorting,
+            order=order_type,
+            filters=filters,
+        )
 
         # then get the routing this will return as parent level
         # like admin->folder1->file1 in UI
-        if file_folder_nodes:
-            parent_path = file_folder_nodes[0]['parent_path']
-            ret_routing = parent_path.split('.') if parent_path else []
+        ret_routing = parent_path.split('.') if parent_path else []
 
-        total = len(file_folder_nodes)
         ret = {
-            'data': file_folder_nodes,
+            'data': search['result'],
             'route': ret_routing,
         }
         api_response.result = ret
-        api_response.total = total
+        api_response.page = page
+        api_response.total = search.get('total', len(search['result']))
+        api_response.num_of_pages = search.get('num_of_pages', 1)
         return api_response.json_response()
 
     @router.post(
@@ -251,13 +327,11 @@ class APIImportData:
         background_tasks: BackgroundTasks,
         sessionId: Optional[str] = Cookie(None),
         Authorization: Optional[str] = Header(None),
-        refresh_token: Optional[str] = Header(None),
         db=Depends(get_db_session),
     ):
         api_response = APIResponse()
         session_id = sessionId
         minio_access_token = Authorization
-        minio_refresh_token = refresh_token
         # validate the dataset if exists
         srv_dataset = SrvDatasetMgr()
         dataset = await srv_dataset.get_bygeid(db, dataset_id)
@@ -290,18 +364,20 @@ class APIImportData:
 
         # validate the file if it is under the dataset
         move_list = request_payload.source_list
-        move_list, wrong_file = await self.validate_files_folders(move_list, dataset.code)
+        # the same dataset index serves the validation and the duplicate check
+        tree_index = ContainerTreeIndex(dataset.code)
+        move_list, wrong_file = await self.validate_files_folders(move_list, dataset.code, tree_index=tree_index)
+        target_path = get_folder_path(target_folder)
+        if any(is_in_subtree(target_path, item) for item in move_list):
+            api_response.code = EAPIResponseCode.bad_request
+            api_response.error_msg = 'A folder cannot be moved into itself or one of its subfolders'
+            return api_response.json_response()
         future_list = copy.deepcopy(move_list)
+        # every moved item lands directly in the target folder
         for file in future_list:
-            if request_payload.target_geid == dataset_id:
-                file['parent'] = None
-                file['parent_path'] = None
-            else:
-                file['parent'] = target_folder['id']
-                file['parent_path'] = (target_folder['name'] if target_folder['name'] else '') + (
-                    '.' + file['parent_path'] if file['parent_path'] else ''
-                )
-        duplicate, future_list = await self.remove_duplicate_file(future_list, dataset.code)
+            file['parent'] = target_folder['id']
+            file['parent_path'] = target_path
+        duplicate, future_list = await self.remove_duplicate_file(future_list, dataset.code, tree_index=tree_index)
         final_list = []
         duplicated_ids = [item['id'] for item in duplicate]
         for item in move_list:
@@ -311,17 +387,20 @@ class APIImportData:
         api_response.result = {'processing': final_list, 'ignored': wrong_file + duplicate}
 
         # start the background job to copy the file one by one
-        if len(move_list) > 0:
-            background_tasks.add_task(
-                self.move_file_worker,
+        if len(final_list) > 0:
+            await schedule_job(
+                background_tasks,
                 db,
-                final_list,
-                dataset,
-                request_payload.operator,
-                target_folder,
-                session_id,
-                minio_access_token,
-                minio_refresh_token,
+                'dataset_file_move',
+                dataset.code,
+                {
+                    'dataset_id': str(dataset.id),
+                    'move_list': final_list,
+                    'oper': request_payload.operator,
+                    'target_folder': target_folder,
+                    'session_id': session_id,
+                    'access_token': minio_access_token,
+                },
             )
 
         return api_response.json_response()
@@ -340,7 +419,6 @@ class APIImportData:
         background_tasks: BackgroundTasks,
         sessionId: Optional[str] = Cookie(None),
         Authorization: Optional[str] = Header(None),
-        refresh_token: Optional[str] = Header(None),
         db=Depends(get_db_session),
     ):
         api_response = APIResponse()
@@ -363,12 +441,13 @@ class APIImportData:
         # validate the file IS from the dataset
         # rename to same name will be blocked
 
-        rename_list, wrong_file = await self.validate_files_folders([target_file], dataset.code)
+        tree_index = ContainerTreeIndex(dataset.code)
+        rename_list, wrong_file = await self.validate_files_folders([target_file], dataset.code, tree_index=tree_index)
         if len(rename_list) > 0:
             future_list = copy.deepcopy(rename_list)
             future_list[0]['name'] = new_name
 
-            duplicate, _ = await self.remove_duplicate_file(future_list, dataset.code)
+            duplicate, _ = await self.remove_duplicate_file(future_list, dataset.code, tree_index=tree_index)
             # fomutate the result
             if len(duplicate) > 0:
                 duplicate = rename_list
@@ -377,19 +456,58 @@ class APIImportData:
 
         # loop over the list and delete the file one by one
         if len(rename_list) > 0:
-            background_tasks.add_task(
-                self.rename_file_worker,
-                rename_list[0],
-                new_name,
-                dataset,
-                request_payload.operator,
-                session_id,
-                minio_access_token,
-                refresh_token,
+            await schedule_job(
+                background_tasks,
+                db,
+                'dataset_file_rename',
+                dataset.code,
+                {
+                    'dataset_id': str(dataset.id),
+                    'old_file': rename_list[0],
+                    'new_name': new_name,
+                    'oper': request_payload.operator,
+                    'session_id': session_id,
+                    'access_token': minio_access_token,
+                },
             )
 
         return api_response.json_response()
 
+    @router.post(
+        '/dataset/{dataset_id}/jobs/{job_id}/resume',
+        tags=[_API_TAG],
+        summary='API will resume a failed import or delete from its last checkpoint',
+    )
+    @catch_internal(_API_NAMESPACE)
+    async def resume_job(self, dataset_id, job_id: UUID, db=Depends(get_db_session)):
+        api_response = APIResponse()
+
+        srv_dataset = SrvDatasetMgr()
+        dataset = await srv_dataset.get_bygeid(db, dataset_id)
+        if dataset is None:
+            api_response.code = EAPIResponseCode.not_found
+            api_response.error_msg = 'Invalid geid for dataset'
+            return api_response.json_response()
+
+        job = await job_queue.get(db, job_id)
+        if job is None or job.dataset_code != dataset.code:
+            api_response.code = EAPIResponseCode.not_found
+            api_response.error_msg = 'Invalid job id for dataset'
+            return api_response.json_response()
+
+        if not job_queue.is_resumable(job.action):
+            api_response.code = EAPIResponseCode.conflict
+            api_response.error_msg = 'Only an import or a delete can be resumed'
+            return api_response.json_response()
+
+        if not await job_queue.resume(db, job):
+            api_response.code = EAPIResponseCode.conflict
+            api_response.error_msg = 'Only a failed job can be resumed'
+            return api_response.json_response()
+
+        api_response.result = job.to_dict()
+        return api_response.json_response()
+
     ##########################################################################################################
     #
     # the function will walk throught the list and validate
@@ -402,63 +520,13 @@ class APIImportData:
     # function will return two list:
     # - passed_file is the validated file
     # - not_passed_file is not under the target node
-    async def validate_files_folders(self, file_id_list, code, items_type='dataset'):
-        passed_file = []
-        not_passed_file = []
-        duplicate_in_batch_dict = {}
-
-        obj_list = await MetadataClient.get_objects(code, items_type=items_type)
-        # creates dict where key is obj.id and value is root_objects index
-        object_ids = {obj['id']: obj_list.index(obj) for obj in obj_list}
-        # this is to keep track the object in passed_file array
-        # and in the duplicate_in_batch_dict it will be {"geid": array_index}
-        # and this can help to trace back when duplicate occur
-        array_index = 0
-
-        for file_id in file_id_list:
-            # get index from dict in root_objects
-            root_object_index = object_ids.get(file_id, None)
-
-            # if there is no connect then the node is not correct
-            # else it is correct
-            if root_object_index is None:
-                not_passed_file.append({'id': file_id, 'feedback': 'unauthorized'})
-
-            else:
-                current_node = obj_list[root_object_index]
-                exist_index = duplicate_in_batch_dict.get(current_node.get('name'), None)
-                # if we have process the file with same name in the same BATCH
-                # we will try to update name for ALL duplicate file into display_path
-                if exist_index is not None:
-                    current_node.update(
-                        {
-                            'feedback': 'duplicate in same batch, update the name',
-                            'name': current_node.get('parent_path').replace('.', '_') + current_node.get_name(),
-                        }
-                    )
-
-                    # if the first node is not updated then use the index to trace back
-                    if exist_index != -1:
-                        passed_file[exist_index].update(
-                            {
-                                'name': passed_file[exist_index].get('parent_path').replace('.', '_')
-                                + current_node.get_name(),
-                                'feedback': 'duplicate in same batch, update the name',
-                            }
-                        )
-
-                        # and mark the first one
-                        first_geid = passed_file[exist_index].get('id')
-                        duplicate_in_batch_dict.update({first_geid: -1})
-
-                # else we just record the file for next checking
-                else:
-                    current_node.update({'feedback': 'exist'})
-                    duplicate_in_batch_dict.update({current_node.get('name'): array_index})
-
-                passed_file.append(current_node)
-                array_index += 1
-        return passed_file, not_passed_file
+    async def validate_files_folders(
+        self, file_id_list, code, items_type='dataset', tree_index: ContainerTreeIndex = None
+    ):
+        if tree_index is None:
+            tree_index = ContainerTreeIndex(code, items_type)
+        result = await BatchValidator(tree_index).validate(file_id_list)
+        return result.passed, result.ignored
 
     # the function will check if the file IS from core
     # and will block other files(greenroom, trashfile...)
@@ -477,133 +545,48 @@ class APIImportData:
     # the function will reuse the <validate_files_folders> to check
     # if the file already exist directly under the root node
     # return True if duplicate else false
-    async def remove_duplicate_file(self, files_list, dataset_code):
-        dataset_objects = await MetadataClient.get_objects(dataset_code)
+    async def remove_duplicate_file(self, files_list, dataset_code, tree_index: ContainerTreeIndex = None):
+        if tree_index is None:
+            tree_index = ContainerTreeIndex(dataset_code)
         duplic_file = []
         not_duplic_file = []
-        name_parent_dict = {obj['name']: obj['parent_path'] for obj in dataset_objects}
-        type_dict = {obj['name']: obj['type'] for obj in dataset_objects}
+        # the files of the batch also collide with each other
+        batch_paths = set()
         for file in files_list:
-            same_name = name_parent_dict.get(file.get('name'), 'not_found')
-            obj_type = type_dict.get(file.get('name'), 'not_found')
-            if same_name == 'not_found':
-                not_duplic_file.append(file)
-            elif same_name == file.get('parent_path') and obj_type == file.get('type'):
+            path = (file.get('parent_path'), file.get('name'), file.get('type'))
+            if path in batch_paths or await tree_index.contains(*path):
                 file.update({'feedback': 'duplicate or unauthorized'})
                 duplic_file.append(file)
             else:
+                batch_paths.add(path)
                 not_duplic_file.append(file)
 
         return duplic_file, not_duplic_file
 
-    # TODO make it into the helper function
-    # match (n)-[r:own*]->(f) where n.global_entity_id="9ff8382d-f476-4cdf-a357-66c4babf8320-1626104650" delete
-    # FOREACH(r), f
-    async def send_notification(
-        self, session_id, source_list, action, status, dataset_geid, operator, task_id, payload=None
-    ):
-        if not payload:
-            payload = {}
-
-        url = ConfigClass.QUEUE_SERVICE + 'broker/pub'
-        post_json = {
-            'event_type': 'DATASET_FILE_NOTIFICATION',
-            'payload': {
-                'session_id': session_id,
-                'task_id': task_id,
-                'source': source_list,
-                'action': action,
-                'status': status,  # INIT/RUNNING/FINISH/ERROR
-                'dataset': dataset_geid,
-                'operator': operator,
-                'payload': payload,
-                'update_timestamp': time.time(),
-            },
-            'binary': True,
-            'queue': 'socketio',
-            'routing_key': 'socketio',
-            'exchange': {'name': 'socketio', 'type': 'fanout'},
-        }
-        async with httpx.AsyncClient() as client:
-            res = await client.post(url, json=post_json)
-        if res.status_code != 200:
-            raise Exception('send_notification() {}: {}'.format(res.status_code, res.text))
-
-        return res
-
-    async def create_job_status(
-        self, session_id, source_file, action, status, dataset, operator, task_id, payload=None
-    ):
-        if not payload:
-            payload = {}
-        # first send the notification
-        dataset_geid = str(dataset.id)
-        dataset_code = dataset.code
-        await self.send_notification(session_id, source_file, action, status, dataset_geid, operator, task_id)
-        # also save to redis for display
-        source_geid = source_file.get('id')
-        job_id = action + '-' + source_geid + '-' + str(int(time.time()))
-        task_url = ConfigClass.DATA_UTILITY_SERVICE + 'tasks/'
-        post_json = {
-            'session_id': session_id,
-            'label': 'Dataset',
-            'source': source_geid,
-            'task_id': task_id,
-            'job_id': job_id,
-            'action': action,
-            'code': dataset_code,
-            'target_status': status,
-            'operator': operator,
-            'payload': source_file,
-        }
-        async with httpx.AsyncClient() as client:
-            res = await client.post(task_url, json=post_json)
-        if res.status_code != 200:
-            raise Exception('save redis error {}: {}'.format(res.status_code, res.text))
-
-        return {source_geid: job_id}
-
-    async def update_job_status(
-        self, session_id, source_file, action, status, dataset, operator, task_id, job_id, payload=None
-    ):
-        if not payload:
-            payload = {}
-        # first send the notification
-        dataset_geid = str(dataset.id)
-        await self.send_notification(session_id, source_file, action, status, dataset_geid, operator, task_id, payload)
-
-        # also save to redis for display
-        task_url = ConfigClass.DATA_UTILITY_SERVICE + 'tasks/'
-        post_json = {
-            'session_id': session_id,
-            'label': 'Dataset',
-            'task_id': task_id,
-            'job_id': job_id,
-            'status': status,
-            'add_payload': payload,
-        }
-        async with httpx.AsyncClient() as client:
-            res = await client.put(task_url, json=post_json)
-        if res.status_code != 200:
-            raise Exception('save redis error {}: {}'.format(res.status_code, res.text))
-
-        return res
-
-    # the function will call the create_job_status to initialize
-    # the job status in the redis and prepare for update in copy/delete
+    # the function will initialize the job status in the redis
+    # and prepare for update in copy/delete
     # the function will return the job object include:
     #   - session id: fetch from frontend
     #   - task id: random generate for batch operation
     #   - action: the file action name
     #   - job id mapping: dictionary for tracking EACH file progress
+    #   - status emitter: batches the job status updates, closed by the worker
     async def initialize_file_jobs(self, session_id, action, batch_list, dataset_obj, oper):
         # use the dictionary to keep track the file action with
         session_id = 'local_test' if not session_id else session_id
         # action = "dataset_file_import"
         task_id = action + '-' + str(int(time.time()))
-        job_tracker = {'session_id': session_id, 'task_id': task_id, 'action': action, 'job_id': {}}
+        status_emitter = JobStatusEmitter(session_id, task_id, action, dataset_obj, oper)
+        status_emitter.start()
+        job_tracker = {
+            'session_id': session_id,
+            'task_id': task_id,
+            'action': action,
+            'job_id': {},
+            'status_emitter': status_emitter,
+        }
         for file_object in batch_list:
-            tracker = await self.create_job_status(session_id, file_object, action, 'INIT', dataset_obj, oper, task_id)
+            tracker = await status_emitter.create(file_object, 'INIT')
             job_tracker['job_id'].update(tracker)
 
         return job_tracker
@@ -621,114 +604,205 @@ class APIImportData:
         refresh_token,
         job_tracker=None,
         new_name=None,
+        tree_index=None,
+        copy_semaphore=None,
+        checkpoint: JobCheckpoint = None,
+        target_index: ContainerTreeIndex = None,
     ):
-        num_of_files = 0
-        total_file_size = 0
+        """copy the nodes and their children into the dataset.
+
+        The nodes of one level are copied concurrently, the folder node is always created before its children. The
+        `copy_semaphore` is shared by the whole tree and bounds how many file copies run at the same time. With a
+        `checkpoint` every copied node is recorded and the nodes copied by a previous run of the job are skipped.
+        The `target_index` of the dataset, listed before the run, holds the items a previous run created but could
+        not record, they are reused instead of being created twice.
+        """
+        if tree_index is None:
+            tree_index = ContainerTreeIndex.from_nodes(current_nodes)
+        if copy_semaphore is None:
+            copy_semaphore = asyncio.Semaphore(ConfigClass.FILE_COPY_CONCURRENCY)
+
+        # update here if the folder/file is archieved then skip
+        current_nodes = [ff_object for ff_object in current_nodes if not ff_object.get('archived', False)]
+        results = await run_concurrently(
+            self._copy_node(
+                ff_object,
+                dataset,
+                oper,
+                current_root_path,
+                parent_node,
+                access_token,
+                refresh_token,
+                job_tracker,
+                new_name,
+                tree_index,
+                copy_semaphore,
+                checkpoint,
+                target_index,
+            )
+            for ff_object in current_nodes
+        )
+
+        num_of_files = sum(result[0] for result in results)
+        total_file_size = sum(result[1] for result in results)
         # this variable DOESNOT contain the child nodes
-        new_lv1_nodes = []
-        # copy the files under the project neo4j node to dataset node
-        for ff_object in current_nodes:
-            ff_geid = ff_object.get('id')
-            new_node = None
+        new_lv1_nodes = [result[2] for result in results if result[2] is not None]
+        return num_of_files, total_file_size, new_lv1_nodes
 
-            # update here if the folder/file is archieved then skip
-            if ff_object.get('archived', False):
-                continue
+    async def _copy_node(
+        self,
+        ff_object,
+        dataset,
+        oper,
+        current_root_path,
+        parent_node,
+        access_token,
+        refresh_token,
+        job_tracker,
+        new_name,
+        tree_index,
+        copy_semaphore,
+        checkpoint,
+        target_index,
+    ):
+        ff_geid = ff_object.get('id')
+        num_of_files = 0
+        total_file_size = 0
+        new_node = None
 
-            # here ONLY the first level file/folder will trigger the notification&job status
+        done = checkpoint.get(ff_geid) if checkpoint else None
+        if done and done.finished:
             if job_tracker:
                 job_id = job_tracker['job_id'].get(ff_geid)
-                await self.update_job_status(
-                    job_tracker['session_id'],
-                    ff_object,
-                    job_tracker['action'],
-                    'RUNNING',
-                    dataset,
-                    oper,
-                    job_tracker['task_id'],
-                    job_id,
-                )
+                await job_tracker['status_emitter'].update(ff_object, 'FINISH', job_id, payload=done.new_item)
+            return num_of_files, total_file_size, done.new_item
 
-            ################################################################################################
-            # recursive logic below
+        # here ONLY the first level file/folder will trigger the notification&job status
+        if job_tracker:
+            job_id = job_tracker['job_id'].get(ff_geid)
+            await job_tracker['status_emitter'].update(ff_object, 'RUNNING', job_id)
 
-            if ff_object.get('type').lower() == 'file':
-                # TODO simplify here
-                minio_path = ff_object.get('storage').get('location_uri').split('//')[-1]
-                _, bucket, old_path = tuple(minio_path.split('/', 2))
-                if isinstance(parent_node, Dataset):
-                    current_root_path = None
-                else:
-                    current_root_path = parent_node.get('parent_path')
+        ################################################################################################
+        # recursive logic below
 
-                # create the copied node
+        if ff_object.get('type').lower() == 'file':
+            if isinstance(parent_node, Dataset):
+                relative_path = None
+            else:
+                relative_path = parent_node.get('parent_path')
+
+            # report the progress of the large files copied part by part
+            async def report_progress(copied_size, total_size):
+                await job_tracker['status_emitter'].update(
+                    ff_object, 'RUNNING', job_id, payload={'copied_size': copied_size, 'total_size': total_size}
+                )
+
+            # create the copied node
+            existing_node = await self._find_uncheckpointed_item(target_index, ff_object, parent_node, new_name)
+            async with copy_semaphore:
                 new_node, _ = await create_file_node(
                     dataset,
                     ff_object,
                     oper,
                     parent_node,
-                    current_root_path,
+                    relative_path,
                     access_token,
                     refresh_token,
                     new_name,
+                    progress=report_progress if job_tracker else None,
+                    existing_node=existing_node,
                 )
-                # update for number and size
-                num_of_files += 1
-                total_file_size += ff_object.get('size', 0)
-                new_lv1_nodes.append(new_node)
-
-            # else it is folder will trigger the recursive
-            elif ff_object.get('type').lower() == 'folder':
-                # first create the folder
-                new_node, _ = await create_folder_node(
-                    dataset.code, ff_object, oper, parent_node, current_root_path, new_name
-                )
-                new_lv1_nodes.append(new_node)
-
-                # seconds recursively go throught the folder/subfolder by same proccess
-                # also if we want the folder to be renamed if new_name is not None
-                if new_name:
-                    filename = new_name
-                else:
-                    filename = ff_object.get('name')
-
-                if current_root_path == ConfigClass.DATASET_FILE_FOLDER:
-                    next_root_path = filename
-                else:
-                    next_root_path = current_root_path + '.' + filename
-                children_nodes = await get_children_nodes(
-                    ff_object['container_code'], ff_object.get('id', None), ff_object['container_type']
-                )
-                num_of_child_files, num_of_child_size, _ = await self.recursive_copy(
-                    children_nodes, dataset, oper, next_root_path, new_node, access_token, refresh_token
-                )
+            # update for number and size
+            num_of_files += 1
+            total_file_size += ff_object.get('size', 0)
+            if checkpoint:
+                await checkpoint.save(ff_geid, new_node, num_of_files=1, size=ff_object.get('size', 0))
+
+        # else it is folder will trigger the recursive
+        elif ff_object.get('type').lower() == 'folder':
+            # first create the folder, unless a previous run of the job created it
+            if done:
+                new_node = done.new_item
+            else:
+                new_node = await self._find_uncheckpointed_item(target_index, ff_object, parent_node, new_name)
+                if new_node is None:
+                    new_node, _ = await create_folder_node(
+                        dataset.code, ff_object, oper, parent_node, current_root_path, new_name
+                    )
+                if checkpoint:
+                    await checkpoint.save(ff_geid, new_node, finished=False)
 
-                # append the log together
-                num_of_files += num_of_child_files
-                total_file_size += num_of_child_size
-            ##########################################################################################################
+            # seconds recursively go throught the folder/subfolder by same proccess
+            # also if we want the folder to be renamed if new_name is not None
+            if new_name:
+                filename = new_name
+            else:
+                filename = ff_object.get('name')
 
-            # here after all use the geid to mark the job done for either first level folder/file
-            # if the geid is not in the tracker then it is child level ff. ignore them
-            if job_tracker:
-                job_id = job_tracker['job_id'].get(ff_geid)
-                await self.update_job_status(
-                    job_tracker['session_id'],
-                    ff_object,
-                    job_tracker['action'],
-                    'FINISH',
-                    dataset,
-                    oper,
-                    job_tracker['task_id'],
-                    job_id,
-                    payload=new_node,
-                )
+            if current_root_path == ConfigClass.DATASET_FILE_FOLDER:
+                next_root_path = filename
+            else:
+                next_root_path = current_root_path + '.' + filename
+            children_nodes = await tree_index.get_children(ff_object.get('id', None))
+            num_of_child_files, num_of_child_size, _ = await self.recursive_copy(
+                children_nodes,
+                dataset,
+                oper,
+                next_root_path,
+                new_node,
+                access_token,
+                refresh_token,
+                tree_index=tree_index,
+                copy_semaphore=copy_semaphore,
+                checkpoint=checkpoint,
+                target_index=target_index,
+            )
 
-        return num_of_files, total_file_size, new_lv1_nodes
+            # append the log together
+            num_of_files += num_of_child_files
+            total_file_size += num_of_child_size
+            # the files are counted by their own checkpoint
+            if checkpoint:
+                await checkpoint.save(ff_geid, new_node)
+        ##########################################################################################################
+
+        # here after all use the geid to mark the job done for either first level folder/file
+        # if the geid is not in the tracker then it is child level ff. ignore them
+        if job_tracker:
+            job_id = job_tracker['job_id'].get(ff_geid)
+            await job_tracker['status_emitter'].update(ff_object, 'FINISH', job_id, payload=new_node)
+
+        return num_of_files, total_file_size, new_node
+
+    @staticmethod
+    async def _find_uncheckpointed_item(target_index, ff_object, parent_node, new_name):
+        """Return the item a previous run of the job created for the node just before it stopped, if any."""
+        if target_index is None:
+            return None
+        name = new_name or ff_object.get('name')
+        for item in await target_index.get_by_path(get_folder_path(parent_node), name):
+            if (
+                item['type'].lower() == ff_object.get('type').lower()
+                and item.get('parent') == parent_node.get('id')
+                and not item.get('archived', False)
+            ):
+                return item
+        return None
 
     async def recursive_delete(
-        self, current_nodes, dataset, oper, parent_node, access_token, refresh_token, job_tracker=None
+        self,
+        current_nodes,
+        dataset,
+        oper,
+        parent_node,
+        access_token,
+        refresh_token,
+        job_tracker=None,
+        tree_index=None,
+        checkpoint: JobCheckpoint = None,
     ):
+        if tree_index is None:
+            tree_index = ContainerTreeIndex.from_nodes(current_nodes)
         num_of_files = 0
         total_file_size = 0
         # copy the files under the project neo4j node to dataset node
@@ -739,19 +813,17 @@ class APIImportData:
             if ff_object.get('archived', False):
                 continue
 
+            # the node was deleted by a previous run of the job
+            if checkpoint and checkpoint.get(ff_geid):
+                if job_tracker:
+                    job_id = job_tracker['job_id'].get(ff_geid)
+                    await job_tracker['status_emitter'].update(ff_object, 'FINISH', job_id)
+                continue
+
             # here ONLY the first level file/folder will trigger the notification&job status
             if job_tracker:
                 job_id = job_tracker['job_id'].get(ff_geid)
-                await self.update_job_status(
-                    job_tracker['session_id'],
-                    ff_object,
-                    job_tracker['action'],
-                    'RUNNING',
-                    dataset,
-                    oper,
-                    job_tracker['task_id'],
-                    job_id,
-                )
+                await job_tracker['status_emitter'].update(ff_object, 'RUNNING', job_id)
 
             ################################################################################################
             if ff_object.get('type').lower() == 'file':
@@ -763,82 +835,148 @@ class APIImportData:
 
                 # for file we can just disconnect and delete
                 # TODO MOVE OUTSIDE <=============================================================
-                await MetadataClient.delete_object(ff_object.get('id'))
+                await self._delete_item(ff_object, dataset, checkpoint)
                 await delete_node(ff_object, access_token, refresh_token)
 
                 # update for number and size
                 num_of_files += 1
                 total_file_size += ff_object.get('size', 0)
+                if checkpoint:
+                    await checkpoint.save(ff_geid, num_of_files=1, size=ff_object.get('size', 0))
 
             # else it is folder will trigger the recursive
             elif ff_object.get('type').lower() == 'folder':
 
                 # for folder, we have to disconnect all child node then
                 # disconnect it from parent
-                children_nodes = await get_children_nodes(ff_object.get('container_code'), ff_object.get('id'))
+                children_nodes = await tree_index.get_children(ff_object.get('id'))
                 num_of_child_files, num_of_child_size = await self.recursive_delete(
-                    children_nodes, dataset, oper, ff_object, access_token, refresh_token
+                    children_nodes,
+                    dataset,
+                    oper,
+                    ff_object,
+                    access_token,
+                    refresh_token,
+                    tree_index=tree_index,
+                    checkpoint=checkpoint,
                 )
 
                 # after the child has been deleted then we disconnect current node
-                await MetadataClient.delete_object(ff_object.get('id'))
+                await self._delete_item(ff_object, dataset, checkpoint)
                 await delete_node(ff_object, access_token, refresh_token)
 
                 # append the log together
                 num_of_files += num_of_child_files
                 total_file_size += num_of_child_size
+                if checkpoint:
+                    await checkpoint.save(ff_geid)
             ##########################################################################################
 
             # here after all use the geid to mark the job done for either first level folder/file
             # if the geid is not in the tracker then it is child level ff. ignore them
             if job_tracker:
                 job_id = job_tracker['job_id'].get(ff_geid)
-                await self.update_job_status(
-                    job_tracker['session_id'],
-                    ff_object,
-                    job_tracker['action'],
-                    'FINISH',
-                    dataset,
-                    oper,
-                    job_tracker['task_id'],
-                    job_id,
-                )
+                await job_tracker['status_emitter'].update(ff_object, 'FINISH', job_id)
 
         return num_of_files, total_file_size
 
+    @staticmethod
+    async def _delete_item(ff_object, dataset, checkpoint: JobCheckpoint = None):
+        """Delete the item from metadata, a job run again ignores the items its previous run already deleted."""
+        try:
+            await MetadataClient.delete_object(
+                ff_object.get('id'),
+                ff_object.get('container_code', dataset.code),
+                ff_object.get('container_type', 'dataset'),
+            )
+        except httpx.HTTPStatusError as e:
+            # the previous run stopped between the delete and its checkpoint
+            if checkpoint is None or e.response.status_code != EAPIResponseCode.not_found.value:
+                raise
+            logger.info(f'Item {ff_object.get("id")} was already deleted by a previous run of the job')
+
+    @staticmethod
+    def _should_update_totals(db, checkpoint: JobCheckpoint = None) -> bool:
+        """Tell if the job still has to add its totals to the dataset.
+
+        The totals are recorded in `db` with the dataset update, so a job resumed after the update does not add them
+        twice.
+        """
+        if checkpoint is None:
+            return True
+        if checkpoint.get(checkpoint.TOTALS_ITEM_ID):
+            return False
+        checkpoint.stage(db, checkpoint.TOTALS_ITEM_ID)
+        return True
+
     ######################################################################################################
 
     async def copy_files_worker(
-        self, db, import_list, dataset_obj, oper, source_project_geid, session_id, access_token, refresh_token
+        self,
+        import_list,
+        dataset_obj,
+        oper,
+        source_project_geid,
+        session_id,
+        access_token,
+        refresh_token,
+        checkpoint: JobCheckpoint = None,
     ):
+        """Copy the items from the project into the dataset.
+
+        With a `checkpoint` the items copied by a previous run of the job are skipped, and a failure is raised so the
+        job can be resumed.
+        """
         # TODO:
         # replace source_project_geid with the result from that query already requested.
         # This avoid an unnecessary request.
         action = 'dataset_file_import'
         job_tracker = await self.initialize_file_jobs(session_id, action, import_list, dataset_obj, oper)
         root_path = ConfigClass.DATASET_FILE_FOLDER
+        # the source tree is listed once and shared by the lock and copy walkers
+        tree_index = ContainerTreeIndex.from_nodes(import_list)
+        locked_node = []
         try:
             # mark the source tree as read, destination as write
-            locked_node, err = await recursive_lock_import(dataset_obj.code, import_list, root_path)
+            locked_node, err = await recursive_lock_import(dataset_obj.code, import_list, root_path, tree_index)
             if err:
                 raise err
 
+            # the dataset is listed before anything is created, so a resumed job finds the items its previous run
+            # created without recording them
+            target_index = None
+            if checkpoint:
+                target_index = ContainerTreeIndex(dataset_obj.code)
+                await target_index.load()
+
             # recursively go throught the folder level by level
             num_of_files, total_file_size, _ = await self.recursive_copy(
-                import_list, dataset_obj, oper, root_path, {}, access_token, refresh_token, job_tracker
+                import_list,
+                dataset_obj,
+                oper,
+                root_path,
+                {},
+                access_token,
+                refresh_token,
+                job_tracker,
+                tree_index=tree_index,
+                checkpoint=checkpoint,
+                target_index=target_index,
             )
 
             # after all update the file number/total size/project geid
             srv_dataset = SrvDatasetMgr()
             logger.info('dataset %s total_files increase' % dataset_obj.code)
-            update_attribute = {
-                'total_files': dataset_obj.total_files + num_of_files,
-                'size': dataset_obj.size + total_file_size,
-                'project_id': source_project_geid,
-            }
-            await srv_dataset.update(db, dataset_obj, update_attribute)
+            if checkpoint:
+                num_of_files, total_file_size = checkpoint.get_totals()
+            # the counters are incremented in place so concurrent imports into the dataset all count
+            async with db_session_scope() as db:
+                if self._should_update_totals(db, checkpoint):
+                    await srv_dataset.increment_stats(
+                        db, dataset_obj, num_of_files, total_file_size, project_id=source_project_geid
+                    )
             logger.info(
-                'dataset %s: %s files added, old total %s' % (dataset_obj.code, num_of_files, dataset_obj.total_files)
+                'dataset %s: %s files added, new total %s' % (dataset_obj.code, num_of_files, dataset_obj.total_files)
             )
             # also update the log
             source_project = await ProjectClient.get_by_id(source_project_geid)
@@ -850,27 +988,19 @@ class APIImportData:
             # loop over all existing job and send error
             for ff_object in import_list:
                 job_id = job_tracker['job_id'].get(ff_object.get('id'))
-                await self.update_job_status(
-                    job_tracker['session_id'],
-                    ff_object,
-                    job_tracker['action'],
-                    'CANCELLED',
-                    dataset_obj,
-                    oper,
-                    job_tracker['task_id'],
-                    job_id,
-                    payload=error_message,
-                )
+                await job_tracker['status_emitter'].update(ff_object, 'CANCELLED', job_id, payload=error_message)
+            # fail the job so it can be resumed from its checkpoint
+            if checkpoint:
+                raise
         finally:
+            await job_tracker['status_emitter'].close()
             # unlock the nodes if we got blocked
-            for resource_key, operation in locked_node:
-                await unlock_resource(resource_key, operation)
+            await unlock_resources(locked_node)
 
         return
 
     async def move_file_worker(
         self,
-        db,
         move_list,
         dataset_obj,
         oper,
@@ -881,6 +1011,9 @@ class APIImportData:
     ):
         action = 'dataset_file_move'
         job_tracker = await self.initialize_file_jobs(session_id, action, move_list, dataset_obj, oper)
+        # snapshot of the dataset before the move, shared by the lock, copy and delete walkers
+        tree_index = ContainerTreeIndex(dataset_obj.code)
+        locked_node = []
         try:
             # then we mark both source node tree and target nodes as write
             if not target_folder.get('id'):
@@ -888,42 +1021,55 @@ class APIImportData:
                 target_folder_name = ConfigClass.DATASET_FILE_FOLDER
             else:
                 target_folder_name = target_folder['name']
-            locked_node, err = await recursive_lock_move_rename(move_list, target_folder_name)
+            locked_node, err = await recursive_lock_move_rename(move_list, target_folder_name, tree_index=tree_index)
             if err:
                 raise err
 
-            # but note here the job tracker is not pass into the function
-            # we only let the delete to state the finish
-            _, _, _ = await self.recursive_copy(
-                move_list, dataset_obj, oper, target_folder_name, target_folder, access_token, refresh_token
-            )
+            if ConfigClass.FILE_MOVE_IN_PLACE:
+                for ff_object in move_list:
+                    job_id = job_tracker['job_id'].get(ff_object.get('id'))
+                    await job_tracker['status_emitter'].update(ff_object, 'RUNNING', job_id)
+                moved_nodes = await move_nodes(
+                    dataset_obj, move_list, target_folder, tree_index, access_token, refresh_token
+                )
+                moved_nodes = {new_node['id']: new_node for new_node in moved_nodes}
+                for ff_object in move_list:
+                    if ff_object.get('id') in moved_nodes:
+                        job_id = job_tracker['job_id'].get(ff_object.get('id'))
+                        new_node = moved_nodes[ff_object.get('id')]
+                        await job_tracker['status_emitter'].update(ff_object, 'FINISH', job_id, payload=new_node)
+            else:
+                # but note here the job tracker is not pass into the function
+                # we only let the delete to state the finish
+                _, _, _ = await self.recursive_copy(
+                    move_list,
+                    dataset_obj,
+                    oper,
+                    target_folder_name,
+                    target_folder,
+                    access_token,
+                    refresh_token,
+                    tree_index=tree_index,
+                )
 
-            # delete the old one
-            await self.recursive_delete(
-                move_list, dataset_obj, oper, target_folder, access_token, refresh_token, job_tracker=job_tracker
-            )
+                # delete the old one
+                await self.recursive_delete(
+                    move_list,
+                    dataset_obj,
+                    oper,
+                    target_folder,
+                    access_token,
+                    refresh_token,
+                    job_tracker=job_tracker,
+                    tree_index=tree_index,
+                )
 
-            # generate the activity log
+            # generate the activity log, with the paths of the item before and after the move without `data`
             dff = ConfigClass.DATASET_FILE_FOLDER
+            target_path = get_folder_path(target_folder)
             for ff_geid in move_list:
-                if ff_geid.get('type').lower() == 'file':
-                    # minio location is minio://http://<end_point>/bucket/user/object_path
-                    minio_path = ff_geid.get('storage').get('location_uri').split('//')[-1]
-                    _, bucket, old_path = tuple(minio_path.split('/', 2))
-                    old_path = old_path.replace(dff, '', 1)
-                else:
-                    # update the relative path by remove `data` at begining
-                    if target_folder.get('parent_path'):
-                        old_path = ff_geid.get('parent_path').replace('.', '/')
-                    else:
-                        old_path = '/'
-
-                if target_folder.get('parent_path'):
-                    parent_path = target_folder.get('parent_path').replace('.', '/')
-                    parent_path += '/' + target_folder_name
-                else:
-                    parent_path = target_folder_name
-                new_path = '/' + parent_path + '/' + ff_geid.get('name')
+                old_path = get_node_logical_path(ff_geid)[len(dff) :]
+                new_path = get_node_logical_path({'parent_path': target_path, 'name': ff_geid['name']})[len(dff) :]
 
                 # send to the es for logging
                 await self.file_act_notifier.send_on_move_event(dataset_obj, ff_geid, oper, old_path, new_path)
@@ -935,37 +1081,51 @@ class APIImportData:
             logger.error(error_message)
             for ff_object in move_list:
                 job_id = job_tracker['job_id'].get(ff_object.get('id'))
-                await self.update_job_status(
-                    job_tracker['session_id'],
-                    ff_object,
-                    job_tracker['action'],
-                    'CANCELLED',
-                    dataset_obj,
-                    oper,
-                    job_tracker['task_id'],
-                    job_id,
-                    payload=error_message,
-                )
+                await job_tracker['status_emitter'].update(ff_object, 'CANCELLED', job_id, payload=error_message)
+            # fail the job instead of marking it as succeeded
+            raise
         finally:
+            await job_tracker['status_emitter'].close()
             # unlock the nodes if we got blocked
-            for resource_key, operation in locked_node:
-                await unlock_resource(resource_key, operation)
+            await unlock_resources(locked_node)
 
         return
 
-    async def delete_files_work(self, db, delete_list, dataset_obj, oper, session_id, access_token, refresh_token):
+    async def delete_files_work(
+        self,
+        delete_list,
+        dataset_obj,
+        oper,
+        session_id,
+        access_token,
+        refresh_token,
+        checkpoint: JobCheckpoint = None,
+    ):
+        """Delete the items of the dataset, with a `checkpoint` the items deleted by a previous run are skipped."""
         deleted_files = []  # for logging action
         action = 'dataset_file_delete'
         job_tracker = await self.initialize_file_jobs(session_id, action, delete_list, dataset_obj, oper)
+        tree_index = ContainerTreeIndex(dataset_obj.code)
+        locked_node = []
         try:
             # mark both source&destination as write lock
-            locked_node, err = await recursive_lock_delete(delete_list)
+            locked_node, err = await recursive_lock_delete(delete_list, tree_index=tree_index)
             if err:
                 raise err
 
             num_of_files, total_file_size = await self.recursive_delete(
-                delete_list, dataset_obj, oper, dataset_obj, access_token, refresh_token, job_tracker
+                delete_list,
+                dataset_obj,
+                oper,
+                dataset_obj,
+                access_token,
+                refresh_token,
+                job_tracker,
+                tree_index,
+                checkpoint=checkpoint,
             )
+            if checkpoint:
+                num_of_files, total_file_size = checkpoint.get_totals()
 
             # TODO try to embed with the notification&job status
             # generate log path
@@ -996,13 +1156,11 @@ class APIImportData:
             # after all update the file number/total size/project geid
             srv_dataset = SrvDatasetMgr()
             logger.info('dataset %s total_files decreased' % dataset_obj.code)
-            update_attribute = {
-                'total_files': dataset_obj.total_files - num_of_files,
-                'size': dataset_obj.size - total_file_size,
-            }
-            await srv_dataset.update(db, dataset_obj, update_attribute)
+            async with db_session_scope() as db:
+                if self._should_update_totals(db, checkpoint):
+                    await srv_dataset.decrement_stats(db, dataset_obj, num_of_files, total_file_size)
             logger.info(
-                'dataset %s : %s files removed, old total %s'
+                'dataset %s : %s files removed, new total %s'
                 % (dataset_obj.code, num_of_files, dataset_obj.total_files)
             )
             # also update the message to service queue
@@ -1015,21 +1173,14 @@ class APIImportData:
             # loop over all existing job and send error
             for ff_object in delete_list:
                 job_id = job_tracker['job_id'].get(ff_object.get('id'))
-                await self.update_job_status(
-                    job_tracker['session_id'],
-                    ff_object,
-                    job_tracker['action'],
-                    'CANCELLED',
-                    dataset_obj,
-                    oper,
-                    job_tracker['task_id'],
-                    job_id,
-                    payload=error_message,
-                )
+                await job_tracker['status_emitter'].update(ff_object, 'CANCELLED', job_id, payload=error_message)
+            # fail the job so it can be resumed from its checkpoint
+            if checkpoint:
+                raise
         finally:
+            await job_tracker['status_emitter'].close()
             # unlock the nodes if we got blocked
-            for resource_key, operation in locked_node:
-                await unlock_resource(resource_key, operation)
+            await unlock_resources(locked_node)
 
         return
 
@@ -1041,16 +1192,7 @@ class APIImportData:
         job_tracker = await self.initialize_file_jobs(session_id, action, [old_file], dataset, oper)
         # since the renanme will be just one file set to the running now
         job_id = job_tracker['job_id'].get(old_file.get('id'))
-        await self.update_job_status(
-            job_tracker['session_id'],
-            old_file,
-            job_tracker['action'],
-            'RUNNING',
-            dataset,
-            oper,
-            job_tracker['task_id'],
-            job_id,
-        )
+        await job_tracker['status_emitter'].update(old_file, 'RUNNING', job_id)
 
         # minio move update the arribute
         # find the parent node for path
@@ -1058,32 +1200,41 @@ class APIImportData:
         parent_path = parent_node.get('parent_path')
         parent_path = parent_path + '/' + parent_node.get('name') if parent_path else ConfigClass.DATASET_FILE_FOLDER
 
+        tree_index = ContainerTreeIndex(dataset.code)
+        locked_node = []
         try:
             # then we mark both source node tree and target nodes as write
-            locked_node, err = await recursive_lock_move_rename([old_file], parent_path, new_name=new_name)
+            locked_node, err = await recursive_lock_move_rename(
+                [old_file], parent_path, new_name=new_name, tree_index=tree_index
+            )
             if err:
                 raise err
-            # same here the job tracker is not pass into the function
-            # we only let the delete to state the finish
-            _, _, new_nodes = await self.recursive_copy(
-                [old_file], dataset, oper, parent_path, parent_node, access_token, refresh_token, new_name=new_name
-            )
+            if ConfigClass.FILE_MOVE_IN_PLACE:
+                new_nodes = await move_nodes(
+                    dataset, [old_file], parent_node, tree_index, access_token, refresh_token, new_name=new_name
+                )
+            else:
+                # same here the job tracker is not pass into the function
+                # we only let the delete to state the finish
+                _, _, new_nodes = await self.recursive_copy(
+                    [old_file],
+                    dataset,
+                    oper,
+                    parent_path,
+                    parent_node,
+                    access_token,
+                    refresh_token,
+                    new_name=new_name,
+                    tree_index=tree_index,
+                )
 
-            # delete the old one
-            await self.recursive_delete([old_file], dataset, oper, parent_node, access_token, refresh_token)
+                # delete the old one
+                await self.recursive_delete(
+                    [old_file], dataset, oper, parent_node, access_token, refresh_token, tree_index=tree_index
+                )
 
             # after deletion set the status using new node
-            await self.update_job_status(
-                job_tracker['session_id'],
-                old_file,
-                job_tracker['action'],
-                'FINISH',
-                dataset,
-                oper,
-                job_tracker['task_id'],
-                job_id,
-                new_nodes[0],
-            )
+            await job_tracker['status_emitter'].update(old_file, 'FINISH', job_id, payload=new_nodes[0])
 
             # update es & log
             await self.file_act_notifier.send_on_rename_event(dataset, [old_file], oper, new_name)
@@ -1093,20 +1244,89 @@ class APIImportData:
             logger.error(error_msg)
             # send the cancelled
             error_message = {'err_message': error_msg}
-            await self.update_job_status(
-                job_tracker['session_id'],
-                old_file,
-                job_tracker['action'],
-                'CANCELLED',
-                dataset,
-                oper,
-                job_tracker['task_id'],
-                job_id,
-                payload=error_message,
-            )
+            await job_tracker['status_emitter'].update(old_file, 'CANCELLED', job_id, payload=error_message)
+            # fail the job instead of marking it as succeeded
+            raise
         finally:
+            await job_tracker['status_emitter'].close()
             # unlock the nodes if we got blocked
-            for resource_key, operation in locked_node:
-                await unlock_resource(resource_key, operation)
+            await unlock_resources(locked_node)
 
         return
+
+
+# handlers of the file operation jobs, they get the payload scheduled by the endpoints above. The access token of
+# the request is only there when the job runs as a request background task, queued jobs are not given any user token
+# and use the service credentials, see schedule_job and get_minio_client. The refresh token is never passed on.
+
+
+async def _get_job_dataset(payload) -> Dataset:
+    async with db_session_scope() as db:
+        dataset = await SrvDatasetMgr().get_bygeid(db, payload['dataset_id'])
+    if dataset is None:
+        raise ValueError(f'Dataset {payload["dataset_id"]} does not exist anymore')
+    return dataset
+
+
+async def _get_job_checkpoint(payload) -> Optional[JobCheckpoint]:
+    """Return the progress of the job, None when it runs as a request background task."""
+    if 'job_id' not in payload:
+        return None
+    return await JobCheckpoint.load(UUID(payload['job_id']))
+
+
+@job_queue.register('dataset_file_import', resumable=True)
+async def run_import_job(payload) -> None:
+    dataset = await _get_job_dataset(payload)
+    await APIImportData().copy_files_worker(
+        payload['import_list'],
+        dataset,
+        payload['oper'],
+        payload['project_id'],
+        payload['session_id'],
+        payload.get('access_token'),
+        None,
+        checkpoint=await _get_job_checkpoint(payload),
+    )
+
+
+@job_queue.register('dataset_file_delete', resumable=True)
+async def run_delete_job(payload) -> None:
+    dataset = await _get_job_dataset(payload)
+    await APIImportData().delete_files_work(
+        payload['delete_list'],
+        dataset,
+        payload['oper'],
+        payload['session_id'],
+        payload.get('access_token'),
+        None,
+        checkpoint=await _get_job_checkpoint(payload),
+    )
+
+
+@job_queue.register('dataset_file_move')
+async def run_move_job(payload) -> None:
+    dataset = await _get_job_dataset(payload)
+    await APIImportData().move_file_worker(
+        payload['move_list'],
+        dataset,
+        payload['oper'],
+        payload['target_folder'],
+        payload['session_id'],
+        payload.get('access_token'),
+        None,
+    )
+
+
+@job_queue.register('dataset_file_rename')
+async def run_rename_job(payload) -> None:
+    dataset = await _get_job_dataset(payload)
+    await APIImportData().rename_file_worker(
+        payload['old_file'],
+        payload['new_name'],
+        dataset,
+        payload['oper'],
+        payload['session_id'],
+        payload.get('access_token'),
+        None,
+    )
@@ -14,6 +14,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from typing import List
+from typing import Optional
 
 from pydantic import BaseModel
 from pydantic import Field
@@ -85,11 +86,19 @@ class DatasetListForm(BaseModel):
     order_type = 'desc'
     page: int = 0
     page_size: int = 10
+    # keyset mode: pages are read after the `next_cursor` of the previous one, `page` is ignored
+    keyset: bool = False
+    cursor: Optional[str] = None
+    count: bool = False
 
 
 class DatasetListResponse(APIResponse):
     """List response."""
 
+    # keyset mode: the total and number of pages are only set when `count` was requested
+    total: Optional[int] = 1
+    num_of_pages: Optional[int] = 1
+    next_cursor: Optional[str] = None
     result: dict = Field(
         {},
         example=[
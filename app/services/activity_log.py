@@ -13,6 +13,7 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import io
+from functools import lru_cache
 from typing import Any
 from typing import Dict
 from typing import List
@@ -32,22 +33,40 @@ from app.schemas.activity_log import DatasetActivityLogSchema
 from app.schemas.activity_log import FileFolderActivityLogSchema
 
 
+@lru_cache(maxsize=None)
+def load_avro_schema(avro_schema_path: str) -> Dict[str, Any]:
+    """Parse the avro schema file once per process."""
+    return schema.load_schema(avro_schema_path)
+
+
 class ActivityLogService:
 
     logger = LoggerFactory('ActivityLogService').get_logger()
     queue_url = ConfigClass.QUEUE_SERVICE + 'broker/pub'
 
     async def _message_send(self, data: Dict[str, Any] = None) -> dict:
-        self.logger.info('Sending socket notification: ' + str(data))
-        loaded_schema = schema.load_schema(self.avro_schema_path)
+        await self._message_send_many([data])
+
+    async def _message_send_many(self, data_list: List[Dict[str, Any]]) -> None:
+        """Serialize the messages with one buffer and hand them to the producer as one batch."""
+        self.logger.info(f'Sending {len(data_list)} activity logs to {self.topic}')
+        loaded_schema = load_avro_schema(self.avro_schema_path)
         bio = io.BytesIO()
-        try:
-            schemaless_writer(bio, loaded_schema, data)
-            msg = bio.getvalue()
-        except ValueError as e:
-            self.logger.exception('error during the AVRO validation', extra={'error_msg': str(e)})
+        msgs = []
+        for data in data_list:
+            bio.seek(0)
+            bio.truncate()
+            try:
+                schemaless_writer(bio, loaded_schema, data)
+            except ValueError as e:
+                self.logger.exception('error during the AVRO validation', extra={'error_msg': str(e)})
+                continue
+            msgs.append(bio.getvalue())
+
+        if not msgs:
+            return
         client = await get_kafka_client()
-        await client.send(self.topic, msg)
+        await client.send_many(self.topic, msgs)
 
 
 class FileFolderActivityLogService(ActivityLogService):
@@ -59,6 +78,7 @@ class FileFolderActivityLogService(ActivityLogService):
     async def send_on_import_event(
         self, dataset: Dataset, project: Dict[str, Any], imported_list: List[str], user: str
     ):
+        log_schemas = []
         for item in imported_list:
             log_schema = FileFolderActivityLogSchema(
                 container_code=dataset.code,
@@ -69,9 +89,11 @@ class FileFolderActivityLogService(ActivityLogService):
                 item_name=item['name'],
                 imported_from=project['code'],
             )
-            await self._message_send(log_schema.dict())
+            log_schemas.append(log_schema.dict())
+        await self._message_send_many(log_schemas)
 
     async def send_on_delete_event(self, dataset: Dataset, source_list: List[str], user: str):
+        log_schemas = []
         for item in source_list:
             log_schema = FileFolderActivityLogSchema(
                 container_code=dataset.code,
@@ -83,11 +105,12 @@ class FileFolderActivityLogService(ActivityLogService):
                 item_name=item['name'],
                 changes=[{'source_list': item['name']}],
             )
-            await self._message_send(log_schema.dict())
+            log_schemas.append(log_schema.dict())
+        await self._message_send_many(log_schemas)
 
     async def send_on_move_event(self, dataset: Dataset, item: Dict[str, Any], user: str, old_path: str, new_path: str):
-        # even thought the event is UPDATE there is no update in metadata service.
-        # as of today, when one item is moved, the item is deleted and a new one is created in the new path.
+        # with FILE_MOVE_IN_PLACE the item is updated and keeps its id, otherwise it is deleted and a new one is
+        # created in the new path. `old_path` and `new_path` are the paths of the item itself, without `data`.
         log_schema = FileFolderActivityLogSchema(
             container_code=dataset.code,
             user=user,
@@ -101,8 +124,9 @@ class FileFolderActivityLogService(ActivityLogService):
         await self._message_send(log_schema.dict())
 
     async def send_on_rename_event(self, dataset: Dataset, source_list: List[str], user: str, new_name: str):
-        # even thought the event is UPDATE there is no update in metadata service.
-        # as of today, when one item is moved, the item is deleted and a new one is created in the new name.
+        # with FILE_MOVE_IN_PLACE the item is updated and keeps its id, otherwise it is deleted and a new one is
+        # created with the new name.
+        log_schemas = []
         for item in source_list:
             log_schema = FileFolderActivityLogSchema(
                 container_code=dataset.code,
@@ -114,7 +138,8 @@ class FileFolderActivityLogService(ActivityLogService):
                 item_name=item['name'],
                 changes=[{'item_property': 'name', 'old_value': item['name'], 'new_value': new_name}],
             )
-            await self._message_send(log_schema.dict())
+            log_schemas.append(log_schema.dict())
+        await self._message_send_many(log_schemas)
 
 
 class DatasetActivityLogService(ActivityLogService):
@@ -13,14 +13,17 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import base64
 import json
 import os
 import time
+from datetime import datetime
+from typing import List
 from typing import Optional
+from typing import Tuple
 from uuid import UUID
 from uuid import uuid4
 
-import httpx
 from common import LoggerFactory
 from fastapi import Query
 from fastapi_pagination import Params as BaseParams
@@ -28,21 +31,29 @@ from fastapi_pagination.ext.async_sqlalchemy import paginate
 from minio.sseconfig import Rule
 from minio.sseconfig import SSEConfig
 from sqlalchemy import desc
+from sqlalchemy import func
+from sqlalchemy import tuple_
 from sqlalchemy import update
 from sqlalchemy.future import select
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.orm.exc import NoResultFound
 from starlette.concurrency import run_in_threadpool
 
+from app.clients import HTTPClientPool
+from app.clients import MetadataClient
+from app.clients import http_clients
 from app.commons.service_connection.dataset_policy_template import (
     create_dataset_policy_template,
 )
 from app.commons.service_connection.minio_client import Minio_Client
 from app.config import ConfigClass
+from app.core.db import db_session_scope
 from app.models.dataset import Dataset
 from app.models.schema import DatasetSchema
 from app.models.schema import DatasetSchemaTemplate
 from app.services.activity_log import DatasetActivityLogService
+from app.services.dataset_cache import dataset_cache
 
 ESSENTIALS_TPL_NAME = ConfigClass.ESSENTIALS_TPL_NAME
 ESSENTIALS_NAME = ConfigClass.ESSENTIALS_NAME
@@ -90,6 +101,8 @@ class SrvDatasetMgr:
         self.logger.debug('SrvDatasetMgr post_json_form' + str(post_json_form))
         dataset_schema = Dataset(**post_json_form)
         dataset = await db_add_operation(dataset_schema, db)
+        # drops a lookup of the code that found nothing and raced the insert
+        await dataset_cache.invalidate(dataset)
         global_entity_id = str(dataset.id)
         await self.__create_atlas_node(global_entity_id, username)
         await self.__create_essentials(
@@ -150,18 +163,89 @@ class SrvDatasetMgr:
             await db.rollback()
             error_msg = f'Psql Error: {str(e)}'
             raise Exception(error_msg)
+        await dataset_cache.invalidate(current_node)
         return current_node.to_dict()
 
+    async def _update_stats(self, db, current_node, total_files, size, update_json):
+        try:
+            result = await db.execute(
+                update(Dataset)
+                .where(Dataset.id == current_node.id)
+                .values(total_files=total_files, size=size, **update_json)
+                .returning(Dataset.total_files, Dataset.size)
+                .execution_options(synchronize_session=False)
+            )
+            total_files, size = result.one()
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            error_msg = f'Psql Error: {str(e)}'
+            raise Exception(error_msg)
+        await dataset_cache.invalidate(current_node)
+        # refresh the loaded row without marking it as changed, a flush would write the values back
+        set_committed_value(current_node, 'total_files', total_files)
+        set_committed_value(current_node, 'size', size)
+        return current_node.to_dict()
+
+    async def increment_stats(self, db, current_node, num_of_files: int, size: int, **update_json) -> dict:
+        """Add to the number and size of the files of the dataset in the same statement that reads them.
+
+        Concurrent operations on the dataset all count, unlike writing back totals computed from a loaded row. The
+        other attributes of `update_json` are set by the same statement.
+        """
+        return await self._update_stats(
+            db,
+            current_node,
+            func.coalesce(Dataset.total_files, 0) + num_of_files,
+            func.coalesce(Dataset.size, 0) + size,
+            update_json,
+        )
+
+    async def decrement_stats(self, db, current_node, num_of_files: int, size: int, **update_json) -> dict:
+        return await self.increment_stats(db, current_node, -num_of_files, -size, **update_json)
+
+    async def reconcile_stats(self, current_node) -> dict:
+        """Recompute the number and size of the files of the dataset in one streamed pass over the metadata listing.
+
+        The archived files are not counted, like in the import and delete. The session is only opened for the final
+        update, not during the listing. The totals overwrite the counters, so it must run as a job of the dataset
+        in the job queue, which never runs it along with an import or delete of the same dataset.
+        """
+        total_files = 0
+        size = 0
+        async for item in MetadataClient.iter_objects(current_node.code, fields=('type', 'size', 'archived')):
+            if item.get('type') == 'file' and not item.get('archived'):
+                total_files += 1
+                size += item.get('size') or 0
+        self.logger.info(
+            f'Dataset {current_node.code} reconciled from {current_node.total_files} files of {current_node.size} '
+            f'bytes to {total_files} files of {size} bytes'
+        )
+        async with db_session_scope() as db:
+            return await self._update_stats(db, current_node, total_files, size, {})
+
     async def get_bygeid(self, db: Session, geid: str) -> Dataset:
-        return await db.get(Dataset, UUID(geid))
+        """Return the dataset, read through the dataset cache.
+
+        A cached dataset is detached from `db`, it must be changed with `update` or the stats methods.
+        """
+        id_ = UUID(geid)
+
+        async def fetch() -> Optional[Dataset]:
+            return await db.get(Dataset, id_)
+
+        return await dataset_cache.get(dataset_cache.get_id_key(id_), fetch)
 
     async def get_bycode(self, db: Session, code: str) -> Optional[Dataset]:
-        try:
-            query = select(Dataset).where(Dataset.code == code)
-            result = (await db.execute(query)).scalars().one()
-            return result
-        except NoResultFound:
-            return
+        async def fetch() -> Optional[Dataset]:
+            try:
+                query = select(Dataset).where(Dataset.code == code)
+                result = (await db.execute(query)).scalars().one()
+                return result
+            except NoResultFound:
+                return
+
+        return await dataset_cache.get(dataset_cache.get_code_key(code), fetch)
 
     async def get_dataset_by_creator(self, db, creator, page, page_size):
         return await paginate(
@@ -170,6 +254,45 @@ class SrvDatasetMgr:
             Params(page=page, size=page_size),
         )
 
+    @staticmethod
+    def encode_cursor(dataset: Dataset) -> str:
+        value = json.dumps([dataset.created_at.isoformat(), str(dataset.id)])
+        return base64.urlsafe_b64encode(value.encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+        try:
+            created_at, id_ = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            return datetime.fromisoformat(created_at), UUID(id_)
+        except Exception:
+            raise ValueError(f'Invalid cursor: {cursor}')
+
+    async def get_dataset_by_creator_keyset(
+        self, db, creator: str, page_size: int, cursor: Optional[str] = None, count: bool = False
+    ) -> Tuple[List[Dataset], Optional[str], Optional[int]]:
+        """Return a page of the datasets of the creator, newest first, after the position of `cursor`.
+
+        The page is read from the creator index after the last row of the previous page instead of skipping the
+        rows before it, so any page costs the same as the first one. The next cursor is None on the last page. The
+        total is only counted when `count` is set, otherwise it is None.
+        """
+        query = select(Dataset).where(Dataset.creator == creator)
+        if cursor:
+            created_at, id_ = self.decode_cursor(cursor)
+            query = query.where(tuple_(Dataset.created_at, Dataset.id) < tuple_(created_at, id_))
+        query = query.order_by(desc(Dataset.created_at), desc(Dataset.id)).limit(page_size + 1)
+        items = (await db.execute(query)).scalars().all()
+
+        next_cursor = None
+        if len(items) > page_size:
+            items = items[:page_size]
+            next_cursor = self.encode_cursor(items[-1])
+
+        total = None
+        if count:
+            total = (await db.execute(select(func.count()).where(Dataset.creator == creator))).scalar()
+        return items, next_cursor, total
+
     async def __create_atlas_node(self, geid, username):
         res = await create_atlas_dataset(geid, username)
         if res.status_code != 200:
@@ -277,6 +400,5 @@ async def create_atlas_dataset(geid, operator):
         },
     }
     url = ConfigClass.CATALOGUING_SERVICE_V1 + 'entity'
-    async with httpx.AsyncClient() as client:
-        res = await client.post(url, json=atlas_post_form_json)
+    res = await http_clients.get(HTTPClientPool.CATALOGUING).post(url, json=atlas_post_form_json)
     return res
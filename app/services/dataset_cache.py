@@ -0,0 +1,183 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import Optional
+from uuid import UUID
+
+from common import LoggerFactory
+from sqlalchemy.orm import make_transient_to_detached
+
+from app.config import ConfigClass
+from app.core.redis import redis_client
+from app.models.dataset import Dataset
+
+
+class DatasetCache:
+    """Read-through cache of the dataset rows, looked up by id or by code.
+
+    Rows are kept for `ttl` seconds in redis when `redis_enabled` is set, where the invalidations of every worker
+    are seen, and in process when `local_enabled` is set, at most `max_entries` keys in LRU order. An invalidation
+    only reaches the entries of the process that made it, so the local tier is off by default. The cache is bypassed
+    when neither tier is enabled. A row is cached under both its id and code keys. The entries are stored serialized
+    so every reader gets its own detached instance. The writes of SrvDatasetMgr invalidate the row.
+    """
+
+    logger = LoggerFactory('DatasetCache').get_logger()
+
+    UUID_FIELDS = ('id', 'project_id')
+    DATETIME_FIELDS = ('created_at', 'updated_at')
+
+    def __init__(
+        self, ttl: float = None, max_entries: int = None, redis_enabled: bool = None, local_enabled: bool = None
+    ) -> None:
+        self.ttl = ConfigClass.DATASET_CACHE_TTL if ttl is None else ttl
+        self.max_entries = ConfigClass.DATASET_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.redis_enabled = ConfigClass.DATASET_CACHE_REDIS_ENABLED if redis_enabled is None else redis_enabled
+        self.local_enabled = ConfigClass.DATASET_CACHE_LOCAL_ENABLED if local_enabled is None else local_enabled
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        # bumped by every invalidation so a fetch started before it is not cached
+        self._generations: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def get_id_key(id_: Any) -> str:
+        return f'id:{id_}'
+
+    @staticmethod
+    def get_code_key(code: str) -> str:
+        return f'code:{code}'
+
+    @classmethod
+    def serialize(cls, dataset: Dataset) -> bytes:
+        values = {}
+        for column in Dataset.__table__.columns:
+            value = getattr(dataset, column.key)
+            if value is not None and column.key in cls.UUID_FIELDS:
+                value = str(value)
+            elif value is not None and column.key in cls.DATETIME_FIELDS:
+                value = value.isoformat()
+            values[column.key] = value
+        return json.dumps(values).encode('utf-8')
+
+    @classmethod
+    def deserialize(cls, data: bytes) -> Dataset:
+        """Return the row as a detached instance, like one loaded by a session that was closed since."""
+        values = json.loads(data)
+        for field in cls.UUID_FIELDS:
+            if values.get(field) is not None:
+                values[field] = UUID(values[field])
+        for field in cls.DATETIME_FIELDS:
+            if values.get(field) is not None:
+                values[field] = datetime.fromisoformat(values[field])
+        dataset = Dataset(**values)
+        make_transient_to_detached(dataset)
+        return dataset
+
+    def _get_local(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, data = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return data
+
+    def _set_local(self, key: str, data: bytes) -> None:
+        if not self.local_enabled:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, data)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _get_redis(self, key: str) -> Optional[bytes]:
+        if not self.redis_enabled:
+            return None
+        try:
+            redis = await redis_client()
+            return await redis.get(f'dataset:{key}')
+        except Exception as e:
+            self.logger.error(f'Error reading dataset from redis: {e}')
+            return None
+
+    async def _set_redis(self, keys: list, data: bytes) -> None:
+        if not self.redis_enabled:
+            return
+        try:
+            redis = await redis_client()
+            for key in keys:
+                await redis.set(f'dataset:{key}', data, ex=max(1, int(self.ttl)))
+        except Exception as e:
+            self.logger.error(f'Error writing dataset to redis: {e}')
+
+    async def get(self, key: str, fetch: Callable[[], Awaitable[Optional[Dataset]]]) -> Optional[Dataset]:
+        """Return the cached dataset, calling `fetch` on a miss. A dataset that is not found is not cached."""
+        if self.ttl <= 0 or not (self.local_enabled or self.redis_enabled):
+            return await fetch()
+
+        data = self._get_local(key)
+        if data is None:
+            data = await self._get_redis(key)
+            if data is not None:
+                self._set_local(key, data)
+        if data is not None:
+            self.hits += 1
+            return self.deserialize(data)
+
+        self.misses += 1
+        generation = self._generations.get(key, 0)
+        dataset = await fetch()
+        if dataset is not None and generation == self._generations.get(key, 0):
+            data = self.serialize(dataset)
+            keys = [self.get_id_key(dataset.id), self.get_code_key(dataset.code)]
+            for dataset_key in keys:
+                self._set_local(dataset_key, data)
+            await self._set_redis(keys, data)
+        return dataset
+
+    async def invalidate(self, dataset: Dataset) -> None:
+        keys = [self.get_id_key(dataset.id), self.get_code_key(dataset.code)]
+        for key in keys:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            self._entries.pop(key, None)
+        if self.redis_enabled:
+            try:
+                redis = await redis_client()
+                await redis.delete(*[f'dataset:{key}' for key in keys])
+            except Exception as e:
+                self.logger.error(f'Error invalidating dataset in redis: {e}')
+
+    def get_stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._generations.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+dataset_cache = DatasetCache()
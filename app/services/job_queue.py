@@ -0,0 +1,402 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import os
+import socket
+from datetime import timedelta
+from enum import Enum
+from typing import Any
+from typing import AsyncContextManager
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+from uuid import UUID
+
+from common import LoggerFactory
+from fastapi import BackgroundTasks
+from sqlalchemy import delete
+from sqlalchemy import func
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.config import ConfigClass
+from app.core.db import db_session_scope
+from app.models.job import FileOperationCheckpoint
+from app.models.job import FileOperationJob
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+# key of the postgres advisory lock serialising the claims of every runner
+CLAIM_LOCK_KEY = 0x64617461736574
+# fields of the job payloads holding the user tokens of the request, they are never stored in the queue
+REQUEST_TOKEN_FIELDS = ('access_token', 'refresh_token')
+
+
+class EJobStatus(str, Enum):
+    PENDING = 'PENDING'
+    RUNNING = 'RUNNING'
+    SUCCEEDED = 'SUCCEEDED'
+    FAILED = 'FAILED'
+
+
+class JobQueue:
+    """Durable queue of file operations kept in the file_operation_jobs table.
+
+    The jobs of one dataset run one at a time, in the order they were enqueued, and at most
+    JOB_QUEUE_MAX_RUNNING jobs run at the same time over all the runners. Claims are serialised with a transaction
+    level advisory lock so concurrent runners always see the jobs claimed before them. A job whose runner stopped
+    sending heartbeats is put back in the queue, up to JOB_QUEUE_MAX_ATTEMPTS attempts, when its action is resumable.
+    The jobs of the other actions are failed instead, running them again over their partial result is not safe.
+    """
+
+    logger = LoggerFactory('JobQueue').get_logger()
+
+    def __init__(self) -> None:
+        self._handlers: Dict[str, JobHandler] = {}
+        self._resumable: Set[str] = set()
+
+    def register(self, action: str, resumable: bool = False) -> Callable[[JobHandler], JobHandler]:
+        """Register the coroutine running the jobs of the action, it gets the job payload.
+
+        The handlers open their own short sessions around their statements, see db_session_scope. The jobs of a
+        `resumable` action can be run again after a partial run, they checkpoint their progress or are idempotent.
+        """
+
+        def decorator(handler: JobHandler) -> JobHandler:
+            self._handlers[action] = handler
+            if resumable:
+                self._resumable.add(action)
+            return handler
+
+        return decorator
+
+    def get_handler(self, action: str) -> JobHandler:
+        return self._handlers[action]
+
+    def is_resumable(self, action: str) -> bool:
+        return action in self._resumable
+
+    async def enqueue(
+        self, db: AsyncSession, action: str, dataset_code: str, payload: Dict[str, Any]
+    ) -> FileOperationJob:
+        job = FileOperationJob(
+            action=action, dataset_code=dataset_code, payload=payload, status=EJobStatus.PENDING.value, attempts=0
+        )
+        db.add(job)
+        await db.commit()
+        return job
+
+    async def claim(self, db: AsyncSession, worker_id: str) -> Optional[FileOperationJob]:
+        """Mark the oldest runnable job as running by the worker and return it, None if there is none."""
+        await db.execute(select(func.pg_advisory_xact_lock(CLAIM_LOCK_KEY)))
+
+        running = select(FileOperationJob.dataset_code).where(FileOperationJob.status == EJobStatus.RUNNING.value)
+        num_of_running = (await db.execute(select(func.count()).select_from(running.subquery()))).scalar()
+        if num_of_running >= ConfigClass.JOB_QUEUE_MAX_RUNNING:
+            await db.commit()
+            return None
+
+        query = (
+            select(FileOperationJob)
+            .where(FileOperationJob.status == EJobStatus.PENDING.value)
+            .where(FileOperationJob.dataset_code.not_in(running))
+            .order_by(FileOperationJob.created_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        job = (await db.execute(query)).scalars().first()
+        if job is not None:
+            job.status = EJobStatus.RUNNING.value
+            job.worker_id = worker_id
+            job.attempts += 1
+            job.heartbeat_at = func.now()
+        await db.commit()
+        return job
+
+    async def heartbeat(self, db: AsyncSession, job_id: UUID) -> None:
+        await db.execute(update(FileOperationJob).where(FileOperationJob.id == job_id).values(heartbeat_at=func.now()))
+        await db.commit()
+
+    async def complete(self, db: AsyncSession, job_id: UUID, error: Optional[str] = None) -> None:
+        status = EJobStatus.FAILED if error else EJobStatus.SUCCEEDED
+        await db.execute(
+            update(FileOperationJob).where(FileOperationJob.id == job_id).values(status=status.value, error=error)
+        )
+        await db.commit()
+
+    async def get(self, db: AsyncSession, job_id: UUID) -> Optional[FileOperationJob]:
+        return await db.get(FileOperationJob, job_id)
+
+    async def resume(self, db: AsyncSession, job: FileOperationJob) -> bool:
+        """Put the failed job back in the queue, it skips the items checkpointed by its previous runs.
+
+        Return False if the job is not failed anymore.
+        """
+        resumed = await db.execute(
+            update(FileOperationJob)
+            .where(FileOperationJob.id == job.id)
+            .where(FileOperationJob.status == EJobStatus.FAILED.value)
+            .values(status=EJobStatus.PENDING.value, attempts=0, worker_id=None, error=None)
+            .execution_options(synchronize_session='fetch')
+        )
+        await db.commit()
+        return resumed.rowcount == 1
+
+    async def requeue_stale(self, db: AsyncSession) -> List[UUID]:
+        """Put back the resumable running jobs whose runner is gone, fail the others and the ones that used all
+        their attempts.
+        """
+        stale_before = func.now() - timedelta(seconds=ConfigClass.JOB_QUEUE_STALE_AFTER)
+        stale = (
+            update(FileOperationJob)
+            .where(FileOperationJob.status == EJobStatus.RUNNING.value)
+            .where(FileOperationJob.heartbeat_at < stale_before)
+        )
+        resumable = FileOperationJob.action.in_(sorted(self._resumable))
+        requeued = await db.execute(
+            stale.where(resumable)
+            .where(FileOperationJob.attempts < ConfigClass.JOB_QUEUE_MAX_ATTEMPTS)
+            .values(status=EJobStatus.PENDING.value, worker_id=None)
+            .returning(FileOperationJob.id)
+            .execution_options(synchronize_session=False)
+        )
+        requeued_ids = requeued.scalars().all()
+        await db.execute(
+            stale.values(status=EJobStatus.FAILED.value, error='the job runner stopped').execution_options(
+                synchronize_session=False
+            )
+        )
+        await db.commit()
+        if requeued_ids:
+            self.logger.warning(f'Requeued the stale jobs {requeued_ids}')
+        return requeued_ids
+
+    async def purge_finished(self, db: AsyncSession) -> int:
+        """Delete the jobs finished more than JOB_QUEUE_RETENTION seconds ago, their checkpoints go with them.
+
+        Return the number of deleted jobs.
+        """
+        if not ConfigClass.JOB_QUEUE_RETENTION:
+            return 0
+        finished_before = func.now() - timedelta(seconds=ConfigClass.JOB_QUEUE_RETENTION)
+        purged = await db.execute(
+            delete(FileOperationJob)
+            .where(FileOperationJob.status.in_([EJobStatus.SUCCEEDED.value, EJobStatus.FAILED.value]))
+            .where(FileOperationJob.updated_at < finished_before)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        if purged.rowcount:
+            self.logger.info(f'Deleted {purged.rowcount} finished jobs')
+        return purged.rowcount
+
+
+class JobCheckpoint:
+    """Items processed by a job, recorded as the walk proceeds so the job run again continues from there.
+
+    A folder whose children are still being processed is recorded as unfinished with the item created for it, so the
+    next run reuses it instead of creating it again.
+    """
+
+    # item recording that the job added its totals to the dataset
+    TOTALS_ITEM_ID = 'dataset_totals'
+
+    def __init__(self, job_id: UUID, items: Optional[Dict[str, FileOperationCheckpoint]] = None) -> None:
+        self.job_id = job_id
+        self._items = items or {}
+        # the walkers save concurrently, one write at a time keeps the job to a single connection
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    async def load(cls, job_id: UUID) -> 'JobCheckpoint':
+        query = select(FileOperationCheckpoint).where(FileOperationCheckpoint.job_id == job_id)
+        async with db_session_scope() as db:
+            items = {checkpoint.item_id: checkpoint for checkpoint in (await db.execute(query)).scalars()}
+        return cls(job_id, items)
+
+    def get(self, item_id: str) -> Optional[FileOperationCheckpoint]:
+        return self._items.get(item_id)
+
+    def get_totals(self) -> Tuple[int, int]:
+        """Return the number and size of the files processed over all the runs of the job."""
+        num_of_files = sum(checkpoint.num_of_files for checkpoint in self._items.values())
+        size = sum(checkpoint.size for checkpoint in self._items.values())
+        return num_of_files, size
+
+    def _create(
+        self, item_id: str, new_item: Optional[dict], num_of_files: int, size: int, finished: bool
+    ) -> FileOperationCheckpoint:
+        checkpoint = FileOperationCheckpoint(
+            job_id=self.job_id,
+            item_id=item_id,
+            new_item=new_item,
+            num_of_files=num_of_files,
+            size=size,
+            finished=finished,
+        )
+        self._items[item_id] = checkpoint
+        return checkpoint
+
+    async def save(
+        self,
+        item_id: str,
+        new_item: Optional[dict] = None,
+        num_of_files: int = 0,
+        size: int = 0,
+        finished: bool = True,
+    ) -> None:
+        """Record the item right away, it is not processed again even if the job dies just after."""
+        checkpoint = self._create(item_id, new_item, num_of_files, size, finished)
+        values = {
+            'new_item': checkpoint.new_item,
+            'num_of_files': checkpoint.num_of_files,
+            'size': checkpoint.size,
+            'finished': checkpoint.finished,
+        }
+        statement = (
+            insert(FileOperationCheckpoint)
+            .values(job_id=self.job_id, item_id=item_id, **values)
+            .on_conflict_do_update(index_elements=['job_id', 'item_id'], set_=values)
+        )
+        async with self._lock, db_session_scope() as db:
+            await db.execute(statement)
+            await db.commit()
+
+    def stage(self, db: AsyncSession, item_id: str, num_of_files: int = 0, size: int = 0) -> None:
+        """Add the finished item to the session, it is recorded by the next commit of the caller."""
+        db.add(self._create(item_id, None, num_of_files, size, True))
+
+
+job_queue = JobQueue()
+
+
+async def schedule_job(
+    background_tasks: BackgroundTasks, db: AsyncSession, action: str, dataset_code: str, payload: Dict[str, Any]
+) -> None:
+    """Queue the job when JOB_QUEUE_ENABLED is set, otherwise run its handler as a background task of the request.
+
+    The access token of the request is not stored with a queued job, it would expire before the job runs and the
+    payload is kept in plain text, the job handlers use the service credentials instead.
+    """
+    if ConfigClass.JOB_QUEUE_ENABLED:
+        payload = {key: value for key, value in payload.items() if key not in REQUEST_TOKEN_FIELDS}
+        await job_queue.enqueue(db, action, dataset_code, payload)
+    else:
+        background_tasks.add_task(job_queue.get_handler(action), payload)
+
+
+class JobRunner:
+    """Pool of `concurrency` workers running the jobs of the queue.
+
+    It runs in the dedicated worker process, see app.worker, or inside the API workers when JOB_RUNNER_EMBEDDED is
+    set. Every running job sends a heartbeat each JOB_QUEUE_HEARTBEAT_INTERVAL seconds, and the runner also puts back
+    the stale jobs of the runners that crashed.
+    """
+
+    logger = LoggerFactory('JobRunner').get_logger()
+
+    def __init__(
+        self,
+        queue: JobQueue = job_queue,
+        concurrency: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+        worker_id: Optional[str] = None,
+    ) -> None:
+        self.queue = queue
+        self.concurrency = concurrency or ConfigClass.JOB_RUNNER_CONCURRENCY
+        self.poll_interval = poll_interval or ConfigClass.JOB_RUNNER_POLL_INTERVAL
+        self.worker_id = worker_id or f'{socket.gethostname()}-{os.getpid()}'
+        self._tasks: List[asyncio.Task] = []
+
+    def _session(self) -> AsyncContextManager[AsyncSession]:
+        return db_session_scope()
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._tasks = [asyncio.ensure_future(self._work()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.ensure_future(self._requeue_stale_periodically()))
+        self._tasks.append(asyncio.ensure_future(self._purge_finished_periodically()))
+
+    async def stop(self) -> None:
+        """Stop the workers, the jobs they were running are picked up again once they are stale."""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _work(self) -> None:
+        while True:
+            try:
+                async with self._session() as db:
+                    job = await self.queue.claim(db, self.worker_id)
+            except Exception as e:
+                self.logger.error(f'Error when claiming a job: {e}')
+                job = None
+
+            if job is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            await self.run(job)
+
+    async def run(self, job: FileOperationJob) -> None:
+        heartbeat = asyncio.ensure_future(self._send_heartbeats(job.id))
+        error = None
+        try:
+            # the handlers use the job id to checkpoint their progress
+            await self.queue.get_handler(job.action)({**job.payload, 'job_id': str(job.id)})
+        except Exception as e:
+            self.logger.error(f'Job {job.id} {job.action} failed: {e}')
+            error = str(e) or type(e).__name__
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+
+        async with self._session() as db:
+            await self.queue.complete(db, job.id, error)
+
+    async def _send_heartbeats(self, job_id: UUID) -> None:
+        while True:
+            await asyncio.sleep(ConfigClass.JOB_QUEUE_HEARTBEAT_INTERVAL)
+            try:
+                async with self._session() as db:
+                    await self.queue.heartbeat(db, job_id)
+            except Exception as e:
+                self.logger.error(f'Error when sending the heartbeat of job {job_id}: {e}')
+
+    async def _requeue_stale_periodically(self) -> None:
+        while True:
+            try:
+                async with self._session() as db:
+                    await self.queue.requeue_stale(db)
+            except Exception as e:
+                self.logger.error(f'Error when requeuing the stale jobs: {e}')
+            await asyncio.sleep(ConfigClass.JOB_QUEUE_HEARTBEAT_INTERVAL)
+
+    async def _purge_finished_periodically(self) -> None:
+        while True:
+            try:
+                async with self._session() as db:
+                    await self.queue.purge_finished(db)
+            except Exception as e:
+                self.logger.error(f'Error when deleting the finished jobs: {e}')
+            await asyncio.sleep(ConfigClass.JOB_QUEUE_PURGE_INTERVAL)
@@ -26,15 +26,20 @@ from opentelemetry.sdk.resources import Resource
 from opentelemetry.sdk.trace import TracerProvider
 from opentelemetry.sdk.trace.export import BatchSpanProcessor
 
+from app.clients import http_clients
 from app.config import SRV_NAMESPACE
 from app.config import ConfigClass
 from app.consumer.consumers import dataset_consumer
 from app.core.db import db_engine
+from app.core.redis import redis_client
+from app.services.job_queue import JobRunner
 
 from .exception_handlers import exception_handlers
 from .middlewares import middlewares
 
 logger = LoggerFactory(__name__).get_logger()
+# runs the queued jobs inside the API worker when JOB_RUNNER_EMBEDDED is set
+job_runner = JobRunner()
 
 
 def _setup_middlewares(app: FastAPI) -> None:
@@ -70,8 +75,18 @@ async def on_startup_event(app: FastAPI) -> None:
 
     if ConfigClass.opentelemetry_enabled:
         await _initialize_instrument_app(app)
+    await http_clients.start()
+
     if ConfigClass.env != 'test':
         dataset_consumer()
+        if ConfigClass.JOB_QUEUE_ENABLED and ConfigClass.JOB_RUNNER_EMBEDDED:
+            job_runner.start()
+
+
+async def on_shutdown_event(app: FastAPI) -> None:
+    await job_runner.stop()
+    await http_clients.close()
+    await redis_client.close()
 
 
-_all_ = 'on_startup_event'
+_all_ = ('on_startup_event', 'on_shutdown_event')
@@ -0,0 +1,48 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Dedicated process running the file operation jobs, started with `python -m app.worker`."""
+
+import asyncio
+
+from common import LoggerFactory
+
+from app.clients import http_clients
+from app.core.redis import redis_client
+
+# the routers register the handlers of the jobs
+from app.routers.v1 import api_dataset_restful  # noqa: F401
+from app.routers.v1 import dataset_file  # noqa: F401
+from app.routers.v1.api_version import api_version  # noqa: F401
+from app.services.job_queue import JobRunner
+
+logger = LoggerFactory('job_worker').get_logger()
+
+
+async def main() -> None:
+    await http_clients.start()
+    runner = JobRunner()
+    runner.start()
+    logger.info(f'Job runner {runner.worker_id} started with {runner.concurrency} workers')
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.stop()
+        await http_clients.close()
+        await redis_client.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
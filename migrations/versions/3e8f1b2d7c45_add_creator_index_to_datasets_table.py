@@ -0,0 +1,41 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""add creator index to datasets table.
+
+Revision ID: 3e8f1b2d7c45
+Revises: 9a1e5b7c3d20
+Create Date: 2026-10-18 14:12:09.318442
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '3e8f1b2d7c45'
+down_revision = '9a1e5b7c3d20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        'ix_datasets_creator_created_at_id',
+        'datasets',
+        ['creator', 'created_at', 'id'],
+        unique=False,
+        schema='dataset',
+    )
+
+
+def downgrade():
+    op.drop_index('ix_datasets_creator_created_at_id', table_name='datasets', schema='dataset')
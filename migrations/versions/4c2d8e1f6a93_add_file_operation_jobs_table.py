@@ -0,0 +1,66 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""add file operation jobs table.
+
+Revision ID: 4c2d8e1f6a93
+Revises: 85fc09674dfc
+Create Date: 2026-10-18 10:12:41.318204
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '4c2d8e1f6a93'
+down_revision = '85fc09674dfc'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'file_operation_jobs',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('action', sa.VARCHAR(length=64), nullable=False),
+        sa.Column('dataset_code', sa.VARCHAR(length=32), nullable=False),
+        sa.Column('payload', postgresql.JSONB(), nullable=False),
+        sa.Column('status', sa.VARCHAR(length=16), nullable=False),
+        sa.Column('attempts', sa.INTEGER(), nullable=False),
+        sa.Column('worker_id', sa.VARCHAR(length=256), nullable=True),
+        sa.Column('error', sa.TEXT(), nullable=True),
+        sa.Column('heartbeat_at', postgresql.TIMESTAMP(timezone=True), nullable=True),
+        sa.Column('created_at', postgresql.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column('updated_at', postgresql.TIMESTAMP(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        schema='dataset',
+    )
+    op.create_index(
+        'ix_file_operation_jobs_status_created_at',
+        'file_operation_jobs',
+        ['status', 'created_at'],
+        schema='dataset',
+    )
+    op.create_index(
+        'ix_file_operation_jobs_dataset_code_status',
+        'file_operation_jobs',
+        ['dataset_code', 'status'],
+        schema='dataset',
+    )
+
+
+def downgrade():
+    op.drop_index('ix_file_operation_jobs_dataset_code_status', table_name='file_operation_jobs', schema='dataset')
+    op.drop_index('ix_file_operation_jobs_status_created_at', table_name='file_operation_jobs', schema='dataset')
+    op.drop_table('file_operation_jobs', schema='dataset')
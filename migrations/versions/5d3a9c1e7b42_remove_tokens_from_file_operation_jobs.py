@@ -0,0 +1,36 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""remove tokens from file operation jobs.
+
+Revision ID: 5d3a9c1e7b42
+Revises: 7b5d2c9e4f18
+Create Date: 2026-10-18 19:12:08.431207
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '5d3a9c1e7b42'
+down_revision = '7b5d2c9e4f18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # the jobs queued so far carry the user tokens of their request, they now run with the service credentials
+    op.execute("UPDATE dataset.file_operation_jobs SET payload = payload - 'access_token' - 'refresh_token'")
+
+
+def downgrade():
+    pass
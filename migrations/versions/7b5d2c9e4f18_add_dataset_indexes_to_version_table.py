@@ -0,0 +1,49 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""add dataset indexes to version table.
+
+Revision ID: 7b5d2c9e4f18
+Revises: 3e8f1b2d7c45
+Create Date: 2026-10-18 15:40:52.127634
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '7b5d2c9e4f18'
+down_revision = '3e8f1b2d7c45'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        'ix_version_dataset_geid_version_created_at',
+        'version',
+        ['dataset_geid', 'version', 'created_at'],
+        unique=False,
+        schema='dataset',
+    )
+    op.create_index(
+        'ix_version_dataset_geid_created_at',
+        'version',
+        ['dataset_geid', 'created_at'],
+        unique=False,
+        schema='dataset',
+    )
+
+
+def downgrade():
+    op.drop_index('ix_version_dataset_geid_created_at', table_name='version', schema='dataset')
+    op.drop_index('ix_version_dataset_geid_version_created_at', table_name='version', schema='dataset')
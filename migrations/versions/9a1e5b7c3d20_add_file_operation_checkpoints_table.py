@@ -0,0 +1,49 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""add file operation checkpoints table.
+
+Revision ID: 9a1e5b7c3d20
+Revises: 4c2d8e1f6a93
+Create Date: 2026-10-18 11:03:27.604915
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '9a1e5b7c3d20'
+down_revision = '4c2d8e1f6a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'file_operation_checkpoints',
+        sa.Column('job_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('item_id', sa.VARCHAR(length=256), nullable=False),
+        sa.Column('new_item', postgresql.JSONB(), nullable=True),
+        sa.Column('num_of_files', sa.INTEGER(), nullable=False),
+        sa.Column('size', sa.BIGINT(), nullable=False),
+        sa.Column('finished', sa.BOOLEAN(), nullable=False),
+        sa.Column('created_at', postgresql.TIMESTAMP(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['job_id'], ['dataset.file_operation_jobs.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('job_id', 'item_id'),
+        schema='dataset',
+    )
+
+
+def downgrade():
+    op.drop_table('file_operation_checkpoints', schema='dataset')
@@ -35,6 +35,8 @@ async def test_dataset_verify_when_bids_verification_fails_should_return_500(cli
             'result': [
                 {
                     'type': 'file',
+                    'name': 'path.nii.gz',
+                    'parent_path': None,
                     'storage': {'location_uri': f'http://anything.com/bucket/{dataset_code}/path.nii.gz'},
                     'id': file_geid,
                     'operator': 'me',
@@ -57,16 +59,15 @@ async def test_dataset_verify_when_bids_verification_fails_should_return_500(cli
     }
 
 
-@mock.patch('app.routers.v1.api_dataset_restful.subprocess.run')
-async def test_dataset_verify_when_bids_valid_should_return_200(mock_subproc_run, client, httpx_mock, dataset):
+@mock.patch('app.resources.bids_validator.run_bids_validator')
+async def test_dataset_verify_when_bids_valid_should_return_200(
+    mock_run_bids_validator, client, httpx_mock, dataset, test_db
+):
     file_geid = '6c99e8bb-ecff-44c8-8fdc-a3d0ed7ac067-1648138467'
     dataset_geid = str(dataset.id)
     dataset_code = dataset.code
 
-    # this part has to be better tested
-    obj = mock.MagicMock()
-    obj.stdout = '{"bids": "verified"}'
-    mock_subproc_run.return_value = obj
+    mock_run_bids_validator.return_value = {'bids': 'verified'}
     httpx_mock.add_response(
         method='GET',
         url=(
@@ -78,6 +79,8 @@ async def test_dataset_verify_when_bids_valid_should_return_200(mock_subproc_run
                 {
                     'code': 'dataset_geid',
                     'type': 'file',
+                    'name': 'path.nii.gz',
+                    'parent_path': None,
                     'storage': {'location_uri': f'http://anything.com/bucket/{dataset_code}/path.nii.gz'},
                     'id': file_geid,
                     'operator': 'me',
@@ -100,6 +103,9 @@ async def test_dataset_verify_when_bids_valid_should_return_200(mock_subproc_run
         'total': 1,
     }
 
+    res = await client.get(f'/v1/dataset/bids-msg/{dataset_geid}')
+    assert res.json()['result']['validate_output'] == {'bids': 'verified'}
+
 
 async def test_dataset_verify_pre_should_return_200(client, httpx_mock, dataset):
     dataset_geid = str(dataset.id)
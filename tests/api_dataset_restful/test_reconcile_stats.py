@@ -0,0 +1,41 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from unittest import mock
+
+import pytest
+
+from app.config import ConfigClass
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_reconcile_stats_when_the_job_queue_is_disabled_should_return_409(client, test_db, dataset, monkeypatch):
+    monkeypatch.setattr(ConfigClass, 'JOB_QUEUE_ENABLED', False)
+
+    res = await client.post(f'/v1/dataset/{dataset.id}/stats/reconcile')
+
+    assert res.status_code == 409
+    assert res.json()['error_msg'] == 'The stats can only be reconciled when the job queue is enabled'
+
+
+async def test_reconcile_stats_should_enqueue_the_job(client, test_db, dataset, monkeypatch):
+    monkeypatch.setattr(ConfigClass, 'JOB_QUEUE_ENABLED', True)
+
+    with mock.patch('app.services.job_queue.job_queue.enqueue', new_callable=mock.AsyncMock) as enqueue:
+        res = await client.post(f'/v1/dataset/{dataset.id}/stats/reconcile')
+
+    assert res.status_code == 200
+    assert enqueue.await_args.args[1:] == ('dataset_reconcile_stats', dataset.code, {'dataset_id': str(dataset.id)})
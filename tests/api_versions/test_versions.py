@@ -13,10 +13,14 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import json
+from os import environ
+from unittest import mock
 from uuid import uuid4
 
 import pytest
 import pytest_asyncio
+from aioredis import StrictRedis
 
 pytestmark = pytest.mark.asyncio
 
@@ -34,7 +38,8 @@ async def test_publish_version_should_start_background_task_and_return_200(clien
         method='GET',
         url=(
             'http://metadata_service/v1/items/search/?'
-            f'recursive=true&zone=1&container_code={dataset.code}&container_type=dataset&page_size=100000'
+            f'recursive=true&zone=1&container_type=dataset&container_code={dataset.code}'
+            '&page_size=1000&sorting=created_time,id&order=asc&page=0'
         ),
         json={
             'result': [
@@ -42,7 +47,8 @@ async def test_publish_version_should_start_background_task_and_return_200(clien
                     'id': file_geid,
                     'parent': None,
                     'type': 'file',
-                    'parent_path': 'http://anything.com/bucket/obj/path',
+                    'parent_path': None,
+                    'name': 'path',
                     'storage': {'location_uri': 'http://anything.com/bucket/obj/path'},
                 }
             ],
@@ -51,12 +57,12 @@ async def test_publish_version_should_start_background_task_and_return_200(clien
 
     httpx_mock.add_response(
         method='POST',
-        url='http://data_ops_util/v2/resource/lock/',
+        url='http://data_ops_util/v2/resource/lock/bulk',
         json={},
     )
     httpx_mock.add_response(
         method='DELETE',
-        url='http://data_ops_util/v2/resource/lock/',
+        url='http://data_ops_util/v2/resource/lock/bulk',
         json={},
     )
 
@@ -70,6 +76,51 @@ async def test_publish_version_should_start_background_task_and_return_200(clien
     assert res.json()['result']['status'] == 'success'
 
 
+async def test_publish_version_when_publish_in_progress_should_return_400(client, mock_minio, dataset):
+    dataset_id = str(dataset.id)
+    cache = StrictRedis(host=environ.get('REDIS_HOST'))
+    await cache.set(f'publish_guard:{dataset_id}', 'inprogress')
+
+    payload = {'operator': 'admin', 'notes': 'testing', 'version': '2.0'}
+    res = await client.post(f'/v1/dataset/{dataset_id}/publish', json=payload)
+    assert res.status_code == 400
+    assert res.json()['result'] == 'Dataset is inprogress of publishing'
+
+
+async def test_publish_guard_should_only_be_released_by_its_holder():
+    from app.routers.v1.api_version.publish_version import PublishVersion
+
+    dataset_id = str(uuid4())
+    cache = StrictRedis(host=environ.get('REDIS_HOST'))
+    token = await PublishVersion.acquire_guard(cache, dataset_id)
+    assert token
+    assert await PublishVersion.acquire_guard(cache, dataset_id) is None
+
+    await PublishVersion.release_guard(cache, dataset_id, 'other-token')
+    assert not await PublishVersion.claim_guard(cache, dataset_id, 'other-token')
+    assert await PublishVersion.extend_guard(cache, dataset_id, token)
+
+    await PublishVersion.release_guard(cache, dataset_id, token)
+    assert await cache.get(f'publish_guard:{dataset_id}') is None
+
+
+async def test_publish_should_mark_the_status_failed_and_raise_when_it_fails(mock_minio, dataset):
+    from app.routers.v1.api_version.publish_version import PublishVersion
+
+    cache = StrictRedis(host=environ.get('REDIS_HOST'))
+    status_id = str(uuid4())
+    client = PublishVersion(dataset, 'admin', 'notes', status_id, '2.0', cache)
+
+    with mock.patch(
+        'app.routers.v1.api_version.publish_version.ContainerTreeIndex.get_children',
+        side_effect=Exception('listing failed'),
+    ):
+        with pytest.raises(Exception, match='listing failed'):
+            await client.publish()
+
+    assert json.loads(await cache.get(status_id))['status'] == 'failed'
+
+
 async def test_publish_version_with_large_notes_should_return_400(client, mock_minio, dataset):
     dataset_id = str(dataset.id)
     payload = {'operator': 'admin', 'notes': ''.join(['12345' for i in range(60)]), 'version': '2.0'}
@@ -102,6 +153,35 @@ async def test_version_list_should_return_200_and_version_in_result(client, vers
     assert res.json()['result'][0] == version.to_dict()
 
 
+async def test_version_list_should_return_the_total_of_all_pages(client, version, db_session):
+    from app.models.version import DatasetVersion
+
+    new_version = DatasetVersion(
+        dataset_code=version.dataset_code,
+        dataset_geid=version.dataset_geid,
+        version='2.1',
+        created_by=version.created_by,
+        location='minio_location',
+        notes='test',
+    )
+    db_session.add(new_version)
+    await db_session.commit()
+
+    dataset_id = version.dataset_geid
+    res = await client.get(f'/v1/dataset/{dataset_id}/versions', query_string={'page': 0, 'page_size': 1})
+    assert res.status_code == 200
+    assert res.json()['total'] == 2
+    assert res.json()['num_of_pages'] == 2
+    assert res.json()['result'] == [new_version.to_dict()]
+
+    res = await client.get(f'/v1/dataset/{dataset_id}/versions', query_string={'page': 5, 'page_size': 1})
+    assert res.json()['total'] == 2
+    assert res.json()['result'] == []
+
+    await db_session.delete(new_version)
+    await db_session.commit()
+
+
 async def test_version_not_published_to_dataset_should_return_404(client, dataset):
     dataset_id = str(dataset.id)
     payload = {'version': '2.0'}
@@ -0,0 +1,63 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+
+from app.clients import MetadataClient
+from app.clients.http_pool import HTTPClientPool
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_http_client_pool_should_reuse_client_per_service():
+    pool = HTTPClientPool()
+
+    metadata_client = pool.get(HTTPClientPool.METADATA)
+
+    assert pool.get(HTTPClientPool.METADATA) is metadata_client
+    assert pool.get(HTTPClientPool.PROJECT) is not metadata_client
+    await pool.close()
+
+
+async def test_http_client_pool_should_recreate_client_after_close():
+    pool = HTTPClientPool()
+    client = pool.get(HTTPClientPool.DATA_OPS)
+
+    await pool.close()
+
+    assert client.is_closed
+    new_client = pool.get(HTTPClientPool.DATA_OPS)
+    assert new_client is not client
+    assert not new_client.is_closed
+    await pool.close()
+
+
+async def test_http_client_pool_should_apply_service_timeout():
+    pool = HTTPClientPool()
+    await pool.start()
+
+    client = pool.get(HTTPClientPool.METADATA)
+
+    assert client.timeout.read == pool.timeouts[HTTPClientPool.METADATA]
+    await pool.close()
+
+
+async def test_metadata_client_should_send_requests_through_shared_client(httpx_mock):
+    httpx_mock.add_response(method='GET', url='http://metadata_service/v1/item/any/', json={'result': {'id': 'any'}})
+
+    for _ in range(3):
+        assert await MetadataClient.get_by_id('any') == {'id': 'any'}
+
+    assert len(httpx_mock.get_requests()) == 3
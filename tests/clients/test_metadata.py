@@ -0,0 +1,97 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import re
+
+import pytest
+
+from app.clients import MetadataBulkUpdateError
+from app.clients import MetadataClient
+from app.config import ConfigClass
+
+pytestmark = pytest.mark.asyncio
+
+CODE = 'testdataset'
+
+
+def get_search_url(page, page_size=2):
+    return (
+        'http://metadata_service/v1/items/search/?recursive=true&zone=1&container_type=dataset'
+        f'&container_code={CODE}&page_size={page_size}&sorting=created_time,id&order=asc&page={page}'
+    )
+
+
+async def test_iter_objects_should_page_through_the_search(httpx_mock):
+    items = [{'id': str(i), 'name': f'file_{i}', 'parent': None, 'location': 'any'} for i in range(5)]
+    for page in range(3):
+        httpx_mock.add_response(
+            method='GET',
+            url=get_search_url(page),
+            json={'result': items[page * 2 : page * 2 + 2], 'num_of_pages': 3},
+        )
+
+    result = [item async for item in MetadataClient.iter_objects(CODE, page_size=2)]
+
+    assert result == items
+    assert len(httpx_mock.get_requests()) == 3
+
+
+async def test_iter_objects_should_break_created_time_ties_by_id(httpx_mock):
+    created_time = '2022-01-01T00:00:00'
+    items = [{'id': str(i), 'name': f'file_{i}', 'created_time': created_time} for i in range(4)]
+    for page in range(2):
+        httpx_mock.add_response(
+            method='GET',
+            url=get_search_url(page),
+            json={'result': items[page * 2 : page * 2 + 2], 'num_of_pages': 2},
+        )
+
+    result = [item async for item in MetadataClient.iter_objects(CODE, page_size=2)]
+
+    assert [item['id'] for item in result] == ['0', '1', '2', '3']
+    assert {request.url.params['sorting'] for request in httpx_mock.get_requests()} == {'created_time,id'}
+
+
+async def test_iter_objects_should_reduce_items_to_fields(httpx_mock):
+    httpx_mock.add_response(
+        method='GET',
+        url=get_search_url(0),
+        json={'result': [{'id': 'any', 'name': 'file', 'location': 'any'}], 'num_of_pages': 1},
+    )
+
+    result = [item async for item in MetadataClient.iter_objects(CODE, fields=('id', 'name', 'type'), page_size=2)]
+
+    assert result == [{'id': 'any', 'name': 'file'}]
+
+
+async def test_iter_objects_should_stop_on_empty_page(httpx_mock):
+    httpx_mock.add_response(method='GET', url=get_search_url(0), json={'result': [], 'num_of_pages': 5})
+
+    result = [item async for item in MetadataClient.iter_objects(CODE, page_size=2)]
+
+    assert result == []
+
+
+async def test_update_objects_should_report_the_chunks_applied_before_a_failure(monkeypatch, httpx_mock):
+    monkeypatch.setattr(ConfigClass, 'METADATA_BULK_UPDATE_CHUNK_SIZE', 1)
+    httpx_mock.add_response(
+        method='PUT', url=re.compile('.*/v1/items/batch/.*ids=first.*'), json={'result': [{'id': 'first'}]}
+    )
+    httpx_mock.add_response(method='PUT', url=re.compile('.*/v1/items/batch/.*ids=second.*'), status_code=500)
+
+    with pytest.raises(MetadataBulkUpdateError) as exc_info:
+        await MetadataClient.update_objects([{'id': 'first'}, {'id': 'second'}], CODE)
+
+    assert exc_info.value.updated == [{'id': 'first'}]
@@ -0,0 +1,118 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+
+import pytest
+
+from app.clients import MetadataClient
+from app.clients.metadata_cache import MetadataListingCache
+from app.clients.metadata_cache import metadata_cache
+
+pytestmark = pytest.mark.asyncio
+
+CODE = 'testdataset'
+SEARCH_URL = (
+    'http://metadata_service/v1/items/search/'
+    f'?recursive=true&zone=1&container_code={CODE}&container_type=dataset&page_size=100000'
+)
+
+
+def get_fetch(items, calls):
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0)
+        return items
+
+    return fetch
+
+
+async def test_metadata_listing_cache_should_fetch_once_and_return_copies():
+    cache = MetadataListingCache(ttl=60, max_items=10, redis_enabled=False, local_enabled=True)
+    calls = []
+    fetch = get_fetch([{'id': 'any', 'name': 'file'}], calls)
+
+    first = await cache.get((CODE, 'dataset'), fetch)
+    first[0]['name'] = 'changed'
+    second = await cache.get((CODE, 'dataset'), fetch)
+
+    assert second == [{'id': 'any', 'name': 'file'}]
+    assert len(calls) == 1
+
+
+async def test_metadata_listing_cache_should_share_concurrent_fetch():
+    cache = MetadataListingCache(ttl=60, max_items=10, redis_enabled=False, local_enabled=True)
+    calls = []
+    fetch = get_fetch([{'id': 'any'}], calls)
+
+    results = await asyncio.gather(*[cache.get((CODE, 'dataset'), fetch) for _ in range(5)])
+
+    assert results == [[{'id': 'any'}]] * 5
+    assert len(calls) == 1
+
+
+async def test_metadata_listing_cache_should_expire_entries():
+    cache = MetadataListingCache(ttl=0.01, max_items=10, redis_enabled=False, local_enabled=True)
+    calls = []
+    fetch = get_fetch([{'id': 'any'}], calls)
+
+    await cache.get((CODE, 'dataset'), fetch)
+    await asyncio.sleep(0.02)
+    await cache.get((CODE, 'dataset'), fetch)
+
+    assert len(calls) == 2
+
+
+async def test_metadata_listing_cache_should_evict_least_recently_used_by_item_count():
+    cache = MetadataListingCache(ttl=60, max_items=4, redis_enabled=False, local_enabled=True)
+    calls = []
+    fetch = get_fetch([{'id': 1}, {'id': 2}], calls)
+
+    await cache.get(('first', 'dataset'), fetch)
+    await cache.get(('second', 'dataset'), fetch)
+    await cache.get(('first', 'dataset'), fetch)
+    await cache.get(('third', 'dataset'), fetch)
+    assert len(calls) == 3
+
+    await cache.get(('first', 'dataset'), fetch)
+    assert len(calls) == 3
+    await cache.get(('second', 'dataset'), fetch)
+    assert len(calls) == 4
+
+
+async def test_metadata_listing_cache_should_be_bypassed_without_a_tier():
+    cache = MetadataListingCache(ttl=60, max_items=10, redis_enabled=False, local_enabled=False)
+    calls = []
+    fetch = get_fetch([{'id': 'any'}], calls)
+
+    await cache.get((CODE, 'dataset'), fetch)
+    await cache.get((CODE, 'dataset'), fetch)
+
+    assert len(calls) == 2
+
+
+async def test_metadata_client_should_invalidate_listing_on_create(httpx_mock, monkeypatch):
+    metadata_cache.clear()
+    monkeypatch.setattr(metadata_cache, 'local_enabled', True)
+    httpx_mock.add_response(method='GET', url=SEARCH_URL, json={'result': [{'id': 'any'}]})
+    httpx_mock.add_response(method='POST', url='http://metadata_service/v1/item/', json={'result': {'id': 'new'}})
+
+    await MetadataClient.get_objects(CODE)
+    await MetadataClient.get_objects(CODE)
+    assert len(httpx_mock.get_requests()) == 1
+
+    await MetadataClient.create_object({'name': 'new', 'container_code': CODE, 'container_type': 'dataset'})
+    await MetadataClient.get_objects(CODE)
+    assert len(httpx_mock.get_requests()) == 3
@@ -0,0 +1,85 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from datetime import datetime
+from datetime import timedelta
+from unittest import mock
+
+import jwt
+from minio.credentials import Credentials
+
+from app.commons.service_connection.minio_client import EarlyRefreshClientGrantsProvider
+from app.commons.service_connection.minio_client import Minio_Client
+from app.commons.service_connection.minio_client import MinioClientCache
+from app.commons.service_connection.minio_client import get_minio_client
+
+
+def get_token(subject, **claims):
+    return 'Bearer ' + jwt.encode({'sub': subject, **claims}, key='secret', algorithm='HS256').decode('utf-8')
+
+
+def test_minio_client_cache_should_reuse_client_for_same_token():
+    cache = MinioClientCache(2)
+    token = get_token('admin')
+
+    assert cache.get(token, 'refresh') is cache.get(token, 'refresh')
+
+
+def test_minio_client_cache_should_replace_client_when_token_changes():
+    cache = MinioClientCache(2)
+    first = cache.get(get_token('admin', iat=1), 'refresh')
+
+    second = cache.get(get_token('admin', iat=2), 'refresh')
+
+    assert first is not second
+    assert cache.get(get_token('admin', iat=2), 'refresh') is second
+
+
+def test_minio_client_cache_should_evict_least_recently_used_user():
+    cache = MinioClientCache(2)
+    admin = cache.get(get_token('admin'), 'refresh')
+    cache.get(get_token('user1'), 'refresh')
+    cache.get(get_token('admin'), 'refresh')
+    cache.get(get_token('user2'), 'refresh')
+
+    assert cache.get(get_token('admin'), 'refresh') is admin
+    assert list(cache._clients) == ['user2', 'admin']
+
+
+def test_minio_client_cache_should_not_cache_invalid_token():
+    cache = MinioClientCache(2)
+
+    assert cache.get('not a jwt', 'refresh') is not cache.get('not a jwt', 'refresh')
+    assert not cache._clients
+
+
+def test_get_minio_client_should_use_the_service_credentials_without_token():
+    assert isinstance(get_minio_client(None, None), Minio_Client)
+
+
+def test_early_refresh_provider_should_renew_credentials_before_expiry():
+    provider = EarlyRefreshClientGrantsProvider(mock.Mock(), 'http://minio', refresh_margin=60)
+    renewed = Credentials('new', 'new', expiration=datetime.utcnow() + timedelta(hours=1))
+
+    with mock.patch(
+        'minio.credentials.providers.WebIdentityClientGrantsProvider.retrieve', return_value=renewed
+    ) as retrieve:
+        provider._credentials = Credentials('old', 'old', expiration=datetime.utcnow() + timedelta(minutes=30))
+        assert provider.retrieve().access_key == 'old'
+
+        provider._credentials = Credentials('old', 'old', expiration=datetime.utcnow() + timedelta(seconds=30))
+        assert provider.retrieve() is renewed
+
+    retrieve.assert_called_once()
@@ -151,6 +151,11 @@ async def client():
         yield client
 
 
+def mock_put_object(client, bucket_name, object_name, data, *args, **kwargs):
+    while data.read(1024):
+        pass
+
+
 @pytest_asyncio.fixture
 def mock_minio(monkeypatch):
     from app.commons.service_connection.minio_client import Minio
@@ -164,11 +169,26 @@ def mock_minio(monkeypatch):
     monkeypatch.setattr(Minio, 'list_buckets', lambda x: [])
     monkeypatch.setattr(Minio, 'fget_object', lambda *x: [])
     monkeypatch.setattr(Minio, 'fput_object', lambda *x: mock.MagicMock())
+    monkeypatch.setattr(Minio, 'put_object', mock_put_object)
     monkeypatch.setattr(Minio, 'copy_object', lambda *x: mock.MagicMock())
     monkeypatch.setattr(Minio, 'make_bucket', lambda *x: mock.MagicMock())
     monkeypatch.setattr(Minio, 'set_bucket_encryption', lambda *x: mock.MagicMock())
 
 
+@pytest_asyncio.fixture(autouse=True)
+async def clean_up_metadata_cache():
+    from app.clients.metadata_cache import metadata_cache
+
+    metadata_cache.clear()
+
+
+@pytest_asyncio.fixture(autouse=True)
+async def clean_up_dataset_cache():
+    from app.services.dataset_cache import dataset_cache
+
+    dataset_cache.clear()
+
+
 @pytest_asyncio.fixture(autouse=True)
 async def clean_up_redis():
     cache = StrictRedis(host=environ.get('REDIS_HOST'))
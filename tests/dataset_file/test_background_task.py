@@ -13,16 +13,23 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import asyncio
 import json
+from contextlib import asynccontextmanager
 from unittest import mock
 from uuid import uuid4
 
+import httpx
 import pytest
 import pytest_asyncio
 
+from app.config import ConfigClass
+from app.models.job import FileOperationCheckpoint
+from app.resources.tree_index import ContainerTreeIndex
 from app.routers.v1.dataset_file import APIImportData
 from app.schemas.activity_log import FileFolderActivityLogSchema
 from app.services.activity_log import FileFolderActivityLogService
+from app.services.job_queue import JobCheckpoint
 
 pytestmark = pytest.mark.asyncio
 
@@ -71,7 +78,7 @@ def external_requests(httpx_mock):
     )
 
 
-@mock.patch.object(FileFolderActivityLogService, '_message_send')
+@mock.patch.object(FileFolderActivityLogService, '_message_send_many')
 @mock.patch('app.routers.v1.dataset_file.recursive_lock_import')
 async def test_copy_file_worker_should_import_file_succeed(
     mock_recursive_lock_import, mock_kafka_msg, external_requests, httpx_mock, test_db, dataset
@@ -119,12 +126,12 @@ async def test_copy_file_worker_should_import_file_succeed(
         mock_recursive_copy.return_value = 1, 1, None
         try:
             await API.copy_files_worker(
-                test_db, import_list, dataset, OPER, source_project_geid, SESSION_ID, ACCESS_TOKEN, REFRESH_TOKEN
+                import_list, dataset, OPER, source_project_geid, SESSION_ID, ACCESS_TOKEN, REFRESH_TOKEN
             )
         except Exception as e:
             pytest.fail(f'copy_files_worker raised {e} unexpectedly')
     assert mock_kafka_msg.call_count == 1
-    file_folder = FileFolderActivityLogSchema.parse_obj(mock_kafka_msg.call_args[0][0])
+    file_folder = FileFolderActivityLogSchema.parse_obj(mock_kafka_msg.call_args[0][0][0])
     assert file_folder.activity_type == 'import'
 
 
@@ -142,18 +149,20 @@ async def test_copy_file_worker_should_import_file_succeed(
         ({'id': 'any', 'parent_path': None, 'name': 'any_folder'}, root_folder),
     ],
 )
+@pytest.mark.parametrize('in_place', [True, False])
 async def test_move_file_worker_should_move_file_succeed(
-    mock_kafka_msg, external_requests, httpx_mock, test_db, dataset, target_folder, item_type
+    mock_kafka_msg, monkeypatch, external_requests, httpx_mock, test_db, dataset, target_folder, item_type, in_place
 ):
+    monkeypatch.setattr(ConfigClass, 'FILE_MOVE_IN_PLACE', in_place)
     code = 'testdataset202201101'
     httpx_mock.add_response(
         method='POST',
-        url='http://data_ops_util/v2/resource/lock/',
+        url='http://data_ops_util/v2/resource/lock/bulk',
         json=[],
     )
     httpx_mock.add_response(
         method='DELETE',
-        url='http://data_ops_util/v2/resource/lock/',
+        url='http://data_ops_util/v2/resource/lock/bulk',
         json=[],
     )
     name = item_type['name']
@@ -172,7 +181,8 @@ async def test_move_file_worker_should_move_file_succeed(
             method='GET',
             url=(
                 'http://metadata_service/v1/items/search/?'
-                f'recursive=true&zone=1&container_code={code}&container_type=dataset&page_size=100000'
+                f'recursive=true&zone=1&container_type=dataset&container_code={code}'
+                '&page_size=1000&sorting=created_time,id&order=asc&page=0'
             ),
             json={
                 'result': [],
@@ -197,31 +207,35 @@ async def test_move_file_worker_should_move_file_succeed(
         }
     ]
 
-    with mock.patch.object(APIImportData, 'recursive_copy') as mock_recursive_copy:
-        mock_recursive_copy.return_value = 1, 1, None
-        with mock.patch.object(APIImportData, 'recursive_delete'):
-            try:
-                await API.move_file_worker(
-                    test_db,
-                    move_list,
-                    dataset,
-                    OPER,
-                    target_folder,
-                    SESSION_ID,
-                    ACCESS_TOKEN,
-                    REFRESH_TOKEN,
-                )
-            except Exception as e:
-                pytest.fail(f'copy_files_worker raised {e} unexpectedly')
+    with mock.patch('app.routers.v1.dataset_file.move_nodes') as mock_move_nodes:
+        mock_move_nodes.return_value = move_list
+        with mock.patch.object(APIImportData, 'recursive_copy') as mock_recursive_copy:
+            mock_recursive_copy.return_value = 1, 1, None
+            with mock.patch.object(APIImportData, 'recursive_delete') as mock_recursive_delete:
+                try:
+                    await API.move_file_worker(
+                        move_list,
+                        dataset,
+                        OPER,
+                        target_folder,
+                        SESSION_ID,
+                        ACCESS_TOKEN,
+                        REFRESH_TOKEN,
+                    )
+                except Exception as e:
+                    pytest.fail(f'copy_files_worker raised {e} unexpectedly')
+    assert mock_move_nodes.called is in_place
+    assert mock_recursive_copy.called is not in_place
+    assert mock_recursive_delete.called is not in_place
     locks = []
     unlocks = []
 
     for request in httpx_mock.get_requests():
-        if request.url == 'http://data_ops_util/v2/resource/lock/':
+        if request.url == 'http://data_ops_util/v2/resource/lock/bulk':
             if request.method == 'POST':
-                locks.append(json.loads(request.content)['resource_key'])
+                locks.extend(json.loads(request.content)['resource_keys'])
             else:
-                unlocks.append(json.loads(request.content)['resource_key'])
+                unlocks.extend(json.loads(request.content)['resource_keys'])
 
     if item_type['parent_path']:
         parent_path = item_type['parent_path']
@@ -242,9 +256,12 @@ async def test_move_file_worker_should_move_file_succeed(
     assert mock_kafka_msg.call_count == 1
     file_folder = FileFolderActivityLogSchema.parse_obj(mock_kafka_msg.call_args[0][0])
     assert file_folder.activity_type == 'update'
+    old_path = '/' + '/'.join(filter(None, [(item_type['parent_path'] or '').replace('.', '/'), name]))
+    new_path = '/' + '/'.join(filter(None, [target_folder['name'], name]))
+    assert file_folder.changes == [{'item_property': 'parent_path', 'old_value': old_path, 'new_value': new_path}]
 
 
-@mock.patch.object(FileFolderActivityLogService, '_message_send')
+@mock.patch.object(FileFolderActivityLogService, '_message_send_many')
 @mock.patch('app.routers.v1.dataset_file.recursive_lock_delete')
 async def test_delete_files_work_should_delete_file_succeed(
     mock_recursive_lock_delete, mock_kafka_msg, external_requests, httpx_mock, test_db, dataset
@@ -281,20 +298,29 @@ async def test_delete_files_work_should_delete_file_succeed(
     with mock.patch.object(APIImportData, 'recursive_delete') as mock_recursive_delete:
         mock_recursive_delete.return_value = 1, 1
         try:
-            await API.delete_files_work(test_db, delete_list, dataset, OPER, SESSION_ID, ACCESS_TOKEN, REFRESH_TOKEN)
+            await API.delete_files_work(delete_list, dataset, OPER, SESSION_ID, ACCESS_TOKEN, REFRESH_TOKEN)
         except Exception as e:
             pytest.fail(f'copy_delete_work raised {e} unexpectedly')
 
     assert mock_kafka_msg.call_count == 1
-    file_folder = FileFolderActivityLogSchema.parse_obj(mock_kafka_msg.call_args[0][0])
+    file_folder = FileFolderActivityLogSchema.parse_obj(mock_kafka_msg.call_args[0][0][0])
     assert file_folder.activity_type == 'delete'
 
 
-@mock.patch.object(FileFolderActivityLogService, '_message_send')
+@mock.patch.object(FileFolderActivityLogService, '_message_send_many')
 @mock.patch('app.routers.v1.dataset_file.recursive_lock_move_rename')
+@pytest.mark.parametrize('in_place', [True, False])
 async def test_rename_file_worker_should_rename_file_succeed(
-    mock_recursive_lock_move_rename, mock_kafka_msg, external_requests, httpx_mock, test_db, dataset
+    mock_recursive_lock_move_rename,
+    mock_kafka_msg,
+    monkeypatch,
+    external_requests,
+    httpx_mock,
+    test_db,
+    dataset,
+    in_place,
 ):
+    monkeypatch.setattr(ConfigClass, 'FILE_MOVE_IN_PLACE', in_place)
     mock_recursive_lock_move_rename.return_value = [], False
     httpx_mock.add_response(
         method='PUT',
@@ -343,14 +369,195 @@ async def test_rename_file_worker_should_rename_file_succeed(
     }
     new_name = 'new_name'
 
-    with mock.patch.object(APIImportData, 'recursive_copy') as mock_recursive_copy:
-        mock_recursive_copy.return_value = 1, 1, [{}]
-        with mock.patch.object(APIImportData, 'recursive_delete'):
-            try:
-                await API.rename_file_worker(old_file, new_name, dataset, OPER, SESSION_ID, ACCESS_TOKEN, REFRESH_TOKEN)
-            except Exception as e:
-                pytest.fail(f'rename_file_worker raised {e} unexpectedly')
+    with mock.patch('app.routers.v1.dataset_file.move_nodes') as mock_move_nodes:
+        mock_move_nodes.return_value = [{**old_file, 'name': new_name}]
+        with mock.patch.object(APIImportData, 'recursive_copy') as mock_recursive_copy:
+            mock_recursive_copy.return_value = 1, 1, [{**old_file, 'name': new_name}]
+            with mock.patch.object(APIImportData, 'recursive_delete') as mock_recursive_delete:
+                try:
+                    await API.rename_file_worker(
+                        old_file, new_name, dataset, OPER, SESSION_ID, ACCESS_TOKEN, REFRESH_TOKEN
+                    )
+                except Exception as e:
+                    pytest.fail(f'rename_file_worker raised {e} unexpectedly')
+    assert mock_move_nodes.called is in_place
+    assert mock_recursive_copy.called is not in_place
+    assert mock_recursive_delete.called is not in_place
 
     assert mock_kafka_msg.call_count == 1
-    file_folder = FileFolderActivityLogSchema.parse_obj(mock_kafka_msg.call_args[0][0])
+    file_folder = FileFolderActivityLogSchema.parse_obj(mock_kafka_msg.call_args[0][0][0])
     assert file_folder.activity_type == 'update'
+
+
+@mock.patch('app.routers.v1.dataset_file.recursive_lock_move_rename')
+async def test_rename_file_worker_should_cancel_and_raise_when_the_rename_fails(
+    mock_recursive_lock_move_rename, external_requests, httpx_mock, test_db, dataset
+):
+    mock_recursive_lock_move_rename.return_value = [], False
+    httpx_mock.add_response(method='PUT', url='http://data_ops_util/v1/tasks/', json=[])
+    httpx_mock.add_response(
+        method='GET',
+        url='http://metadata_service/v1/item/077fe46b-3bff-4da3-a4fb-4d6cbf9ce470/',
+        json={'result': {'id': '077fe46b-3bff-4da3-a4fb-4d6cbf9ce470', 'name': 'folder', 'parent_path': None}},
+    )
+    old_file = {
+        'id': 'ded5bf1e-80f5-4b39-bbfd-f7c74054f41d',
+        'parent': '077fe46b-3bff-4da3-a4fb-4d6cbf9ce470',
+        'parent_path': 'folder',
+        'type': 'file',
+        'name': 'file.txt',
+        'container_code': dataset.code,
+    }
+
+    with mock.patch('app.routers.v1.dataset_file.move_nodes', side_effect=Exception('rename failed')):
+        with pytest.raises(Exception, match='rename failed'):
+            await API.rename_file_worker(old_file, 'new_name', dataset, OPER, SESSION_ID, ACCESS_TOKEN, REFRESH_TOKEN)
+
+    statuses = [
+        json.loads(request.content)['status']
+        for request in httpx_mock.get_requests(method='PUT', url='http://data_ops_util/v1/tasks/')
+    ]
+    assert statuses[-1] == 'CANCELLED'
+
+
+async def test_recursive_copy_should_copy_files_concurrently_within_limit(monkeypatch):
+    from app.config import ConfigClass
+    from app.resources.tree_index import ContainerTreeIndex
+
+    monkeypatch.setattr(ConfigClass, 'FILE_COPY_CONCURRENCY', 2)
+    folder = {'id': str(uuid4()), 'parent': None, 'parent_path': None, 'type': 'folder', 'name': 'folder', 'size': 0}
+    files = [
+        {'id': str(uuid4()), 'parent': folder['id'], 'parent_path': 'folder', 'type': 'file', 'name': f'{i}', 'size': 2}
+        for i in range(6)
+    ]
+    tree_index = ContainerTreeIndex.from_items('project_code', [folder, *files], items_type='project')
+    dataset = mock.MagicMock(code='fakedataset')
+    created = []
+    running = {'now': 0, 'max': 0}
+
+    async def fake_create_folder_node(dataset_code, source_folder, *args):
+        created.append(source_folder['id'])
+        return {'id': 'new-' + source_folder['id'], 'parent_path': None, 'name': source_folder['name']}, None
+
+    async def fake_create_file_node(dataset, source_file, *args, **kwargs):
+        assert folder['id'] in created
+        running['now'] += 1
+        running['max'] = max(running['max'], running['now'])
+        await asyncio.sleep(0.01)
+        running['now'] -= 1
+        created.append(source_file['id'])
+        return {'id': 'new-' + source_file['id']}, None
+
+    monkeypatch.setattr('app.routers.v1.dataset_file.create_folder_node', fake_create_folder_node)
+    monkeypatch.setattr('app.routers.v1.dataset_file.create_file_node', fake_create_file_node)
+
+    num_of_files, total_file_size, new_nodes = await API.recursive_copy(
+        [folder], dataset, OPER, 'data', {}, ACCESS_TOKEN, REFRESH_TOKEN, tree_index=tree_index
+    )
+
+    assert num_of_files == 6
+    assert total_file_size == 12
+    assert new_nodes == [{'id': 'new-' + folder['id'], 'parent_path': None, 'name': 'folder'}]
+    assert created[0] == folder['id']
+    assert sorted(created[1:]) == sorted(file['id'] for file in files)
+    assert running['max'] == 2
+
+
+@asynccontextmanager
+async def fake_db_session_scope():
+    yield mock.AsyncMock()
+
+
+@mock.patch('app.services.job_queue.db_session_scope', fake_db_session_scope)
+@mock.patch('app.routers.v1.dataset_file.create_folder_node')
+@mock.patch('app.routers.v1.dataset_file.create_file_node')
+async def test_recursive_copy_skips_the_nodes_checkpointed_by_a_previous_run(create_file_node, create_folder_node):
+    copied_file = {**root_file, 'id': str(uuid4())}
+    new_folder = {**root_folder, 'id': str(uuid4())}
+    new_file = {**children_file, 'id': str(uuid4())}
+    child_file = {**children_file, 'parent': root_folder['id'], 'parent_path': root_folder['name'], 'size': 20}
+    checkpoint = JobCheckpoint(
+        uuid4(),
+        {
+            root_file['id']: FileOperationCheckpoint(new_item=copied_file, num_of_files=1, size=10, finished=True),
+            root_folder['id']: FileOperationCheckpoint(new_item=new_folder, num_of_files=0, size=0, finished=False),
+        },
+    )
+    create_file_node.return_value = (new_file, None)
+
+    tree_index = ContainerTreeIndex.from_items('project', [root_file, root_folder, child_file], 'project')
+
+    _, _, new_nodes = await API.recursive_copy(
+        [root_file, root_folder],
+        'dataset',
+        OPER,
+        'data',
+        {},
+        ACCESS_TOKEN,
+        REFRESH_TOKEN,
+        tree_index=tree_index,
+        checkpoint=checkpoint,
+    )
+
+    create_folder_node.assert_not_called()
+    create_file_node.assert_called_once()
+    assert create_file_node.call_args.args[1] == child_file
+    assert create_file_node.call_args.args[3] == new_folder
+    assert new_nodes == [copied_file, new_folder]
+    assert checkpoint.get(root_folder['id']).finished
+    assert checkpoint.get_totals() == (2, 30)
+
+
+@mock.patch('app.services.job_queue.db_session_scope', fake_db_session_scope)
+@mock.patch('app.routers.v1.dataset_file.create_folder_node')
+@mock.patch('app.routers.v1.dataset_file.create_file_node')
+async def test_recursive_copy_reuses_the_items_created_but_not_checkpointed_by_a_previous_run(
+    create_file_node, create_folder_node
+):
+    child_file = {**children_file, 'parent': root_folder['id'], 'parent_path': root_folder['name'], 'size': 20}
+    created_folder = {**root_folder, 'id': str(uuid4())}
+    created_file = {**child_file, 'id': str(uuid4()), 'parent': created_folder['id']}
+    create_file_node.return_value = (created_file, None)
+    tree_index = ContainerTreeIndex.from_items('project', [root_folder, child_file], 'project')
+    target_index = ContainerTreeIndex.from_items('dataset', [created_folder, created_file])
+    checkpoint = JobCheckpoint(uuid4())
+
+    _, _, new_nodes = await API.recursive_copy(
+        [root_folder],
+        'dataset',
+        OPER,
+        'data',
+        {},
+        ACCESS_TOKEN,
+        REFRESH_TOKEN,
+        tree_index=tree_index,
+        checkpoint=checkpoint,
+        target_index=target_index,
+    )
+
+    create_folder_node.assert_not_called()
+    assert create_file_node.call_args.args[3] == created_folder
+    assert create_file_node.call_args.kwargs['existing_node'] == created_file
+    assert new_nodes == [created_folder]
+    assert checkpoint.get_totals() == (1, 20)
+
+
+@mock.patch('app.services.job_queue.db_session_scope', fake_db_session_scope)
+@mock.patch('app.routers.v1.dataset_file.delete_node')
+async def test_recursive_delete_ignores_the_items_deleted_by_a_previous_run(delete_node):
+    request = httpx.Request('DELETE', 'http://metadata_service/v1/item/')
+    not_found = httpx.HTTPStatusError('not found', request=request, response=httpx.Response(404, request=request))
+    file = {**root_file, 'size': 10, 'storage': {'location_uri': 'minio://http://minio/dataset/data/file.txt'}}
+
+    with mock.patch('app.routers.v1.dataset_file.MetadataClient.delete_object', side_effect=not_found):
+        with pytest.raises(httpx.HTTPStatusError):
+            await API.recursive_delete([file], mock.MagicMock(code='dataset'), OPER, {}, ACCESS_TOKEN, REFRESH_TOKEN)
+
+        checkpoint = JobCheckpoint(uuid4())
+        num_of_files, total_file_size = await API.recursive_delete(
+            [file], mock.MagicMock(code='dataset'), OPER, {}, ACCESS_TOKEN, REFRESH_TOKEN, checkpoint=checkpoint
+        )
+
+    assert (num_of_files, total_file_size) == (1, 10)
+    assert checkpoint.get(file['id'])
+    delete_node.assert_awaited_once()
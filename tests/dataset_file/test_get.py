@@ -50,9 +50,10 @@ async def test_get_dataset_files(client, httpx_mock, dataset):
         method='GET',
         url=(
             'http://metadata_service/v1/items/search/'
-            f'?recursive=true&zone=1&container_code={dataset.code}&container_type=dataset&page_size=100000'
+            f'?recursive=false&zone=1&container_code={dataset.code}&container_type=dataset'
+            '&page=0&page_size=25&sorting=created_time&order=desc'
         ),
-        json={'result': [file]},
+        json={'result': [file], 'total': 1, 'num_of_pages': 1},
     )
 
     res = await client.get(f'/v1/dataset/{dataset_geid}/files')
@@ -68,3 +69,67 @@ async def test_get_dataset_files(client, httpx_mock, dataset):
         },
         'total': 1,
     }
+
+
+async def test_get_dataset_files_should_return_requested_page_of_folder(client, httpx_mock, dataset):
+    dataset_geid = str(dataset.id)
+    folder_geid = 'cfa31c8c-ba29-4cdf-b6f2-feef05ec4c12'
+    httpx_mock.add_response(
+        method='GET',
+        url=f'http://metadata_service/v1/item/{folder_geid}/',
+        json={
+            'result': {
+                'id': folder_geid,
+                'type': 'folder',
+                'name': 'folder2',
+                'parent_path': 'folder1',
+                'container_code': dataset.code,
+            }
+        },
+    )
+    file = {'type': 'file', 'id': str(uuid4()), 'name': 'b.txt', 'parent_path': 'folder1.folder2'}
+    httpx_mock.add_response(
+        method='GET',
+        url=(
+            'http://metadata_service/v1/items/search/'
+            f'?recursive=false&zone=1&container_code={dataset.code}&container_type=dataset'
+            '&page=1&page_size=1&sorting=name&order=asc&parent_path=folder1.folder2&type=file'
+        ),
+        json={'result': [file], 'total': 3, 'num_of_pages': 3},
+    )
+
+    res = await client.get(
+        f'/v1/dataset/{dataset_geid}/files',
+        query_string={
+            'folder_geid': folder_geid,
+            'page': 1,
+            'page_size': 1,
+            'order_by': 'name',
+            'order_type': 'asc',
+            'query': '{"type": "file"}',
+        },
+    )
+    assert res.status_code == 200
+    assert res.json()['result'] == {'data': [file], 'route': ['folder1', 'folder2']}
+    assert res.json()['total'] == 3
+    assert res.json()['page'] == 1
+    assert res.json()['num_of_pages'] == 3
+
+
+async def test_get_dataset_files_should_ignore_unsupported_filters_and_sorting(client, httpx_mock, dataset):
+    httpx_mock.add_response(
+        method='GET',
+        url=(
+            'http://metadata_service/v1/items/search/'
+            f'?recursive=false&zone=1&container_code={dataset.code}&container_type=dataset'
+            '&page=0&page_size=25&sorting=created_time&order=desc&owner=admin'
+        ),
+        json={'result': [], 'total': 0, 'num_of_pages': 0},
+    )
+
+    res = await client.get(
+        f'/v1/dataset/{dataset.id}/files',
+        query_string={'query': '{"labels": ["a"], "uploader": "admin"}', 'order_by': 'unknown'},
+    )
+    assert res.status_code == 200
+    assert res.json()['total'] == 0
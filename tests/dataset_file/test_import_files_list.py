@@ -51,7 +51,8 @@ async def test_import_files_from_source_list_should_return_200(client, httpx_moc
         method='GET',
         url=(
             'http://metadata_service/v1/items/search/?'
-            'recursive=true&zone=1&container_code=project_code&container_type=project&page_size=100000'
+            'recursive=true&zone=1&container_type=project&container_code=project_code'
+            '&page_size=1000&sorting=created_time,id&order=asc&page=0'
         ),
         json={'result': [file_dict]},
     )
@@ -59,7 +60,8 @@ async def test_import_files_from_source_list_should_return_200(client, httpx_moc
         method='GET',
         url=(
             'http://metadata_service/v1/items/search/?'
-            f'recursive=true&zone=1&container_code={dataset.code}&container_type=dataset&page_size=100000'
+            f'recursive=true&zone=1&container_type=dataset&container_code={dataset.code}'
+            '&page_size=1000&sorting=created_time,id&order=asc&page=0'
         ),
         json={'result': []},
     )
@@ -157,7 +159,8 @@ async def test_05_test_import_duplicate(client, httpx_mock, dataset):
         method='GET',
         url=(
             'http://metadata_service/v1/items/search/?'
-            'recursive=true&zone=1&container_code=project_code&container_type=project&page_size=100000'
+            'recursive=true&zone=1&container_type=project&container_code=project_code'
+            '&page_size=1000&sorting=created_time,id&order=asc&page=0'
         ),
         json={'result': [file_dict]},
     )
@@ -165,7 +168,8 @@ async def test_05_test_import_duplicate(client, httpx_mock, dataset):
         method='GET',
         url=(
             'http://metadata_service/v1/items/search/?'
-            f'recursive=true&zone=1&container_code={dataset.code}&container_type=dataset&page_size=100000'
+            f'recursive=true&zone=1&container_type=dataset&container_code={dataset.code}'
+            '&page_size=1000&sorting=created_time,id&order=asc&page=0'
         ),
         json={'result': [file_dict]},
     )
@@ -219,7 +223,8 @@ async def test_import_files_from_with_same_name_but_different_types_should_retur
         method='GET',
         url=(
             'http://metadata_service/v1/items/search/?'
-            'recursive=true&zone=1&container_code=test202203241&container_type=project&page_size=100000'
+            'recursive=true&zone=1&container_type=project&container_code=test202203241'
+            '&page_size=1000&sorting=created_time,id&order=asc&page=0'
         ),
         json={'result': [file_dict, folder]},
     )
@@ -227,7 +232,8 @@ async def test_import_files_from_with_same_name_but_different_types_should_retur
         method='GET',
         url=(
             'http://metadata_service/v1/items/search/?'
-            f'recursive=true&zone=1&container_code={dataset.code}&container_type=dataset&page_size=100000'
+            f'recursive=true&zone=1&container_type=dataset&container_code={dataset.code}'
+            '&page_size=1000&sorting=created_time,id&order=asc&page=0'
         ),
         json={'result': [file_dict]},
     )
@@ -88,7 +88,8 @@ async def test_move_file_should_call_background_task_and_add_file_to_processing(
         method='GET',
         url=(
             'http://metadata_service/v1/items/search/?'
-            f'recursive=true&zone=1&container_code={dataset.code}&container_type=dataset&page_size=100000'
+            f'recursive=true&zone=1&container_type=dataset&container_code={dataset.code}'
+            '&page_size=1000&sorting=created_time,id&order=asc&page=0'
         ),
         json={'result': [file_dict]},
     )
@@ -127,7 +128,8 @@ async def test_move_file_to_dataset_root_folder_should_call_background_task_and_
         method='GET',
         url=(
             'http://metadata_service/v1/items/search/?'
-            f'recursive=true&zone=1&container_code={dataset.code}&container_type=dataset&page_size=100000'
+            f'recursive=true&zone=1&container_type=dataset&container_code={dataset.code}'
+            '&page_size=1000&sorting=created_time,id&order=asc&page=0'
         ),
         json={'result': [file_dict]},
     )
@@ -147,7 +149,8 @@ async def test_move_wrong_file_ignored_when_relation_doesnt_exist(client, httpx_
         method='GET',
         url=(
             'http://metadata_service/v1/items/search/?'
-            f'recursive=true&zone=1&container_code={dataset.code}&container_type=dataset&page_size=100000'
+            f'recursive=true&zone=1&container_type=dataset&container_code={dataset.code}'
+            '&page_size=1000&sorting=created_time,id&order=asc&page=0'
         ),
         json={'result': []},
     )
@@ -161,3 +164,91 @@ async def test_move_wrong_file_ignored_when_relation_doesnt_exist(client, httpx_
     assert res.status_code == 200
     ignored_file = [x.get('id') for x in res.json().get('result').get('ignored')]
     assert ignored_file == [file_id]
+
+
+async def test_move_folder_into_its_subfolder_should_return_400(client, httpx_mock, dataset):
+    dataset_id = str(dataset.id)
+    folder_id = 'cfa31c8c-ba29-4cdf-b6f2-feef05ec9c12'
+    sub_folder_id = '6c99e8bb-ecff-44c8-8fdc-a3d0ed7ac067'
+    folder = {
+        'id': folder_id,
+        'parent': None,
+        'parent_path': None,
+        'archived': False,
+        'type': 'folder',
+        'name': 'folder_name',
+        'container_code': dataset.code,
+        'container_type': 'dataset',
+    }
+    sub_folder = {**folder, 'id': sub_folder_id, 'parent': folder_id, 'parent_path': 'folder_name', 'name': 'sub'}
+    httpx_mock.add_response(
+        method='GET', url=f'http://metadata_service/v1/item/{sub_folder_id}/', json={'result': sub_folder}
+    )
+    httpx_mock.add_response(
+        method='GET',
+        url=(
+            'http://metadata_service/v1/items/search/?'
+            f'recursive=true&zone=1&container_type=dataset&container_code={dataset.code}'
+            '&page_size=1000&sorting=created_time,id&order=asc&page=0'
+        ),
+        json={'result': [folder, sub_folder]},
+    )
+
+    payload = {'source_list': [folder_id], 'operator': 'admin', 'target_geid': sub_folder_id}
+    res = await client.post(f'/v1/dataset/{dataset_id}/files', json=payload)
+    assert res.status_code == 400
+
+
+async def test_move_file_into_nested_folder_holding_the_same_name_should_ignore_it(client, httpx_mock, dataset):
+    dataset_id = str(dataset.id)
+    folder = {
+        'id': 'cfa31c8c-ba29-4cdf-b6f2-feef05ec9c12',
+        'parent': None,
+        'parent_path': None,
+        'archived': False,
+        'type': 'folder',
+        'name': 'X',
+        'container_code': dataset.code,
+        'container_type': 'dataset',
+    }
+    target = {
+        **folder,
+        'id': '0e8a3b44-5c2f-4b8e-9d0a-1f6d2c7e8b90',
+        'parent': folder['id'],
+        'parent_path': 'X',
+        'name': 'A',
+    }
+    source_folder = {**folder, 'id': '7d1f0c55-2e3b-4a6c-8f9d-0b1a2c3d4e5f', 'name': 'B'}
+    source_file = {
+        **folder,
+        'id': '6c99e8bb-ecff-44c8-8fdc-a3d0ed7ac067',
+        'parent': source_folder['id'],
+        'parent_path': 'B',
+        'type': 'file',
+        'name': 'f.txt',
+    }
+    existing_file = {
+        **source_file,
+        'id': '9b8c7d6e-5f4a-4b3c-2d1e-0f9a8b7c6d5e',
+        'parent': target['id'],
+        'parent_path': 'X.A',
+    }
+    httpx_mock.add_response(
+        method='GET', url=f'http://metadata_service/v1/item/{target["id"]}/', json={'result': target}
+    )
+    httpx_mock.add_response(
+        method='GET',
+        url=(
+            'http://metadata_service/v1/items/search/?'
+            f'recursive=true&zone=1&container_type=dataset&container_code={dataset.code}'
+            '&page_size=1000&sorting=created_time,id&order=asc&page=0'
+        ),
+        json={'result': [folder, target, source_folder, source_file, existing_file]},
+    )
+
+    payload = {'source_list': [source_file['id']], 'operator': 'admin', 'target_geid': target['id']}
+    res = await client.post(f'/v1/dataset/{dataset_id}/files', json=payload)
+
+    assert res.status_code == 200
+    assert res.json()['result']['processing'] == []
+    assert [x.get('id') for x in res.json()['result']['ignored']] == [source_file['id']]
@@ -47,7 +47,8 @@ async def test_rename_file_should_add_file_to_processing_and_return_200(client,
         method='GET',
         url=(
             'http://metadata_service/v1/items/search/?'
-            f'recursive=true&zone=1&container_code={dataset.code}&container_type=dataset&page_size=100000'
+            f'recursive=true&zone=1&container_type=dataset&container_code={dataset.code}'
+            '&page_size=1000&sorting=created_time,id&order=asc&page=0'
         ),
         json={'result': [file_dict]},
     )
@@ -97,7 +98,8 @@ async def test_rename_file_should_add_file_to_ignoring_when_file_wrong_and_retur
         method='GET',
         url=(
             'http://metadata_service/v1/items/search/?'
-            f'recursive=true&zone=1&container_code={dataset.code}&container_type=dataset&page_size=100000'
+            f'recursive=true&zone=1&container_type=dataset&container_code={dataset.code}'
+            '&page_size=1000&sorting=created_time,id&order=asc&page=0'
         ),
         json={'result': []},
     )
@@ -147,7 +149,8 @@ async def test_rename_file_should_add_file_to_ignoring_when_file_duplicated_and_
         method='GET',
         url=(
             'http://metadata_service/v1/items/search/?'
-            f'recursive=true&zone=1&container_code={dataset.code}&container_type=dataset&page_size=100000'
+            f'recursive=true&zone=1&container_type=dataset&container_code={dataset.code}'
+            '&page_size=1000&sorting=created_time,id&order=asc&page=0'
         ),
         json={
             'result': [
@@ -0,0 +1,107 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+
+import pytest
+
+from app.resources.bids_validator import BIDSValidationTimeout
+from app.resources.bids_validator import BIDSWorkspace
+from app.resources.bids_validator import run_bids_validator
+
+CODE = 'bidsdataset'
+
+
+def get_item(path, size):
+    parent_path, _, name = path.rpartition('/')
+    return {
+        'type': 'file',
+        'size': size,
+        'parent_path': parent_path.replace('/', '.') or None,
+        'name': name,
+        'storage': {'location_uri': f'minio://http://minio/{CODE}/data/{path}'},
+    }
+
+
+@pytest.fixture
+def fake_validator(tmp_path, monkeypatch):
+    def create(script):
+        bin_path = tmp_path / 'bin'
+        bin_path.mkdir()
+        validator = bin_path / 'bids-validator'
+        validator.write_text('#!/bin/sh\n' + script)
+        validator.chmod(0o755)
+        monkeypatch.setenv('PATH', f'{bin_path}{os.pathsep}{os.environ["PATH"]}')
+
+    return create
+
+
+def test_bids_workspace_should_create_sparse_placeholders(tmp_path):
+    workspace = BIDSWorkspace(CODE, root=str(tmp_path))
+    items = [get_item('sub-01/anat/sub-01_T1w.nii.gz', 1024 * 1024), get_item('dataset_description.json', 10)]
+
+    workspace.sync(BIDSWorkspace.get_files(items))
+
+    nifti = os.path.join(workspace.path, 'data/sub-01/anat/sub-01_T1w.nii.gz')
+    assert os.path.getsize(nifti) == 1024 * 1024
+    assert os.stat(nifti).st_blocks * 512 < 1024 * 1024
+    assert os.path.getsize(os.path.join(workspace.path, 'data/dataset_description.json')) > 0
+
+
+def test_bids_workspace_should_only_update_changed_files(tmp_path):
+    workspace = BIDSWorkspace(CODE, root=str(tmp_path))
+    workspace.sync(
+        BIDSWorkspace.get_files(
+            [get_item('sub-01/anat/a.nii', 10), get_item('sub-01/anat/b.nii', 10), get_item('sub-02/c.nii', 10)]
+        )
+    )
+    unchanged = os.path.join(workspace.path, 'data/sub-01/anat/a.nii')
+    os.utime(unchanged, (0, 0))
+
+    workspace.sync(BIDSWorkspace.get_files([get_item('sub-01/anat/a.nii', 10), get_item('sub-01/anat/b.nii', 20)]))
+
+    assert os.stat(unchanged).st_mtime == 0
+    assert os.path.getsize(os.path.join(workspace.path, 'data/sub-01/anat/b.nii')) == 20
+    assert not os.path.exists(os.path.join(workspace.path, 'data/sub-02'))
+
+
+@pytest.mark.asyncio
+async def test_run_bids_validator_should_return_json_report(fake_validator, tmp_path):
+    fake_validator('echo \'{"issues": {"errors": []}}\'')
+
+    assert await run_bids_validator(str(tmp_path), timeout=10) == {'issues': {'errors': []}}
+
+
+@pytest.mark.asyncio
+async def test_run_bids_validator_should_raise_when_timed_out(fake_validator, tmp_path):
+    fake_validator('sleep 10')
+
+    with pytest.raises(BIDSValidationTimeout):
+        await run_bids_validator(str(tmp_path), timeout=0.1)
+
+
+def test_bids_workspace_lock_should_be_exclusive(tmp_path):
+    workspace = BIDSWorkspace(CODE, root=str(tmp_path))
+    # each open of the lock file conflicts, like the workspace of another process
+    other = BIDSWorkspace(CODE, root=str(tmp_path))
+
+    lock_file = workspace.try_lock()
+    assert lock_file is not None
+    assert other.try_lock() is None
+
+    BIDSWorkspace.unlock(lock_file)
+    other_lock_file = other.try_lock()
+    assert other_lock_file is not None
+    BIDSWorkspace.unlock(other_lock_file)
@@ -0,0 +1,148 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import re
+from types import SimpleNamespace
+from unittest import mock
+
+import httpx
+import pytest
+
+from app.config import ConfigClass
+from app.resources.file_move import move_nodes
+from app.resources.file_move import plan_move
+from app.resources.tree_index import ContainerTreeIndex
+
+pytestmark = pytest.mark.asyncio
+
+CODE = 'testdataset'
+DATASET = SimpleNamespace(code=CODE)
+
+
+def get_item(id_, parent, parent_path, name, type_='file'):
+    path = '/'.join(filter(None, [(parent_path or '').replace('.', '/'), name]))
+    return {
+        'id': id_,
+        'parent': parent,
+        'parent_path': parent_path,
+        'name': name,
+        'type': type_,
+        'size': 1,
+        'storage': {'location_uri': f'minio://http://minio/{CODE}/data/{path}'},
+    }
+
+
+FOLDER = get_item('folder', None, None, 'folder', 'folder')
+SUB_FOLDER = get_item('sub_folder', 'folder', 'folder', 'sub', 'folder')
+FILE = get_item('file', 'sub_folder', 'folder.sub', 'file.txt')
+TARGET = get_item('target', None, None, 'target', 'folder')
+ITEMS = [FOLDER, SUB_FOLDER, FILE, TARGET]
+
+
+@pytest.fixture
+def bulk_update(httpx_mock):
+    def echo_items(request):
+        return httpx.Response(200, json={'result': json.loads(request.content)['items']})
+
+    httpx_mock.add_callback(echo_items, method='PUT', url=re.compile('http://metadata_service/v1/items/batch/.*'))
+
+
+async def test_plan_move_should_update_the_moved_node_and_the_paths_below_it():
+    tree_index = ContainerTreeIndex.from_items(CODE, ITEMS)
+
+    updates = await plan_move([FOLDER], TARGET, tree_index, new_name='renamed')
+
+    assert [update for _, update in updates] == [
+        {'id': 'folder', 'parent': 'target', 'parent_path': 'target', 'name': 'renamed'},
+        {'id': 'sub_folder', 'parent_path': 'target.renamed'},
+        {'id': 'file', 'parent_path': 'target.renamed.sub'},
+    ]
+
+
+async def test_plan_move_should_refuse_to_move_a_folder_into_its_subtree():
+    tree_index = ContainerTreeIndex.from_items(CODE, ITEMS)
+
+    with pytest.raises(ValueError):
+        await plan_move([FOLDER], FOLDER, tree_index)
+    with pytest.raises(ValueError):
+        await plan_move([FOLDER], SUB_FOLDER, tree_index)
+    assert await plan_move([SUB_FOLDER], FOLDER, tree_index)
+
+
+async def test_move_nodes_should_move_the_objects_to_their_new_path(httpx_mock, bulk_update):
+    tree_index = ContainerTreeIndex.from_items(CODE, ITEMS)
+    mc = mock.MagicMock()
+
+    with mock.patch('app.resources.file_move.get_minio_client', return_value=mc):
+        with mock.patch('app.resources.file_move.copy_object') as mock_copy_object:
+            await move_nodes(DATASET, [FOLDER], TARGET, tree_index, 'token', 'refresh')
+
+    mock_copy_object.assert_called_once_with(
+        mc.client, CODE, 'data/target/folder/sub/file.txt', CODE, 'data/folder/sub/file.txt', 1
+    )
+    mc.delete_object.assert_called_once_with(CODE, 'data/folder/sub/file.txt')
+    updates = json.loads(httpx_mock.get_requests()[0].content)['items']
+    assert updates[-1]['location_uri'].endswith(f'/{CODE}/data/target/folder/sub/file.txt')
+
+
+async def test_move_nodes_should_delete_the_copies_when_a_copy_fails(httpx_mock):
+    other_file = get_item('other_file', 'folder', 'folder', 'other.txt')
+    tree_index = ContainerTreeIndex.from_items(CODE, ITEMS + [other_file])
+    mc = mock.MagicMock()
+
+    async def copy_object(client, bucket, obj_path, *args):
+        if obj_path.endswith('other.txt'):
+            raise Exception('copy failed')
+
+    with mock.patch('app.resources.file_move.get_minio_client', return_value=mc):
+        with mock.patch('app.resources.file_move.copy_object', side_effect=copy_object):
+            with pytest.raises(Exception, match='copy failed'):
+                await move_nodes(DATASET, [FOLDER], TARGET, tree_index, 'token', 'refresh')
+
+    mc.delete_object.assert_called_once_with(CODE, 'data/target/folder/sub/file.txt')
+    assert not httpx_mock.get_requests()
+
+
+async def test_move_nodes_should_delete_the_unused_objects_when_the_update_fails(monkeypatch, httpx_mock):
+    monkeypatch.setattr(ConfigClass, 'METADATA_BULK_UPDATE_CHUNK_SIZE', 1)
+    other_file = get_item('other_file', 'folder', 'folder', 'other.txt')
+    tree_index = ContainerTreeIndex.from_items(CODE, ITEMS + [other_file])
+    updated_ids = []
+
+    def update_until_the_last_item(request):
+        updated_ids.extend(item['id'] for item in json.loads(request.content)['items'])
+        if len(updated_ids) == 4:
+            return httpx.Response(500)
+        return httpx.Response(200, json={'result': json.loads(request.content)['items']})
+
+    httpx_mock.add_callback(
+        update_until_the_last_item, method='PUT', url=re.compile('http://metadata_service/v1/items/batch/.*')
+    )
+    mc = mock.MagicMock()
+
+    with mock.patch('app.resources.file_move.get_minio_client', return_value=mc):
+        with mock.patch('app.resources.file_move.copy_object'):
+            with pytest.raises(Exception):
+                await move_nodes(DATASET, [FOLDER], TARGET, tree_index, 'token', 'refresh')
+
+    committed = updated_ids[:-1]
+    expected = []
+    for id_, old_path, new_path in [
+        ('file', 'data/folder/sub/file.txt', 'data/target/folder/sub/file.txt'),
+        ('other_file', 'data/folder/other.txt', 'data/target/folder/other.txt'),
+    ]:
+        expected.append(mock.call(CODE, old_path if id_ in committed else new_path))
+    assert sorted(mc.delete_object.call_args_list) == sorted(expected)
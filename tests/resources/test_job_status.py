@@ -0,0 +1,159 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from app.config import ConfigClass
+from app.resources.job_status import JobStatusEmitter
+
+pytestmark = pytest.mark.asyncio
+
+DATASET = SimpleNamespace(id='5baeb6a1-559b-4483-aadf-ef60519584f3', code='testdataset')
+QUEUE_URL = str(httpx.URL(ConfigClass.QUEUE_SERVICE + 'broker/pub'))
+TASKS_URL = str(httpx.URL(ConfigClass.DATA_UTILITY_SERVICE + 'tasks/'))
+BULK_TASKS_URL = str(httpx.URL(ConfigClass.DATA_UTILITY_SERVICE + 'tasks/bulk'))
+
+
+@pytest.fixture(params=[False])
+def status_requests(request, httpx_mock):
+    tasks_url = BULK_TASKS_URL if request.param else TASKS_URL
+    httpx_mock.add_response(method='POST', url=QUEUE_URL, json={})
+    httpx_mock.add_response(method='POST', url=tasks_url, json={})
+    httpx_mock.add_response(method='PUT', url=tasks_url, json={})
+
+    def get_requests():
+        return [
+            (request.method, str(request.url), json.loads(request.content)) for request in httpx_mock.get_requests()
+        ]
+
+    return get_requests
+
+
+async def emit_import_of_two_files(emitter):
+    files = [{'id': 'file-1', 'name': 'a'}, {'id': 'file-2', 'name': 'b'}]
+    job_ids = {}
+    for file in files:
+        job_ids.update(await emitter.create(file, 'INIT'))
+    for file in files:
+        await emitter.update(file, 'RUNNING', job_ids[file['id']])
+        await emitter.update(file, 'FINISH', job_ids[file['id']], payload={'id': 'new-' + file['id']})
+    await emitter.close()
+    return job_ids
+
+
+async def test_job_status_emitter_should_send_the_buffered_transitions_item_by_item(status_requests):
+    emitter = JobStatusEmitter('session', 'task', 'dataset_file_import', DATASET, 'admin', batch_size=100)
+
+    job_ids = await emit_import_of_two_files(emitter)
+
+    requests = status_requests()
+    notifications = [body for _, url, body in requests if url == QUEUE_URL]
+    assert {notification['event_type'] for notification in notifications} == {'DATASET_FILE_NOTIFICATION'}
+    assert [n['payload']['status'] for n in notifications] == ['INIT', 'INIT', 'RUNNING', 'FINISH', 'RUNNING', 'FINISH']
+    created = [body for method, url, body in requests if (method, url) == ('POST', TASKS_URL)]
+    assert [job['job_id'] for job in created] == [job_ids['file-1'], job_ids['file-2']]
+    updated = [body for method, url, body in requests if (method, url) == ('PUT', TASKS_URL)]
+    assert [(job['status'], job['add_payload']) for job in updated] == [
+        ('FINISH', {'id': 'new-file-1'}),
+        ('FINISH', {'id': 'new-file-2'}),
+    ]
+
+
+@pytest.mark.parametrize('status_requests', [True], indirect=True)
+async def test_job_status_emitter_should_send_the_buffered_transitions_in_one_batch_when_bulk(status_requests):
+    emitter = JobStatusEmitter('session', 'task', 'dataset_file_import', DATASET, 'admin', batch_size=100, bulk=True)
+
+    job_ids = await emit_import_of_two_files(emitter)
+
+    (_, _, notifications), (_, created_url, created), (_, updated_url, updated) = status_requests()
+    assert notifications['event_type'] == 'DATASET_FILE_NOTIFICATION_BATCH'
+    assert [n['status'] for n in notifications['payload']] == ['INIT', 'INIT', 'RUNNING', 'FINISH', 'RUNNING', 'FINISH']
+    assert created_url == updated_url == BULK_TASKS_URL
+    assert [job['job_id'] for job in created['jobs']] == [job_ids['file-1'], job_ids['file-2']]
+    assert [(job['status'], job['add_payload']) for job in updated['jobs']] == [
+        ('FINISH', {'id': 'new-file-1'}),
+        ('FINISH', {'id': 'new-file-2'}),
+    ]
+
+
+async def test_job_status_emitter_should_flush_when_batch_is_full(status_requests):
+    emitter = JobStatusEmitter('session', 'task', 'dataset_file_delete', DATASET, 'admin', batch_size=2)
+
+    job_id = (await emitter.create({'id': 'file-1'}, 'INIT'))['file-1']
+    assert not status_requests()
+    await emitter.update({'id': 'file-1'}, 'RUNNING', job_id)
+
+    assert [(method, url) for method, url, _ in status_requests()] == [
+        ('POST', QUEUE_URL),
+        ('POST', QUEUE_URL),
+        ('POST', TASKS_URL),
+        ('PUT', TASKS_URL),
+    ]
+
+
+async def test_job_status_emitter_should_flush_periodically(httpx_mock):
+    httpx_mock.add_response(method='POST', url=QUEUE_URL, json={})
+    httpx_mock.add_response(method='POST', url=TASKS_URL, json={})
+    emitter = JobStatusEmitter('session', 'task', 'dataset_file_move', DATASET, 'admin', flush_interval=0.01)
+    emitter.start()
+
+    await emitter.create({'id': 'file-1'}, 'INIT')
+    await asyncio.sleep(0.05)
+
+    assert len(httpx_mock.get_requests()) == 2
+    await emitter.close()
+
+
+async def test_job_status_emitter_should_send_again_only_the_transitions_not_sent(httpx_mock):
+    httpx_mock.add_response(method='POST', url=QUEUE_URL, json={})
+    httpx_mock.add_response(method='POST', url=TASKS_URL, json={})
+    httpx_mock.add_response(method='POST', url=TASKS_URL, status_code=500)
+    httpx_mock.add_response(method='POST', url=TASKS_URL, json={})
+    httpx_mock.add_response(method='PUT', url=TASKS_URL, json={})
+    emitter = JobStatusEmitter('session', 'task', 'dataset_file_import', DATASET, 'admin', flush_interval=0.01)
+
+    first_id = (await emitter.create({'id': 'file-1'}, 'INIT'))['file-1']
+    second_id = (await emitter.create({'id': 'file-2'}, 'INIT'))['file-2']
+    with pytest.raises(Exception):
+        await emitter.flush()
+    await emitter.update({'id': 'file-2'}, 'FINISH', second_id)
+    await emitter.close()
+
+    requests = [
+        (request.method, str(request.url), json.loads(request.content)) for request in httpx_mock.get_requests()
+    ]
+    tasks = [(method, body['job_id']) for method, url, body in requests if url == TASKS_URL]
+    # the second job is created again before it is updated, the first one is not sent twice
+    assert tasks == [('POST', first_id), ('POST', second_id), ('POST', second_id), ('PUT', second_id)]
+    assert len([url for _, url, _ in requests if url == QUEUE_URL]) == 3
+
+
+async def test_job_status_emitter_close_should_retry_the_final_flush(httpx_mock):
+    httpx_mock.add_response(method='POST', url=QUEUE_URL, status_code=500)
+    httpx_mock.add_response(method='POST', url=QUEUE_URL, json={})
+    httpx_mock.add_response(method='POST', url=TASKS_URL, json={})
+    emitter = JobStatusEmitter('session', 'task', 'dataset_file_delete', DATASET, 'admin', flush_interval=0.01)
+
+    await emitter.create({'id': 'file-1'}, 'INIT')
+    await emitter.close()
+
+    assert [request.method for request in httpx_mock.get_requests()] == ['POST', 'POST', 'POST']
+    assert not emitter._notifications
+    assert not emitter._created_jobs
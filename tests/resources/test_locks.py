@@ -13,11 +13,16 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import json
+
+import httpx
 import pytest
 
-# from app.resources.locks import recursive_lock
+from app.resources.locks import ResourceLockManager
 from app.resources.locks import lock_resource
+from app.resources.locks import recursive_lock_delete
 from app.resources.locks import unlock_resource
+from app.resources.tree_index import ContainerTreeIndex
 
 pytestmark = pytest.mark.asyncio
 
@@ -40,3 +45,94 @@ async def test_lock_resource_should_raise_exception_when_lock_request_not_200(
     )
     with pytest.raises(Exception):
         await lock_function('fake_key', 'me')
+
+
+@pytest.fixture
+def lock_service(httpx_mock):
+    """Stand-in for the bulk lock api of the data ops service, keeps the locks in memory."""
+    locks = {}
+    calls = []
+
+    def bulk_lock(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        keys, operation = body['resource_keys'], body['operation']
+        calls.append((request.method, keys, operation))
+        if request.method == 'DELETE':
+            for key in keys:
+                locks.pop(key, None)
+            return httpx.Response(status_code=200, json={})
+        if any(key in locks and (operation == 'write' or locks[key] == 'write') for key in keys):
+            return httpx.Response(status_code=409, json={'error_msg': 'resource already in used'})
+        for key in keys:
+            locks[key] = operation
+        return httpx.Response(status_code=200, json={})
+
+    httpx_mock.add_callback(bulk_lock, url='http://data_ops_util/v2/resource/lock/bulk')
+    return locks, calls
+
+
+async def test_resource_lock_manager_should_lock_keys_in_chunks(lock_service):
+    locks, calls = lock_service
+    lock_manager = ResourceLockManager(chunk_size=2)
+    for i in range(5):
+        lock_manager.add(f'bucket/file_{i}', 'write')
+    lock_manager.add('bucket/file_0', 'write')
+    lock_manager.add('core-bucket/source', 'read')
+
+    locked = await lock_manager.acquire()
+
+    assert len(locked) == 6
+    assert len(locks) == 6
+    assert [len(keys) for method, keys, _ in calls if method == 'POST'] == [2, 2, 1, 1]
+
+    await lock_manager.release()
+    assert locks == {}
+
+
+async def test_resource_lock_manager_should_rollback_when_conflict(lock_service):
+    locks, _ = lock_service
+    locks['bucket/file_3'] = 'write'
+    lock_manager = ResourceLockManager(chunk_size=2)
+    for i in range(5):
+        lock_manager.add(f'bucket/file_{i}', 'write')
+
+    with pytest.raises(Exception):
+        await lock_manager.acquire()
+
+    assert lock_manager.locked == []
+    assert locks == {'bucket/file_3': 'write'}
+
+
+async def test_recursive_lock_delete_should_lock_whole_tree_in_one_request(httpx_mock, lock_service):
+    locks, calls = lock_service
+    folder = {
+        'id': 'folder',
+        'parent': None,
+        'parent_path': None,
+        'name': 'folder',
+        'type': 'folder',
+        'owner': 'admin',
+        'container_code': 'dataset',
+        'container_type': 'dataset',
+    }
+    files = [
+        {
+            'id': f'file_{i}',
+            'parent': 'folder',
+            'parent_path': 'folder',
+            'name': f'file_{i}',
+            'type': 'file',
+            'container_code': 'dataset',
+            'container_type': 'dataset',
+            'storage': {'location_uri': f'minio://http://minio/dataset/data/folder/file_{i}'},
+        }
+        for i in range(3)
+    ]
+    tree_index = ContainerTreeIndex.from_items('dataset', [folder, *files])
+
+    locked_node, err = await recursive_lock_delete([folder], tree_index=tree_index)
+
+    assert err is None
+    assert len(locked_node) == 4
+    assert 'dataset/data/folder/file_1' in locks
+    assert len(calls) == 1
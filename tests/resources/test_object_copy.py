@@ -0,0 +1,136 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.config import ConfigClass
+from app.resources.object_copy import copy_object
+from app.resources.object_copy import get_part_ranges
+
+pytestmark = pytest.mark.asyncio
+
+MiB = 1024 * 1024
+
+
+class FakeMinio:
+    def __init__(self, size, fail_part=None):
+        self.size = size
+        self.fail_part = fail_part
+        self.copied = []
+        self.parts = {}
+        self.completed = None
+        self.aborted = False
+        self.metadata = {}
+        self.upload_headers = None
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def stat_object(self, bucket, obj):
+        return SimpleNamespace(size=self.size, metadata=self.metadata)
+
+    def copy_object(self, bucket, obj, source):
+        self.copied.append((bucket, obj))
+
+    def _create_multipart_upload(self, bucket, obj, headers):
+        self.upload_headers = headers
+        return 'upload_id'
+
+    def _upload_part_copy(self, bucket, obj, upload_id, part_number, headers):
+        with self._lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.01)
+        with self._lock:
+            self.running -= 1
+        if part_number == self.fail_part:
+            raise Exception('part copy failed')
+        self.parts[part_number] = headers['x-amz-copy-source-range']
+        return f'etag-{part_number}', None
+
+    def _complete_multipart_upload(self, bucket, obj, upload_id, parts):
+        self.completed = [part.part_number for part in parts]
+
+    def _abort_multipart_upload(self, bucket, obj, upload_id):
+        self.aborted = True
+
+
+@pytest.fixture
+def copy_config(monkeypatch):
+    monkeypatch.setattr(ConfigClass, 'MINIO_COPY_MULTIPART_THRESHOLD', 10 * MiB)
+    monkeypatch.setattr(ConfigClass, 'MINIO_COPY_PART_SIZE', 5 * MiB)
+    monkeypatch.setattr(ConfigClass, 'MINIO_COPY_CONCURRENCY', 2)
+
+
+async def test_get_part_ranges_should_cover_the_object_within_s3_limits():
+    assert get_part_ranges(12 * MiB, MiB) == [(0, 5 * MiB - 1), (5 * MiB, 10 * MiB - 1), (10 * MiB, 12 * MiB - 1)]
+    assert len(get_part_ranges(100000 * 5 * MiB + 1, 5 * MiB)) <= 10000
+
+
+async def test_copy_object_should_copy_small_objects_with_one_request(copy_config):
+    client = FakeMinio(MiB)
+
+    await copy_object(client, 'dataset', 'data/file', 'project', 'file', MiB)
+
+    assert client.copied == [('dataset', 'data/file')]
+    assert client.parts == {}
+
+
+async def test_copy_object_should_copy_large_objects_in_parallel_parts(copy_config):
+    client = FakeMinio(12 * MiB)
+    progress = []
+
+    async def report_progress(copied_size, total_size):
+        progress.append((copied_size, total_size))
+
+    await copy_object(client, 'dataset', 'data/file', 'project', 'file', 12 * MiB, progress=report_progress)
+
+    assert client.copied == []
+    assert client.parts == {
+        1: f'bytes=0-{5 * MiB - 1}',
+        2: f'bytes={5 * MiB}-{10 * MiB - 1}',
+        3: f'bytes={10 * MiB}-{12 * MiB - 1}',
+    }
+    assert client.completed == [1, 2, 3]
+    assert client.max_running == 2
+    assert progress[-1] == (12 * MiB, 12 * MiB)
+
+
+async def test_copy_object_should_keep_the_content_type_and_user_metadata(copy_config):
+    client = FakeMinio(12 * MiB)
+    client.metadata = {
+        'Content-Type': 'image/png',
+        'Content-Length': str(12 * MiB),
+        'ETag': 'any',
+        'X-Amz-Meta-Owner': 'admin',
+    }
+
+    await copy_object(client, 'dataset', 'data/file', 'project', 'file', 12 * MiB)
+
+    assert client.upload_headers == {'Content-Type': 'image/png', 'X-Amz-Meta-Owner': 'admin'}
+
+
+async def test_copy_object_should_abort_the_upload_when_a_part_fails(copy_config):
+    client = FakeMinio(12 * MiB, fail_part=2)
+
+    with pytest.raises(Exception, match='part copy failed'):
+        await copy_object(client, 'dataset', 'data/file', 'project', 'file', 12 * MiB)
+
+    assert client.aborted
+    assert client.completed is None
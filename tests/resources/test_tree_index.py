@@ -0,0 +1,92 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+
+from app.resources.tree_index import ContainerTreeIndex
+
+pytestmark = pytest.mark.asyncio
+
+CODE = 'any'
+FATHER_ID = '0defc217-238f-45d0-afff-b2b2cfb294a6'
+SON_ID = 'eb4a9b1d-73f5-40d5-bef2-e9f89d533d8b'
+
+FILES_LIST = [
+    {'id': FATHER_ID, 'parent': None, 'parent_path': None, 'name': 'father', 'type': 'folder'},
+    {'id': SON_ID, 'parent': FATHER_ID, 'parent_path': 'father', 'name': 'son', 'type': 'folder'},
+    {
+        'id': '6c8b410d-09de-45dc-b923-66d15955f4c7',
+        'parent': SON_ID,
+        'parent_path': 'father.son',
+        'name': '164132046.png',
+        'type': 'file',
+    },
+    {'id': '0efa7de1-4581-4e7e-83da-50c6aa4682d8', 'parent': None, 'parent_path': None, 'name': 'file', 'type': 'file'},
+]
+
+
+@pytest.fixture
+def container_listing(httpx_mock):
+    httpx_mock.add_response(
+        method='GET',
+        url=(
+            'http://metadata_service/v1/items/search/?'
+            f'recursive=true&zone=1&container_type=dataset&container_code={CODE}'
+            '&page_size=1000&sorting=created_time,id&order=asc&page=0'
+        ),
+        json={'result': FILES_LIST},
+    )
+
+
+async def test_container_tree_index_should_list_the_container_only_once(httpx_mock, container_listing):
+    tree_index = ContainerTreeIndex(CODE)
+
+    root_nodes = await tree_index.get_children(None)
+    father_children = await tree_index.get_children(FATHER_ID)
+    son_children = await tree_index.get_children(SON_ID)
+
+    assert [node['name'] for node in root_nodes] == ['father', 'file']
+    assert father_children == [FILES_LIST[1]]
+    assert son_children == [FILES_LIST[2]]
+    assert len(httpx_mock.get_requests()) == 1
+
+
+async def test_container_tree_index_should_lookup_by_id_and_path(container_listing):
+    tree_index = ContainerTreeIndex(CODE)
+
+    assert await tree_index.get_by_id(SON_ID) == FILES_LIST[1]
+    assert await tree_index.get_by_id('not-exist') is None
+    assert await tree_index.get_by_path('father.son', '164132046.png') == [FILES_LIST[2]]
+    assert await tree_index.get_by_path(None, 'son') == []
+
+
+async def test_container_tree_index_from_items_should_not_call_metadata(httpx_mock):
+    tree_index = ContainerTreeIndex.from_items(CODE, FILES_LIST)
+
+    assert await tree_index.get_children(FATHER_ID) == [FILES_LIST[1]]
+    assert await tree_index.get_children('leaf') == []
+    assert not httpx_mock.get_requests()
+
+
+async def test_container_tree_index_contains_should_match_parent_path_name_and_type():
+    tree_index = ContainerTreeIndex.from_items(
+        CODE,
+        FILES_LIST + [{'id': 'other', 'parent': FATHER_ID, 'parent_path': 'father', 'name': 'file', 'type': 'file'}],
+    )
+
+    assert await tree_index.contains(None, 'file', 'file')
+    assert await tree_index.contains('father', 'file', 'file')
+    assert not await tree_index.contains('father.son', 'file', 'file')
+    assert not await tree_index.contains(None, 'file', 'folder')
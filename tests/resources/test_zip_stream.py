@@ -0,0 +1,117 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import zipfile
+from io import BytesIO
+
+import pytest
+
+from app.resources.zip_stream import ZipSource
+from app.resources.zip_stream import stream_zip_to_minio
+
+PART_SIZE = 64
+
+
+class FakeObject:
+    def __init__(self, content):
+        self._content = BytesIO(content)
+
+    def read(self):
+        return self._content.read()
+
+    def stream(self, amt):
+        while True:
+            chunk = self._content.read(amt)
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self):
+        pass
+
+    def release_conn(self):
+        pass
+
+
+class FakeMinio:
+    def __init__(self, objects, fail_upload=False):
+        self.objects = objects
+        self.fail_upload = fail_upload
+        self.uploaded = {}
+        self.part_sizes = []
+
+    def get_object(self, bucket, path):
+        return FakeObject(self.objects[(bucket, path)])
+
+    def put_object(self, bucket, name, data, length, part_size=0, num_parallel_uploads=3):
+        uploaded = BytesIO()
+        while True:
+            part = data.read(part_size)
+            if not part:
+                break
+            if self.fail_upload:
+                raise ConnectionError('upload failed')
+            self.part_sizes.append(len(part))
+            uploaded.write(part)
+        self.uploaded[(bucket, name)] = uploaded.getvalue()
+
+
+def test_stream_zip_to_minio_should_upload_archive_of_all_objects():
+    objects = {
+        ('bucket', 'data/small.txt'): b'small file',
+        ('bucket', 'data/folder/large.bin'): bytes(range(256)) * 64,
+    }
+    sources = [
+        ZipSource(arcname=path, bucket=bucket, path=path, size=len(content))
+        for (bucket, path), content in objects.items()
+    ]
+    client = FakeMinio(objects)
+
+    stream_zip_to_minio(
+        client,
+        'dataset',
+        'versions/dataset.zip',
+        sources,
+        {'default_essential.schema.json': '{}'},
+        part_size=PART_SIZE,
+        memory_budget=3 * PART_SIZE,
+        download_concurrency=2,
+    )
+
+    with zipfile.ZipFile(BytesIO(client.uploaded[('dataset', 'versions/dataset.zip')])) as archive:
+        assert archive.namelist() == ['default_essential.schema.json', 'data/small.txt', 'data/folder/large.bin']
+        assert archive.read('default_essential.schema.json') == b'{}'
+        for (_, path), content in objects.items():
+            assert archive.read(path) == content
+    assert max(client.part_sizes) <= PART_SIZE
+
+
+def test_stream_zip_to_minio_should_raise_upload_error_without_blocking():
+    objects = {('bucket', 'data/large.bin'): bytes(range(256)) * 1024}
+    sources = [ZipSource(arcname='data/large.bin', bucket='bucket', path='data/large.bin', size=256 * 1024)]
+    client = FakeMinio(objects, fail_upload=True)
+
+    with pytest.raises(ConnectionError):
+        stream_zip_to_minio(
+            client,
+            'dataset',
+            'versions/dataset.zip',
+            sources,
+            {},
+            part_size=PART_SIZE,
+            memory_budget=3 * PART_SIZE,
+            download_concurrency=2,
+        )
+    assert client.uploaded == {}
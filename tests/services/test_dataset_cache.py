@@ -0,0 +1,139 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from datetime import datetime
+from unittest import mock
+from uuid import uuid4
+
+import pytest
+
+from app.models.dataset import Dataset
+from app.services.dataset import SrvDatasetMgr
+from app.services.dataset_cache import DatasetCache
+from app.services.dataset_cache import dataset_cache
+
+pytestmark = pytest.mark.asyncio
+
+
+def get_dataset(**kwargs):
+    values = {
+        'id': uuid4(),
+        'source': '',
+        'authors': ['author'],
+        'code': 'testdataset',
+        'type': 'GENERAL',
+        'modality': [],
+        'collection_method': [],
+        'license': '',
+        'tags': [],
+        'description': 'description',
+        'size': 10,
+        'total_files': 1,
+        'title': 'title',
+        'creator': 'admin',
+        'project_id': None,
+        'created_at': datetime(2022, 1, 1, 12, 30),
+        'updated_at': datetime(2022, 1, 2, 12, 30),
+    }
+    values.update(kwargs)
+    return Dataset(**values)
+
+
+async def test_dataset_cache_should_serialize_every_column():
+    dataset = get_dataset(project_id=uuid4())
+
+    cached = DatasetCache.deserialize(DatasetCache.serialize(dataset))
+
+    assert cached is not dataset
+    assert cached.to_dict() == dataset.to_dict()
+
+
+async def test_get_bygeid_should_read_the_database_once(monkeypatch):
+    monkeypatch.setattr(dataset_cache, 'local_enabled', True)
+    dataset = get_dataset()
+    db = mock.AsyncMock()
+    db.get.return_value = dataset
+
+    first = await SrvDatasetMgr().get_bygeid(db, str(dataset.id))
+    second = await SrvDatasetMgr().get_bygeid(db, str(dataset.id))
+    by_code = await SrvDatasetMgr().get_bycode(db, dataset.code)
+
+    db.get.assert_awaited_once_with(Dataset, dataset.id)
+    db.execute.assert_not_awaited()
+    assert first is dataset
+    assert second.to_dict() == by_code.to_dict() == dataset.to_dict()
+    assert dataset_cache.get_stats() == {'hits': 2, 'misses': 1, 'entries': 2}
+
+
+async def test_update_should_invalidate_the_cached_dataset(monkeypatch):
+    monkeypatch.setattr(dataset_cache, 'local_enabled', True)
+    dataset = get_dataset()
+    db = mock.AsyncMock()
+    db.get.return_value = dataset
+
+    await SrvDatasetMgr().get_bygeid(db, str(dataset.id))
+    await SrvDatasetMgr().update(db, dataset, {'title': 'new title'})
+    await SrvDatasetMgr().get_bygeid(db, str(dataset.id))
+
+    assert db.get.await_count == 2
+
+
+async def test_dataset_cache_should_be_bypassed_when_no_tier_is_enabled():
+    cache = DatasetCache(ttl=60, max_entries=10, redis_enabled=False, local_enabled=False)
+    dataset = get_dataset()
+    fetch = mock.AsyncMock(return_value=dataset)
+
+    await cache.get(cache.get_id_key(dataset.id), fetch)
+    await cache.get(cache.get_id_key(dataset.id), fetch)
+
+    assert fetch.await_count == 2
+    assert cache.get_stats() == {'hits': 0, 'misses': 0, 'entries': 0}
+
+
+async def test_dataset_cache_should_not_cache_a_missing_dataset():
+    cache = DatasetCache(ttl=60, max_entries=10, redis_enabled=False, local_enabled=True)
+    fetch = mock.AsyncMock(return_value=None)
+
+    assert await cache.get('code:missing', fetch) is None
+    assert await cache.get('code:missing', fetch) is None
+    assert fetch.await_count == 2
+
+
+async def test_dataset_cache_should_expire_entries():
+    cache = DatasetCache(ttl=60, max_entries=10, redis_enabled=False, local_enabled=True)
+    dataset = get_dataset()
+    fetch = mock.AsyncMock(return_value=dataset)
+
+    with mock.patch('app.services.dataset_cache.time.monotonic', return_value=0):
+        await cache.get(cache.get_id_key(dataset.id), fetch)
+    with mock.patch('app.services.dataset_cache.time.monotonic', return_value=30):
+        await cache.get(cache.get_id_key(dataset.id), fetch)
+    with mock.patch('app.services.dataset_cache.time.monotonic', return_value=61):
+        await cache.get(cache.get_id_key(dataset.id), fetch)
+
+    assert fetch.await_count == 2
+
+
+async def test_dataset_cache_should_not_store_a_fetch_raced_by_an_invalidation():
+    cache = DatasetCache(ttl=60, max_entries=10, redis_enabled=False, local_enabled=True)
+    dataset = get_dataset()
+
+    async def fetch():
+        await cache.invalidate(dataset)
+        return dataset
+
+    await cache.get(cache.get_id_key(dataset.id), fetch)
+
+    assert cache.get_stats()['entries'] == 0
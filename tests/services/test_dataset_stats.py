@@ -0,0 +1,76 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import re
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.services.dataset import SrvDatasetMgr
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_increment_stats_should_count_concurrent_increments(test_db, dataset):
+    sessions = [AsyncSession(test_db.bind, expire_on_commit=False) for _ in range(2)]
+    srv_dataset = SrvDatasetMgr()
+    try:
+        # both operations loaded the dataset before any of them updated it
+        loaded = [await srv_dataset.get_bygeid(session, str(dataset.id)) for session in sessions]
+        await asyncio.gather(
+            srv_dataset.increment_stats(sessions[0], loaded[0], 3, 300),
+            srv_dataset.increment_stats(sessions[1], loaded[1], 5, 500),
+        )
+    finally:
+        for session in sessions:
+            await session.close()
+
+    await test_db.refresh(dataset)
+    assert dataset.total_files == 8
+    assert dataset.size == 800
+
+
+async def test_decrement_stats_should_subtract_and_set_the_other_attributes(test_db, dataset):
+    srv_dataset = SrvDatasetMgr()
+    await srv_dataset.increment_stats(test_db, dataset, 4, 400)
+
+    result = await srv_dataset.decrement_stats(test_db, dataset, 1, 100, license='apache')
+
+    assert result['total_files'] == 3
+    assert result['size'] == 300
+    await test_db.refresh(dataset)
+    assert (dataset.total_files, dataset.size, dataset.license) == (3, 300, 'apache')
+
+
+async def test_reconcile_stats_should_count_the_not_archived_files(httpx_mock, test_db, dataset):
+    items = [
+        {'type': 'file', 'size': 10, 'archived': False},
+        {'type': 'file', 'size': 20, 'archived': True},
+        {'type': 'folder', 'size': 0, 'archived': False},
+        {'type': 'file', 'size': None, 'archived': False},
+    ]
+    httpx_mock.add_response(
+        method='GET',
+        url=re.compile(r'^http://metadata_service/v1/items/search/.*'),
+        json={'result': items, 'num_of_pages': 1},
+    )
+    srv_dataset = SrvDatasetMgr()
+    await srv_dataset.increment_stats(test_db, dataset, 7, 700)
+
+    result = await srv_dataset.reconcile_stats(dataset)
+
+    assert result['total_files'] == 2
+    assert result['size'] == 10
@@ -170,3 +170,29 @@ async def test_send_on_rename_event_send_correct_msg(test_db, kafka_file_folder_
     assert activity_log_schema.changes == [
         {'item_property': 'name', 'old_value': item['name'], 'new_value': 'file2.txt'}
     ]
+
+
+async def test_send_on_import_event_send_one_msg_per_item(test_db, kafka_file_folder_consumer, dataset):
+    item_list = [
+        {
+            'id': f'ded5bf1e-80f5-4b39-bbfd-f7c74054f4{index:02}',
+            'parent_path': None,
+            'type': 'file',
+            'zone': 1,
+            'name': f'file_{index}.txt',
+            'owner': 'admin',
+            'container_code': 'testdataset202201101',
+            'container_type': 'dataset',
+        }
+        for index in range(20)
+    ]
+    project = {'code': 'source_project_code'}
+    await FileFolderActivityLogService().send_on_import_event(dataset, project, item_list, 'user')
+
+    schema_loaded = avro_schema.load_schema('app/schemas/metadata.items.activity.avsc')
+    item_names = []
+    for _ in item_list:
+        msg = await kafka_file_folder_consumer.getone()
+        item_names.append(schemaless_reader(io.BytesIO(msg.value), schema_loaded)['item_name'])
+
+    assert item_names == [item['name'] for item in item_list]
@@ -0,0 +1,135 @@
+# Copyright (C) 2022 Indoc Research
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from unittest import mock
+from uuid import uuid4
+
+import pytest
+from fastapi import BackgroundTasks
+
+from app.services.job_queue import JobQueue
+from app.services.job_queue import JobRunner
+from app.services.job_queue import schedule_job
+
+pytestmark = pytest.mark.asyncio
+
+
+@asynccontextmanager
+async def fake_session():
+    yield mock.AsyncMock()
+
+
+def get_runner(queue):
+    runner = JobRunner(queue=queue, concurrency=1, poll_interval=0.01, worker_id='worker-1')
+    runner._session = fake_session
+    return runner
+
+
+async def test_runner_runs_the_handler_of_the_job_and_marks_it_succeeded():
+    queue = JobQueue()
+    calls = []
+
+    @queue.register('dataset_file_import')
+    async def handler(payload):
+        calls.append(payload)
+
+    queue.complete = mock.AsyncMock()
+    job = SimpleNamespace(id=uuid4(), action='dataset_file_import', payload={'dataset_id': 'any'})
+
+    await get_runner(queue).run(job)
+
+    assert calls == [{'dataset_id': 'any', 'job_id': str(job.id)}]
+    queue.complete.assert_awaited_once_with(mock.ANY, job.id, None)
+
+
+async def test_runner_marks_the_job_failed_when_the_handler_raises():
+    queue = JobQueue()
+
+    @queue.register('dataset_file_delete')
+    async def handler(payload):
+        raise ValueError('Dataset any does not exist anymore')
+
+    queue.complete = mock.AsyncMock()
+    job = SimpleNamespace(id=uuid4(), action='dataset_file_delete', payload={'dataset_id': 'any'})
+
+    await get_runner(queue).run(job)
+
+    queue.complete.assert_awaited_once_with(mock.ANY, job.id, 'Dataset any does not exist anymore')
+
+
+async def test_schedule_job_enqueues_the_job_when_the_queue_is_enabled(monkeypatch):
+    monkeypatch.setattr('app.config.ConfigClass.JOB_QUEUE_ENABLED', True)
+    background_tasks = BackgroundTasks()
+    db = mock.Mock()
+    with mock.patch('app.services.job_queue.job_queue.enqueue', new_callable=mock.AsyncMock) as enqueue:
+        await schedule_job(
+            background_tasks, db, 'dataset_file_move', 'dataset', {'dataset_id': 'any', 'access_token': 'token'}
+        )
+
+    enqueue.assert_awaited_once_with(db, 'dataset_file_move', 'dataset', {'dataset_id': 'any'})
+    assert background_tasks.tasks == []
+
+
+async def test_requeue_stale_only_puts_back_the_resumable_jobs():
+    queue = JobQueue()
+    queue.register('dataset_file_import', resumable=True)(mock.AsyncMock())
+    queue.register('dataset_file_move')(mock.AsyncMock())
+    db = mock.AsyncMock()
+    db.execute.return_value = mock.MagicMock()
+
+    await queue.requeue_stale(db)
+
+    assert queue.is_resumable('dataset_file_import')
+    assert not queue.is_resumable('dataset_file_move')
+    requeue, fail = [str(call.args[0]) for call in db.execute.await_args_list]
+    assert 'file_operation_jobs.action IN' in requeue
+    assert 'file_operation_jobs.action' not in fail
+    db.commit.assert_awaited_once()
+
+
+async def test_purge_finished_deletes_the_finished_jobs_older_than_the_retention(monkeypatch):
+    monkeypatch.setattr('app.config.ConfigClass.JOB_QUEUE_RETENTION', 60)
+    db = mock.AsyncMock()
+    db.execute.return_value = SimpleNamespace(rowcount=2)
+
+    assert await JobQueue().purge_finished(db) == 2
+
+    statement = str(db.execute.await_args[0][0])
+    assert statement.startswith('DELETE FROM dataset.file_operation_jobs')
+    assert 'status IN' in statement
+    db.commit.assert_awaited_once()
+
+
+async def test_purge_finished_keeps_the_jobs_without_retention(monkeypatch):
+    monkeypatch.setattr('app.config.ConfigClass.JOB_QUEUE_RETENTION', 0)
+    db = mock.AsyncMock()
+
+    assert await JobQueue().purge_finished(db) == 0
+
+    db.execute.assert_not_awaited()
+
+
+async def test_schedule_job_runs_the_handler_as_background_task_when_the_queue_is_disabled(monkeypatch):
+    monkeypatch.setattr('app.config.ConfigClass.JOB_QUEUE_ENABLED', False)
+    background_tasks = BackgroundTasks()
+    db = mock.Mock()
+    handler = mock.AsyncMock()
+    with mock.patch('app.services.job_queue.job_queue.get_handler', return_value=handler):
+        await schedule_job(background_tasks, db, 'dataset_file_rename', 'dataset', {'dataset_id': 'any'})
+    await background_tasks()
+
+    handler.assert_awaited_once_with({'dataset_id': 'any'})
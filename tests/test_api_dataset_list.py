@@ -13,11 +13,43 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from datetime import datetime
+from datetime import timedelta
+
 import pytest
+import pytest_asyncio
+
+from app.models.dataset import Dataset
 
 pytestmark = pytest.mark.asyncio
 
 
+@pytest_asyncio.fixture
+async def datasets(db_session):
+    created_at = datetime(2022, 1, 1)
+    new_datasets = []
+    for i in range(5):
+        new_dataset = Dataset(
+            source='',
+            title=f'dataset {i}',
+            authors=['test'],
+            code=f'keysetdataset{i}',
+            type='general',
+            description='dataset created by test',
+            size=0,
+            total_files=0,
+            creator='keyset',
+            created_at=created_at + timedelta(days=i),
+        )
+        db_session.add(new_dataset)
+        new_datasets.append(new_dataset)
+    await db_session.commit()
+    yield list(reversed(new_datasets))
+    for new_dataset in new_datasets:
+        await db_session.delete(new_dataset)
+    await db_session.commit()
+
+
 async def test_get_dataset_list_when_error_should_return_500(client):
     username = 'admin'
     res = await client.post(f'/v1/users/{username}/datasets', json={'order_by': 'desc'})
@@ -45,3 +77,32 @@ async def test_get_dataset_list_should_return_200(client, dataset):
         'result': [dataset.to_dict()],
         'total': 1,
     }
+
+
+async def test_get_dataset_list_keyset_should_page_with_the_cursor(client, datasets):
+    codes = []
+    payload = {'order_by': 'desc', 'page_size': 2, 'keyset': True}
+    while True:
+        res = await client.post('/v1/users/keyset/datasets', json=payload)
+        assert res.status_code == 200
+        assert res.json()['total'] is None
+        codes.extend(item['code'] for item in res.json()['result'])
+        if not res.json()['next_cursor']:
+            break
+        payload['cursor'] = res.json()['next_cursor']
+
+    assert codes == [dataset.code for dataset in datasets]
+
+
+async def test_get_dataset_list_keyset_should_count_when_requested(client, datasets):
+    payload = {'order_by': 'desc', 'page_size': 2, 'keyset': True, 'count': True}
+    res = await client.post('/v1/users/keyset/datasets', json=payload)
+    assert res.status_code == 200
+    assert res.json()['total'] == 5
+    assert res.json()['num_of_pages'] == 3
+
+
+async def test_get_dataset_list_keyset_with_invalid_cursor_should_return_400(client):
+    payload = {'order_by': 'desc', 'keyset': True, 'cursor': 'invalid'}
+    res = await client.post('/v1/users/keyset/datasets', json=payload)
+    assert res.status_code == 400
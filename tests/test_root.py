@@ -23,3 +23,14 @@ async def test_root_should_return_200_and_version(client):
     response = await client.get('/v1/')
     assert response.status_code == 200
     assert response.json() == {'message': 'Service Dataset On, Version: ' + ConfigClass.VERSION}
+
+
+@pytest.mark.asyncio
+async def test_metrics_should_return_the_db_pool_counters(client):
+    from app.config import ConfigClass
+
+    response = await client.get('/v1/metrics')
+    assert response.status_code == 200
+    db_pool = response.json()['db_pool']
+    assert db_pool['size'] == ConfigClass.DB_POOL_SIZE
+    assert {'checkouts', 'timeouts', 'wait_time_max', 'checked_out'} <= set(db_pool)